@@ -0,0 +1,224 @@
+from collections import deque
+
+import numpy as np
+
+
+class ClockEstimator:
+    """Fits a line through (frame index, capture time) pairs from one stream.
+
+    The slope is the stream's sample rate as seen by the host clock, which is
+    what differs between two devices that both claim to run at 48 kHz.
+    """
+
+    def __init__(self, nominal_rate, window=120, interval=0.5):
+        self.nominal_rate = nominal_rate
+        self.interval = interval  # Seconds between kept observations
+        self.points = deque(maxlen=window)
+        self.rate = float(nominal_rate)
+        self.frame_anchor = None
+        self.time_anchor = None
+
+    def add(self, timestamp):
+        """Record a (frame, time) pair; returns True if the fit changed"""
+        if timestamp is None:
+            return False
+        frame, t = timestamp
+        if t <= 0:  # Host API does not report capture times
+            return False
+        if self.points and t - self.points[-1][1] < self.interval:
+            return False
+        self.points.append((frame, t))
+        self._fit()
+        return True
+
+    def _fit(self):
+        frames = np.array([p[0] for p in self.points], dtype=np.float64)
+        times = np.array([p[1] for p in self.points], dtype=np.float64)
+        self.frame_anchor = frames.mean()
+        self.time_anchor = times.mean()
+        if len(self.points) < 2:
+            return
+        dt = times - self.time_anchor
+        var = np.dot(dt, dt)
+        if var <= 0:
+            return
+        rate = np.dot(dt, frames - self.frame_anchor) / var
+        # Ignore fits that are obviously broken (stalled stream, clock jump)
+        if abs(rate / self.nominal_rate - 1) < 0.01:
+            self.rate = rate
+
+    @property
+    def ready(self):
+        return self.frame_anchor is not None
+
+    def frame_at(self, t):
+        return self.frame_anchor + (t - self.time_anchor) * self.rate
+
+    def time_at(self, frame):
+        return self.time_anchor + (frame - self.frame_anchor) / self.rate
+
+
+class StreamAligner:
+    """Keeps a secondary source sample-aligned to a reference source.
+
+    Frames from the secondary ring are staged here and carried forward
+    between loop iterations instead of being trimmed away. Both streams'
+    capture timestamps drive a clock model; the secondary source is
+    resampled by the estimated rate ratio with linear interpolation, and a
+    slow correction term steers the residual offset to zero. Offsets too
+    large to slew (stream start-up, ring overflows) are fixed at once by
+    dropping or inserting samples, which the stats count.
+    """
+
+    def __init__(self, sample_rate, channels, capacity, max_ppm=2000,
+                 slew_seconds=5.0, resync_seconds=0.02):
+        self.sample_rate = sample_rate
+        self.capacity = int(capacity)
+        self.max_ratio_error = max_ppm / 1e6
+        self.slew_frames = slew_seconds * sample_rate
+        self.resync_frames = resync_seconds * sample_rate
+
+        self.ref_clock = ClockEstimator(sample_rate)
+        self.src_clock = ClockEstimator(sample_rate)
+        self.ratio = 1.0
+
+        # Staged secondary frames; staging[0] is source frame self.base
+        self.staging = np.zeros((self.capacity, channels), dtype=np.float32)
+        self.staged = 0
+        self.base = 0
+        self.phase = 0.0  # Fractional read position within staging
+
+        # Scratch for the interpolator
+        self.out = np.zeros((self.capacity, channels), dtype=np.float32)
+        self._next = np.zeros((self.capacity, channels), dtype=np.float32)
+        self._ramp = np.arange(self.capacity, dtype=np.float64)
+        self._pos = np.zeros(self.capacity, dtype=np.float64)
+        self._frac = np.zeros(self.capacity, dtype=np.float64)
+        self._idx = np.zeros(self.capacity, dtype=np.intp)
+
+        self.inserted_samples = 0
+        self.dropped_samples = 0
+        self.output_frames = 0
+        self.input_frames = 0
+
+    def fill(self, ring):
+        """Move as many frames as fit from the secondary ring into staging"""
+        consumed = int(self.phase)
+        if consumed:
+            remaining = self.staged - consumed
+            self.staging[:remaining] = self.staging[consumed:self.staged]
+            self.staged = remaining
+            self.base += consumed
+            self.phase -= consumed
+
+        if self.staged == 0:
+            # Nothing carried over, so resume at the ring's position on the
+            # source clock (this also skips over any frames it dropped)
+            self.base = ring.source_position()
+
+        while self.staged < self.capacity:
+            view = ring.peek(self.capacity - self.staged)
+            if not len(view):
+                break
+            self.staging[self.staged:self.staged + len(view)] = view
+            self.staged += len(view)
+            self.input_frames += len(view)
+            ring.advance(len(view))
+
+    def discard(self):
+        """Drop staged frames; the next fill() resyncs to the ring position"""
+        self.staged = 0
+        self.phase = 0.0
+
+    def reset_clocks(self):
+        """Forget both clock fits, e.g. after the streams were reopened and
+        the frames lost in between no longer fit the earlier capture times"""
+        self.ref_clock = ClockEstimator(self.sample_rate)
+        self.src_clock = ClockEstimator(self.sample_rate)
+
+    def update(self, ref_position, ref_timestamp, src_timestamp):
+        """Re-estimate the rate ratio and correct the offset.
+
+        ref_position is the source-clock index of the next reference frame
+        that will be paired with the output of read().
+        """
+        self.ref_clock.add(ref_timestamp)
+        self.src_clock.add(src_timestamp)
+        if not (self.ref_clock.ready and self.src_clock.ready):
+            return
+
+        # Where the secondary stream should be for the next reference frame
+        target = self.src_clock.frame_at(self.ref_clock.time_at(ref_position))
+        error = target - (self.base + self.phase)
+
+        if error > self.resync_frames:
+            # Secondary is behind: skip the frames that belong to the past
+            drop = min(int(error), self.staged - int(self.phase))
+            self.phase += drop
+            self.dropped_samples += drop
+            return
+        if error < -self.resync_frames:
+            # Secondary is ahead: pad with silence until the reference catches up
+            insert = min(int(-error), self.capacity - self.staged)
+            start = int(self.phase)
+            if insert > 0:
+                self.staging[start + insert:self.staged + insert] = self.staging[start:self.staged]
+                self.staging[start:start + insert] = 0
+                self.staged += insert
+                self.base -= insert
+                self.inserted_samples += insert
+            return
+
+        nominal = self.src_clock.rate / self.ref_clock.rate
+        ratio = nominal + error / self.slew_frames
+        self.ratio = min(max(ratio, 1 - self.max_ratio_error), 1 + self.max_ratio_error)
+
+    def ready_frames(self, max_frames):
+        """How many aligned frames read(max_frames) would return, without reading them"""
+        span = self.staged - 2 - self.phase
+        if span < 0:
+            return 0
+        return min(int(span / self.ratio) + 1, max_frames, self.capacity)
+
+    def read(self, max_frames):
+        """Return up to max_frames aligned secondary frames as a scratch view"""
+        frames = self.ready_frames(max_frames)
+        if not frames:
+            return self.out[:0]
+
+        pos = self._pos[:frames]
+        frac = self._frac[:frames]
+        idx = self._idx[:frames]
+        out = self.out[:frames]
+        nxt = self._next[:frames]
+
+        np.multiply(self._ramp[:frames], self.ratio, out=pos)
+        pos += self.phase
+        np.floor(pos, out=frac)
+        np.copyto(idx, frac, casting='unsafe')
+        np.subtract(pos, frac, out=frac)
+
+        np.take(self.staging, idx, axis=0, out=out)
+        idx += 1
+        np.take(self.staging, idx, axis=0, out=nxt)
+        nxt -= out
+        nxt *= frac[:, None]
+        out += nxt
+
+        self.phase += frames * self.ratio
+        self.output_frames += frames
+        return out
+
+    def drift_ppm(self):
+        """Estimated secondary clock error relative to the reference, in ppm"""
+        return (self.src_clock.rate / self.ref_clock.rate - 1) * 1e6
+
+    def stats(self):
+        return {
+            'drift_ppm': self.drift_ppm(),
+            'ratio': self.ratio,
+            'inserted_samples': self.inserted_samples,
+            'dropped_samples': self.dropped_samples,
+            'input_frames': self.input_frames,
+            'output_frames': self.output_frames,
+        }
@@ -0,0 +1,195 @@
+"""Headless batch transcription of existing recordings.
+
+    python batch.py recordings/ more/recording_20240315_143022.wav --workers 4
+    python batch.py recordings/ --speakers speakers.json
+
+Writes the same _transcript.txt next to each recording as the interactive
+recorder. Progress is kept in a JSON manifest, so running the same command
+again after an interruption skips the files that are already done and
+retries the ones that failed. No audio devices are needed.
+
+The optional speaker map names speakers without prompting. String values
+apply to every file, and an object keyed by a file name overrides them for
+that file:
+
+    {"A": "Alice", "B": "Bob", "recording_20240315_143022.wav": {"A": "Carol"}}
+"""
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from config import (ASSEMBLYAI_API_KEY, BATCH_RETRIES, BATCH_WORKERS, DENOISE_WORKERS, TRANSCRIPT_CACHE_DIR,
+                    TRANSCRIPT_CACHE_MAX_MB, TRANSCRIPTION_JOURNAL, UPLOAD_CHUNK_MB, UPLOAD_RETRIES)
+from denoise import workers_per_job
+from jobs import TranscriptionJobs
+from recorder import AudioRecorder
+from transcript_cache import TranscriptCache
+
+# Segments RecordingWriter leaves behind (see writer.segment_path_for)
+SEGMENT_NAME = re.compile(r"_part\d{3,}\.wav$")
+
+
+def find_recordings(paths, pattern="recording_*.wav"):
+    """Expand files and directories into a sorted list of recordings"""
+    recordings = []
+    for path in paths:
+        if os.path.isdir(path):
+            recordings.extend(glob.glob(os.path.join(path, pattern)))
+        else:
+            recordings.append(path)
+    # Leftover segments and mixdowns are not recordings of their own
+    return sorted({os.path.abspath(p) for p in recordings
+                   if not SEGMENT_NAME.search(p) and not p.endswith("_mix.wav")})
+
+
+def load_speaker_map(path):
+    """Read a speaker map file into (default map, {file name: map})"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    default = {label: name for label, name in data.items() if isinstance(name, str)}
+    per_file = {name: mapping for name, mapping in data.items() if isinstance(mapping, dict)}
+    return default, per_file
+
+
+class BatchManifest:
+    """Per-file status of a batch run, saved after every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def is_done(self, recording):
+        entry = self.entries.get(recording)
+        return (entry is not None and entry['status'] == 'done'
+                and os.path.exists(entry.get('transcript', '')))
+
+    def update(self, recording, **fields):
+        with self.lock:
+            self.entries.setdefault(recording, {}).update(fields, updated=time.time())
+            temp = f"{self.path}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp, self.path)
+
+
+class BatchTranscriber:
+    """Transcribes many recordings with bounded concurrency and retries.
+
+    Every file gets its own AudioRecorder (speaker names are per-recorder
+    state) without device detection; they share one transcript cache and
+    one TranscriptionJobs, so uploads and jobs of a failed attempt are
+    picked up by the retry (or by re-running the batch) instead of redone.
+    Failed attempts are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, api_key, manifest, workers=BATCH_WORKERS, retries=BATCH_RETRIES,
+                 backoff=5.0, speaker_map=None, name_speakers=False):
+        self.api_key = api_key
+        self.manifest = manifest
+        self.workers = 1 if name_speakers else workers  # Prompts can't share the console
+        self.retries = retries
+        self.backoff = backoff
+        self.default_map, self.file_maps = speaker_map or ({}, {})
+        self.name_speakers = name_speakers
+        self.cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB * 1000 * 1000)
+        self.jobs = TranscriptionJobs(TRANSCRIPTION_JOURNAL, chunk_size=UPLOAD_CHUNK_MB << 20,
+                                      retries=UPLOAD_RETRIES)
+
+    def run(self, recordings):
+        """Transcribe every recording not already done; returns (done, failed) counts"""
+        pending = [r for r in recordings if not self.manifest.is_done(r)]
+        skipped = len(recordings) - len(pending)
+        print(f"{len(recordings)} recordings: {skipped} already done, {len(pending)} to transcribe "
+              f"with {self.workers} workers")
+
+        start = time.time()
+        done = failed = 0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.transcribe_file, r): r for r in pending}
+            for future in concurrent.futures.as_completed(futures):
+                ok = future.result()
+                if ok:
+                    done += 1
+                else:
+                    failed += 1
+                print(f"[{done + failed}/{len(pending)}] {os.path.basename(futures[future])}: "
+                      f"{'done' if ok else 'FAILED'}")
+        self.cache.close()
+        print(f"Batch finished in {time.time() - start:.1f} s: {done} transcribed, {failed} failed, "
+              f"{skipped} skipped")
+        return done, failed
+
+    def transcribe_file(self, recording):
+        recorder = AudioRecorder(self.api_key, detect_devices=False, transcript_cache=self.cache,
+                                 jobs=self.jobs)
+        recorder.name_speakers = self.name_speakers
+        recorder.denoise_workers = workers_per_job(self.workers, DENOISE_WORKERS)  # Files denoise side by side
+        recorder.speaker_map = dict(self.default_map)
+        recorder.speaker_map.update(self.file_maps.get(os.path.basename(recording), {}))
+
+        attempts = self.manifest.entries.get(recording, {}).get('attempts', 0)
+        for attempt in range(1, self.retries + 1):
+            attempts += 1
+            self.manifest.update(recording, status='running', attempts=attempts)
+            if not os.path.exists(recording):
+                self.manifest.update(recording, status='failed', error="file not found")
+                return False
+
+            transcript = recorder.transcribe_audio(recording)
+            if transcript is not None:
+                transcript_file = recorder.save_transcript(transcript, recording, echo=False)
+                if transcript_file is not None:
+                    self.manifest.update(recording, status='done', transcript=transcript_file,
+                                         error=None)
+                    return True
+
+            if attempt < self.retries:
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                print(f"{os.path.basename(recording)}: attempt {attempt} failed, "
+                      f"retrying in {delay:.0f} s")
+                time.sleep(delay)
+
+        self.manifest.update(recording, status='failed', error=f"failed after {self.retries} attempts")
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe existing recordings without the menu")
+    parser.add_argument('paths', nargs='+', help="Recordings, or directories to search for them")
+    parser.add_argument('--pattern', default="recording_*.wav", help="File pattern inside directories")
+    parser.add_argument('--workers', type=int, default=BATCH_WORKERS, help="Files transcribed at once")
+    parser.add_argument('--retries', type=int, default=BATCH_RETRIES, help="Attempts per file")
+    parser.add_argument('--backoff', type=float, default=5.0, help="Seconds before the first retry")
+    parser.add_argument('--manifest', default="batch_manifest.json", help="Progress file for resuming")
+    parser.add_argument('--speakers', help="JSON file mapping speaker labels to names")
+    parser.add_argument('--name-speakers', action='store_true',
+                        help="Ask for names after each preview (one file at a time)")
+    args = parser.parse_args()
+
+    recordings = find_recordings(args.paths, args.pattern)
+    if not recordings:
+        print("No recordings found.")
+        return
+
+    speaker_map = load_speaker_map(args.speakers) if args.speakers else None
+    batch = BatchTranscriber(ASSEMBLYAI_API_KEY, BatchManifest(args.manifest), workers=args.workers,
+                             retries=args.retries, backoff=args.backoff, speaker_map=speaker_map,
+                             name_speakers=args.name_speakers)
+    _, failed = batch.run(recordings)
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Micro-benchmark: MixEngine against the reduce_noise() + mix_audio() reference.
+
+    python benchmarks/bench_dsp.py [--seconds 2]
+
+Checks that both paths agree, then reports the time per block and the
+real-time factor for a range of block sizes and channel layouts.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from dsp import HAVE_NUMBA, MixEngine, mix_audio, reduce_noise  # noqa: E402
+
+SAMPLE_RATE = 48000
+BLOCKSIZES = (256, 1024, 2048, 8192)
+LAYOUTS = ((1, 1), (1, 2), (2, 2))  # (mic channels, system channels)
+
+
+def reference(mic_data, sys_data):
+    """The record loop's original per-block processing"""
+    if sys_data.shape[1] == 2:
+        sys_data = np.column_stack((sys_data, sys_data))
+    elif sys_data.shape[1] == 1:
+        sys_data = np.repeat(sys_data, 4, axis=1)
+    if mic_data.shape[1] == 2:
+        mic_data = np.column_stack((mic_data, mic_data))
+    mic_data = reduce_noise(mic_data.copy())
+    mixed = mix_audio(mic_data, sys_data)
+    return mixed, np.sqrt(np.mean(mic_data**2)), np.sqrt(np.mean(sys_data**2))
+
+
+def make_blocks(count, frames, channels, rng, loud):
+    # Speech-like bursts with quiet stretches, so both gain branches and the
+    # limiter get exercised
+    level = 1.2 if loud else 0.004
+    blocks = rng.standard_normal((count, frames, channels)).astype(np.float32) * level
+    blocks[::3] *= 0.01
+    return blocks
+
+
+def time_blocks(process, mic_blocks, sys_blocks):
+    start = time.perf_counter()
+    for mic, sys_ in zip(mic_blocks, sys_blocks):
+        process(mic, sys_)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0, help="Audio per case")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    engines = [("numpy", False)] + ([("numba", True)] if HAVE_NUMBA else [])
+    print(f"{'block':>6} {'mic':>3} {'sys':>3} {'path':>9} {'us/block':>9} {'x realtime':>11}")
+    for blocksize in BLOCKSIZES:
+        count = max(1, int(args.seconds * SAMPLE_RATE) // blocksize)
+        for mic_channels, sys_channels in LAYOUTS:
+            mic_blocks = make_blocks(count, blocksize, mic_channels, rng, loud=True)
+            sys_blocks = make_blocks(count, blocksize, sys_channels, rng, loud=False)
+            audio_seconds = count * blocksize / SAMPLE_RATE
+
+            results = [("reference", time_blocks(reference, mic_blocks, sys_blocks))]
+            for name, compiled in engines:
+                engine = MixEngine(blocksize, (mic_channels, sys_channels), compiled=compiled)
+                engine.process(mic_blocks[0], sys_blocks[0])  # Warm up / compile
+                for mic, sys_ in zip(mic_blocks[:8], sys_blocks[:8]):
+                    expected, mic_level, sys_level = reference(mic, sys_)
+                    mixed, levels = engine.process(mic, sys_)
+                    np.testing.assert_allclose(mixed, expected, rtol=1e-5, atol=1e-6)
+                    np.testing.assert_allclose(levels, (mic_level, sys_level), rtol=1e-4)
+                results.append((name, time_blocks(engine.process, mic_blocks, sys_blocks)))
+
+            for name, elapsed in results:
+                print(f"{blocksize:>6} {mic_channels:>3} {sys_channels:>3} {name:>9} "
+                      f"{elapsed / count * 1e6:>9.1f} {audio_seconds / elapsed:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
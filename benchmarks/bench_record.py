@@ -0,0 +1,156 @@
+"""Benchmark the capture/mix/write loop with synthetic input streams.
+
+    python benchmarks/bench_record.py --seconds 120 --speed 20 --jitter-ms 2 --skew-ppm 150
+    python benchmarks/bench_record.py --profile adaptive --speed 40
+
+Runs AudioRecorder.record() without audio hardware or keyboard hooks, with
+the sources feeding it speed times faster than real time. Reports the
+sustained throughput, CPU time per audio second, peak memory and every
+kind of dropped or patched sample for each block size and channel layout.
+With --profile, the latency profile picks the block size instead (and
+adaptive mode may change it); the final block size is reported.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from recorder import AudioRecorder  # noqa: E402
+from synthetic import SyntheticStreams  # noqa: E402
+from transcript_cache import TranscriptCache  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BLOCKSIZES = (512, 2048, 8192)
+LAYOUTS = ((1, 2), (2, 2), (1, 1), (1, 0))  # (mic channels, system channels); 0 = mic only
+
+
+def peak_rss_mb():
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == 'darwin' else peak / 1e3  # bytes on macOS, KiB elsewhere
+
+
+def run_case(blocksize, mic_channels, sys_channels, args):
+    streams = SyntheticStreams(speed=args.speed, jitter_ms=args.jitter_ms, skew_ppm={1: args.skew_ppm})
+    directory = tempfile.mkdtemp(prefix="bench_record_")
+    recorder = AudioRecorder("benchmark", detect_devices=False,
+                             transcript_cache=TranscriptCache(os.path.join(directory, "cache")))
+    recorder.stream_factory = streams
+    recorder.hotkeys = False
+    recorder.name_speakers = False  # No background preview against the real API
+    if blocksize:
+        recorder.blocksize = blocksize
+    else:
+        recorder.latency_profile = args.profile
+    recorder.mic_id, recorder.mic_channels = 0, mic_channels
+    recorder.system_id, recorder.sys_channels = (1, sys_channels) if sys_channels else (None, 0)
+    recorder.recording = True
+
+    # Stop once the microphone has delivered the requested amount of audio
+    target = int(args.seconds * recorder.sample_rate)
+
+    def stop_when_done():
+        # Adaptive mode reopens the streams, so count every mic stream opened
+        while sum(stream.frames_delivered for stream in streams.opened if stream.device == 0) < target:
+            time.sleep(0.01)
+        recorder.controls.post('stop')
+
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        if args.trace_memory:
+            tracemalloc.start()
+        threading.Thread(target=stop_when_done, daemon=True).start()
+        cpu = time.process_time()
+        wall = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            path = recorder.record()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        if args.trace_memory:
+            memory = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+        else:
+            memory = peak_rss_mb()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory, ignore_errors=True)
+    if path is None:
+        raise RuntimeError("record() failed")
+
+    snapshot = recorder.metrics.snapshot()
+    counts = snapshot['gauges']
+    audio_seconds = counts['writer_frames_written'] / recorder.sample_rate
+    xruns = sum(value for name, value in snapshot['counters'].items() if 'flows' in name)
+    return {
+        'blocksize': counts['blocksize'],
+        'profile_changes': snapshot['counters'].get('latency_profile_changes', 0),
+        'callback_to_disk_ms_max': max(1000 * timing['max'] for name, timing in snapshot['timings'].items()
+                                       if name.startswith('callback_to_disk')),
+        'mic_channels': mic_channels,
+        'sys_channels': sys_channels,
+        'audio_seconds': audio_seconds,
+        'realtime_factor': audio_seconds / wall,
+        'cpu_ms_per_audio_second': 1000 * cpu / audio_seconds,
+        'peak_memory_mb': memory,
+        'dropped_frames': (counts['mic_ring_dropped_frames'] + counts.get('system_ring_dropped_frames', 0)
+                           + counts['writer_dropped_frames']),
+        'aligner_patched_samples': (counts.get('align_inserted_samples', 0)
+                                    + counts.get('align_dropped_samples', 0)),
+        'drift_ppm': counts.get('align_drift_ppm', 0.0),
+        'xruns': xruns,
+        'mix_ms_max': 1000 * snapshot['timings']['mix']['max'],
+        'latency_ms_max': 1000 * snapshot['timings']['capture_latency']['max'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60.0, help="Audio per case")
+    parser.add_argument('--speed', type=float, default=20.0, help="Source speed versus real time")
+    parser.add_argument('--jitter-ms', type=float, default=2.0, help="Callback timing jitter")
+    parser.add_argument('--skew-ppm', type=float, default=150.0, help="System audio clock error")
+    parser.add_argument('--blocksizes', type=int, nargs='+', default=BLOCKSIZES)
+    parser.add_argument('--profile', help="Use this latency profile (e.g. adaptive) instead of --blocksizes")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="Peak traced allocations per case instead of process peak RSS (slower)")
+    parser.add_argument('--output', help="Append results to this JSON-lines file")
+    args = parser.parse_args()
+
+    memory_label = "traced MB" if args.trace_memory else "peak RSS MB"
+    print(f"{'block':>6} {'mic':>3} {'sys':>3} {'x realtime':>10} {'cpu ms/s':>9} {memory_label:>11} "
+          f"{'dropped':>8} {'patched':>8} {'drift ppm':>9} {'mix max ms':>10} {'latency max ms':>14} "
+          f"{'to disk max ms':>14} {'changes':>7}")
+    results = []
+    for blocksize in [None] if args.profile else args.blocksizes:
+        for mic_channels, sys_channels in LAYOUTS:
+            r = run_case(blocksize, mic_channels, sys_channels, args)
+            results.append(r)
+            print(f"{r['blocksize']:>6} {mic_channels:>3} {sys_channels:>3} {r['realtime_factor']:>10.1f} "
+                  f"{r['cpu_ms_per_audio_second']:>9.1f} {r['peak_memory_mb']:>11.1f} "
+                  f"{r['dropped_frames']:>8} {r['aligner_patched_samples']:>8} {r['drift_ppm']:>+9.1f} "
+                  f"{r['mix_ms_max']:>10.2f} {r['latency_ms_max']:>14.1f} "
+                  f"{r['callback_to_disk_ms_max']:>14.1f} {r['profile_changes']:>7}")
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps({'benchmark': 'record', 'time': time.time(), 'args': vars(args),
+                                'results': results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Benchmark transcribe_audio() against the local stand-in, and transcript formatting.
+
+    python benchmarks/bench_transcribe.py --minutes 60 --latency 2 --realtime-factor 0.01
+    python benchmarks/bench_transcribe.py --format-utterances 200000
+    python benchmarks/bench_transcribe.py --minutes 10 --failure-rate 0.2
+
+Writes a long synthetic two-speaker recording, transcribes it end to end
+through mock_assemblyai.TranscriptionStandIn (upload encoding, upload and
+polling) and reports the time of each phase, optionally with a share of
+requests failing so retries and backoff are part of the timing. Formatting is timed on its
+own for a transcript with a large number of utterances, both as one string
+and streamed to every transcript file format at once.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from formatting import WRITERS, write_transcript  # noqa: E402
+from jobs import TranscriptionJobs  # noqa: E402
+from mock_assemblyai import TranscriptionStandIn  # noqa: E402
+from recorder import AudioRecorder, aai  # noqa: E402
+from synthetic import speech_like  # noqa: E402
+from transcript_cache import TranscriptCache  # noqa: E402
+
+SAMPLE_RATE = 48000
+
+
+def write_recording(path, minutes, block_seconds=60):
+    """Two speakers taking turns, written a block at a time to keep memory flat"""
+    voices = [speech_like(block_seconds, SAMPLE_RATE, f0, seed=i) for i, f0 in enumerate((110, 220))]
+    frames = int(minutes * 60 * SAMPLE_RATE)
+    with sf.SoundFile(path, mode='w', samplerate=SAMPLE_RATE, channels=4, subtype='PCM_24') as f:
+        written = 0
+        turn = 0
+        while written < frames:
+            block = voices[turn % 2][:frames - written]
+            f.write(np.repeat(block[:, None], 4, axis=1))
+            written += len(block)
+            turn += 1
+    return frames / SAMPLE_RATE
+
+
+def bench_transcription(args, directory):
+    server = TranscriptionStandIn(latency=args.latency, realtime_factor=args.realtime_factor,
+                                  utterance_ms=args.utterance_ms, failure_rate=args.failure_rate,
+                                  seed=1).start()
+    try:
+        audio_file = os.path.join(directory, "recording_bench.wav")
+        start = time.perf_counter()
+        audio_seconds = write_recording(audio_file, args.minutes)
+        print(f"Wrote {audio_seconds / 60:.0f} min of synthetic audio in {time.perf_counter() - start:.1f} s")
+
+        # No journal, so every run uploads and submits afresh
+        recorder = AudioRecorder("benchmark", detect_devices=False,
+                                 transcript_cache=TranscriptCache(os.path.join(directory, "cache")),
+                                 jobs=TranscriptionJobs(backoff=0.1))
+        recorder.base_url = server.base_url
+        recorder.name_speakers = False
+        recorder.speaker_map = {'A': "Alice", 'B': "Bob"}
+        aai.settings.polling_interval = 0.1
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            transcript = recorder.transcribe_audio(audio_file)
+        total = time.perf_counter() - start
+        if transcript is None:
+            raise RuntimeError("transcription failed")
+
+        timings = recorder.metrics.snapshot()['timings']
+        phases = {name: timings[name]['total'] for name in
+                  ('transcription_upload', 'transcription_full') if name in timings}
+        print(f"Transcribed in {total:.2f} s ({audio_seconds / total:.0f}x real time), "
+              f"service latency {args.latency:.1f} s + {args.realtime_factor:g} s per audio second")
+        for name, seconds in phases.items():
+            print(f"  {name:<22} {seconds:8.3f} s")
+        print(f"  uploaded {server.bytes_uploaded / 1e6:.1f} MB in {server.upload_count} uploads, "
+              f"{server.failures} requests failed on purpose")
+        return {'audio_seconds': audio_seconds, 'total_seconds': total, 'phases': phases,
+                'bytes_uploaded': server.bytes_uploaded, 'injected_failures': server.failures}
+    finally:
+        server.stop()
+
+
+def bench_format(count, directory):
+    speakers = "ABCD"
+    utterances = [SimpleNamespace(speaker=speakers[(i // 3) % len(speakers)], start=i * 4000,
+                                  end=i * 4000 + 3500, text=f"Sentence number {i} of the benchmark.")
+                  for i in range(count)]
+    recorder = AudioRecorder("benchmark", detect_devices=False,
+                             transcript_cache=TranscriptCache(os.path.join(directory, "cache")))
+    recorder.speaker_names = {label: f"Speaker {label}" for label in speakers}
+    start = time.perf_counter()
+    text = recorder.format_transcript(SimpleNamespace(utterances=utterances))
+    seconds = time.perf_counter() - start
+    print(f"Formatted {count} utterances in {seconds * 1000:.1f} ms "
+          f"({1e6 * seconds / count:.2f} us each, {len(text) / 1e6:.1f} MB of text)")
+
+    files = [open(os.path.join(directory, f"transcript.{fmt}"), "w", encoding="utf-8") for fmt in WRITERS]
+    start = time.perf_counter()
+    write_transcript(SimpleNamespace(utterances=utterances), recorder.speaker_names,
+                     [writer(f, recorder.speaker_names) for writer, f in zip(WRITERS.values(), files)])
+    for f in files:
+        f.close()
+    streamed = time.perf_counter() - start
+    size = sum(os.path.getsize(f.name) for f in files)
+    print(f"Streamed them to {', '.join(WRITERS)} in {streamed * 1000:.1f} ms ({size / 1e6:.1f} MB written)")
+    return {'utterances': count, 'seconds': seconds, 'characters': len(text),
+            'streamed_seconds': streamed, 'bytes_written': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=30.0, help="Length of the synthetic recording")
+    parser.add_argument('--latency', type=float, default=1.0, help="Service seconds before a job completes")
+    parser.add_argument('--realtime-factor', type=float, default=0.0,
+                        help="Extra service seconds per second of audio")
+    parser.add_argument('--utterance-ms', type=int, default=5000, help="Longest utterance the stand-in returns")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Share of requests the stand-in fails (dropped connections, 503s, 429s)")
+    parser.add_argument('--format-utterances', type=int, default=100000,
+                        help="Utterances in the formatting benchmark")
+    parser.add_argument('--skip-transcription', action='store_true')
+    parser.add_argument('--output', help="Append results to this JSON-lines file")
+    args = parser.parse_args()
+
+    results = {}
+    directory = tempfile.mkdtemp(prefix="bench_transcribe_")
+    try:
+        if not args.skip_transcription:
+            results['transcription'] = bench_transcription(args, directory)
+        results['format'] = bench_format(args.format_utterances, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(json.dumps({'benchmark': 'transcribe', 'time': time.time(), 'args': vars(args),
+                                'results': results}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
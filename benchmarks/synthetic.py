@@ -0,0 +1,122 @@
+"""Synthetic audio sources for running the recorder without hardware.
+
+SyntheticStreams stands in for sd.InputStream (set it as an AudioRecorder's
+stream_factory). Every stream it opens plays speech-like tone bursts from
+its own thread on a shared virtual clock that can run faster than real
+time, with optional callback jitter and a per-device sample clock skew.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+def speech_like(seconds, sample_rate, f0, seed=0):
+    """Mono harmonic bursts with pauses, roughly the level and rhythm of speech"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    voice = sum((0.1 / k) * np.sin(2 * np.pi * f0 * k * t) for k in range(1, 8))
+    envelope = np.zeros_like(t)
+    position = 0.0
+    while position < seconds:
+        burst = rng.uniform(0.5, 3.0)
+        start = int(position * sample_rate)
+        envelope[start:start + int(burst * sample_rate)] = rng.uniform(0.3, 1.0)
+        position += burst + rng.uniform(0.2, 1.5)
+    return (voice * envelope).astype(np.float32)
+
+
+class SyntheticClock:
+    """Virtual stream time that runs speed times faster than the wall clock"""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.started = time.perf_counter()
+
+    def now(self):
+        return (time.perf_counter() - self.started) * self.speed
+
+    def sleep_until(self, virtual_time):
+        delay = (virtual_time - self.now()) / self.speed
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _TimeInfo:
+    def __init__(self, adc_time, current_time):
+        self.inputBufferAdcTime = adc_time
+        self.currentTime = current_time
+
+
+class SyntheticInputStream:
+    """The parts of sd.InputStream the recorder uses, fed from a looped signal"""
+
+    def __init__(self, streams, samplerate, device, channels, callback, blocksize, skew_ppm=0.0):
+        self.streams = streams
+        self.samplerate = samplerate
+        self.device = device
+        self.channels = channels
+        self.callback = callback
+        self.blocksize = blocksize or 1024
+        self.rate = samplerate * (1 + skew_ppm * 1e-6)  # Actual frames per (virtual) second
+        self.frames_delivered = 0
+        self.running = False
+        self.thread = None
+
+        # Loop length rounded to whole blocks so a block never wraps
+        loop_frames = max(1, int(streams.loop_seconds * samplerate) // self.blocksize) * self.blocksize
+        mono = speech_like(loop_frames / samplerate, samplerate, f0=120 + 90 * device, seed=device)
+        self.signal = np.repeat(mono[:loop_frames, None], channels, axis=1)
+        self.rng = np.random.default_rng(1000 + device)
+
+    @property
+    def time(self):
+        return self.streams.clock.now()
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def close(self):
+        self.stop()
+
+    def _run(self):
+        clock = self.streams.clock
+        start = clock.now()
+        jitter = self.streams.jitter_ms / 1000
+        position = 0
+        while self.running:
+            n = self.frames_delivered
+            # A callback arrives once its block has been captured, give or take jitter
+            clock.sleep_until(start + (n + self.blocksize) / self.rate + self.rng.uniform(0, jitter))
+            block = self.signal[position:position + self.blocksize]
+            self.callback(block, self.blocksize, _TimeInfo(start + n / self.rate, clock.now()), None)
+            self.frames_delivered += self.blocksize
+            position = (position + self.blocksize) % len(self.signal)
+
+
+class SyntheticStreams:
+    """Callable stand-in for sd.InputStream.
+
+    skew_ppm maps a device id to its sample clock error, e.g. {1: 150}
+    makes device 1 run 150 ppm fast against device 0.
+    """
+
+    def __init__(self, speed=1.0, jitter_ms=0.0, skew_ppm=None, loop_seconds=20.0):
+        self.clock = SyntheticClock(speed)
+        self.jitter_ms = jitter_ms
+        self.skew_ppm = skew_ppm or {}
+        self.loop_seconds = loop_seconds
+        self.opened = []
+
+    def __call__(self, samplerate, device, channels, callback, blocksize=0, dtype=None, **kwargs):
+        stream = SyntheticInputStream(self, samplerate, device, channels, callback, blocksize,
+                                      self.skew_ppm.get(device, 0.0))
+        self.opened.append(stream)
+        return stream
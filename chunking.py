@@ -0,0 +1,179 @@
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from jobs import TranscriptionJobs
+from lazy import LazyModule
+from speakers import SpeakerReconciler, speaker_audio, voice_fingerprint
+from transcript import Transcript, Utterance
+
+sf = LazyModule('soundfile')
+
+
+def find_silences(path, threshold, min_silence=1.0, window=0.1):
+    """Return (start, end) seconds of stretches whose RMS stays below threshold.
+
+    Uses the same RMS-under-threshold test as the recorder's silence
+    detection, evaluated over short windows streamed from the file.
+    """
+    silences = []
+    with sf.SoundFile(path, 'r') as f:
+        blocksize = max(1, int(window * f.samplerate))
+        silent_since = None
+        position = 0
+        for block in f.blocks(blocksize, dtype='float32', always_2d=True):
+            t = position / f.samplerate
+            if np.sqrt(np.mean(block ** 2)) < threshold:
+                if silent_since is None:
+                    silent_since = t
+            else:
+                if silent_since is not None and t - silent_since >= min_silence:
+                    silences.append((silent_since, t))
+                silent_since = None
+            position += len(block)
+        end = position / f.samplerate
+        if silent_since is not None and end - silent_since >= min_silence:
+            silences.append((silent_since, end))
+    return silences
+
+
+def plan_chunks(duration, silences, target_seconds=600, max_seconds=900):
+    """Split [0, duration] into (start, end) spans cut in the middle of silences.
+
+    Each cut is the silence midpoint closest to target_seconds into the
+    chunk; with no silence between half the target and max_seconds the
+    chunk is cut hard at the target.
+    """
+    midpoints = [(start + end) / 2 for start, end in silences]
+    cuts = [0.0]
+    while duration - cuts[-1] > max_seconds:
+        start = cuts[-1]
+        candidates = [m for m in midpoints if start + target_seconds / 2 <= m <= start + max_seconds]
+        if candidates:
+            cuts.append(min(candidates, key=lambda m: abs(m - start - target_seconds)))
+        else:
+            cuts.append(start + target_seconds)
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def write_chunks(path, spans, directory, blocksize=65536):
+    """Copy each span of a file into its own file in directory, streaming"""
+    chunk_files = []
+    with sf.SoundFile(path, 'r') as source:
+        extension = os.path.splitext(path)[1]
+        for i, (start, end) in enumerate(spans):
+            chunk_file = os.path.join(directory, f"chunk_{i:04d}{extension}")
+            first = int(round(start * source.samplerate))
+            remaining = int(round(end * source.samplerate)) - first
+            source.seek(first)
+            with sf.SoundFile(chunk_file, 'w', samplerate=source.samplerate,
+                              channels=source.channels, format=source.format,
+                              subtype=source.subtype) as chunk:
+                while remaining > 0:
+                    data = source.read(min(blocksize, remaining), dtype='float32')
+                    if not len(data):
+                        break
+                    chunk.write(data)
+                    remaining -= len(data)
+            chunk_files.append(chunk_file)
+    return chunk_files
+
+
+class ChunkedTranscriber:
+    """Transcribes a long recording as silence-delimited chunks in parallel.
+
+    prepare() splits the file and uploads every chunk once (a chunk already
+    uploaded by an earlier, failed attempt is not sent again); submit() then
+    transcribes them through a bounded worker pool in the background, so
+    wall-clock time shrinks with the number of workers. Utterance times
+    are shifted back onto the recording's timeline, and speaker labels are
+    reconciled across chunks by voice fingerprint so speaker names still
+    apply. With echo off, nothing is printed.
+    """
+
+    def __init__(self, config, max_workers=4, target_seconds=600, max_seconds=900,
+                 silence_threshold=0.001, min_silence=1.0, jobs=None, echo=True):
+        self.config = config
+        self.max_workers = max_workers
+        self.target_seconds = target_seconds
+        self.max_seconds = max_seconds
+        self.silence_threshold = silence_threshold
+        self.min_silence = min_silence
+        self.jobs = jobs or TranscriptionJobs()
+        self.echo = echo
+
+        self.directory = None
+        self.spans = []
+        self.chunk_files = []
+        self.upload_urls = []
+
+    def prepare(self, path):
+        """Split the recording at silences and upload each chunk once"""
+        duration = sf.info(path).duration
+        silences = find_silences(path, self.silence_threshold, self.min_silence)
+        self.spans = plan_chunks(duration, silences, self.target_seconds, self.max_seconds)
+        if self.echo:
+            print(f"Split {duration / 60:.1f} minutes into {len(self.spans)} chunks "
+                  f"across {min(self.max_workers, len(self.spans))} workers")
+
+        start = time.time()
+        self.directory = tempfile.mkdtemp(prefix="chunks_")
+        self.chunk_files = write_chunks(path, self.spans, self.directory)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            uploads = pool.map(lambda chunk_file: self.jobs.upload(chunk_file, self.echo), self.chunk_files)
+            self.upload_urls = [upload_url for upload_url, _ in uploads]
+        if self.echo:
+            print(f"Uploaded {len(self.spans)} chunks in {time.time() - start:.1f} s")
+
+    def submit(self):
+        """Start transcribing the uploaded chunks; returns a Future of the merged Transcript"""
+        background = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = background.submit(self._transcribe_uploaded)
+        background.shutdown(wait=False)
+        return future
+
+    def transcribe(self, path):
+        self.prepare(path)
+        return self.submit().result()
+
+    def _transcribe_uploaded(self):
+        start = time.time()
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                results = list(pool.map(self._transcribe_chunk, range(len(self.upload_urls))))
+            transcript = self._merge(self.spans, self.chunk_files, results)
+        finally:
+            shutil.rmtree(self.directory, ignore_errors=True)
+        if self.echo:
+            print(f"Transcribed {len(self.spans)} chunks in {time.time() - start:.1f} s")
+        return transcript
+
+    def _transcribe_chunk(self, index):
+        try:
+            transcript = self.jobs.transcribe(self.upload_urls[index], self.config.raw.dict(exclude_none=True),
+                                              self.echo)
+        except RuntimeError as e:
+            raise RuntimeError(f"Chunk {index} failed: {str(e)}")
+        return transcript.utterances
+
+    def _merge(self, spans, chunk_files, results):
+        reconciler = SpeakerReconciler()
+        utterances = []
+        for (start, _), chunk_file, chunk_utterances in zip(spans, chunk_files, results):
+            samples, samplerate = sf.read(chunk_file, dtype='float32', always_2d=True)
+            voices = speaker_audio(samples.mean(axis=1), samplerate, chunk_utterances)
+            fingerprints = {speaker: voice_fingerprint(audio, samplerate)
+                            for speaker, audio in voices.items()}
+            speakers = reconciler.assign(fingerprints)
+
+            offset = int(round(start * 1000))
+            for u in chunk_utterances:
+                utterances.append(Utterance(speakers.get(u.speaker, u.speaker),
+                                            u.start + offset, u.end + offset,
+                                            u.text, u.confidence))
+        return Transcript(utterances)
@@ -1,2 +1,114 @@
 # AssemblyAI API Configuration
 ASSEMBLYAI_API_KEY = "YOUR-API-KEY"  # Replace with your actual API key 
+
+# Point at mock_assemblyai.py (http://127.0.0.1:8700) to test without the network
+ASSEMBLYAI_BASE_URL = "https://api.assemblyai.com"
+
+# Live transcription: stream audio to the real-time API while recording so the
+# transcript is ready right after you stop. Point the URL at
+# mock_assemblyai.py (ws://127.0.0.1:8765/v2/realtime/ws) to try it offline.
+LIVE_TRANSCRIPTION = False
+ASSEMBLYAI_REALTIME_URL = "wss://api.assemblyai.com/v2/realtime/ws"
+
+# Format of the compact 16 kHz mono copy uploaded for transcription:
+# "FLAC" (lossless) or "OPUS" (much smaller, speech-grade)
+UPLOAD_FORMAT = "FLAC"
+
+# Leave silences longer than TRIM_SILENCE_SECONDS out of the upload copy
+# (keeping TRIM_PADDING_SECONDS of each), so breaks aren't uploaded and billed.
+# Transcript timestamps (preview, chunks and full transcript alike) are mapped
+# back onto the original recording through the offset map saved with the copy.
+TRIM_SILENCE = True
+TRIM_SILENCE_SECONDS = 3
+TRIM_PADDING_SECONDS = 0.5
+
+# Recordings keep the microphone and system audio as separate stems. With
+# MULTICHANNEL_TRANSCRIPTION they are transcribed as two channels instead of
+# diarizing the mix, so the microphone is always speaker A and the system
+# audio speaker B (best when each source is a single speaker). Silences are
+# not trimmed from this upload.
+MULTICHANNEL_TRANSCRIPTION = False
+
+# Spectral noise reduction of the upload copy once recording stops: a noise
+# profile is taken from the silences and hiss, hum and fan noise are turned
+# down by DENOISE_REDUCTION_DB. Runs on DENOISE_WORKERS processes (0 = one
+# per CPU core; batch.py and the service split the cores between the
+# recordings they transcribe at once). The archival WAV is left untouched.
+DENOISE = True
+DENOISE_WORKERS = 0
+DENOISE_REDUCTION_DB = 12
+
+# Long recordings can be split at silences into chunks of about CHUNK_SECONDS
+# and transcribed CHUNK_WORKERS at a time, which cuts the wait roughly by the
+# number of workers
+CHUNKED_TRANSCRIPTION = False
+CHUNK_SECONDS = 600
+CHUNK_WORKERS = 4
+
+# Uploads are streamed from disk UPLOAD_CHUNK_MB at a time, and uploads, job
+# submissions and status polls are retried with exponential backoff up to
+# UPLOAD_RETRIES times. Upload URLs and job ids are kept in TRANSCRIPTION_JOURNAL
+# for a day, so transcribing a recording again after a failure or a crash
+# neither re-uploads it nor starts its jobs again (empty = don't keep them).
+UPLOAD_CHUNK_MB = 8
+UPLOAD_RETRIES = 5
+TRANSCRIPTION_JOURNAL = ".transcription_jobs.json"
+
+# Voice fingerprints of the speakers you have named, matched against every new
+# recording's preview so known voices are named without asking; you are only
+# asked about new ones. A voice counts as known at
+# SPEAKER_MATCH_THRESHOLD cosine similarity. Leave empty to always ask.
+SPEAKER_PROFILES_FILE = "speaker_profiles.npz"
+SPEAKER_MATCH_THRESHOLD = 0.92
+
+# Transcripts are cached on disk by audio content and settings, so the same
+# recording is never sent to the API twice
+TRANSCRIPT_CACHE_DIR = ".transcript_cache"
+TRANSCRIPT_CACHE_MAX_MB = 200
+
+# Transcript files written next to each recording: "txt" (always written)
+# plus any of "srt", "vtt" (subtitles, one cue per utterance) and "json"
+TRANSCRIPT_FORMATS = ["txt"]
+# Speaker blocks of the transcript shown in the console after saving
+# (0 = the whole transcript)
+CONSOLE_PREVIEW_BLOCKS = 40
+
+# Rotate long recordings into SEGMENT_MINUTES-long files with a manifest while
+# recording, so a crash loses at most one segment (0 = write a single file).
+# The usual recording file is written alongside and the segments are removed
+# when you stop.
+SEGMENT_MINUTES = 0
+
+# batch.py: recordings transcribed at once, and attempts per recording
+BATCH_WORKERS = 3
+BATCH_RETRIES = 3
+
+# service.py: local control API address, transcriptions run at once across
+# all sessions, and the directory that gets one folder per session
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8750
+SERVICE_JOBS = 4
+SERVICE_OUTPUT_DIR = "sessions"
+
+# Capture block size and buffering: "low-latency" (512-frame blocks, snappier
+# meter and live transcription), "balanced" (2048), "throughput" (8192, for
+# weak hardware) or "adaptive", which starts balanced, moves to larger blocks
+# after overflows and back to smaller ones once things are calm. Changes and
+# the measured callback-to-disk latency are printed while recording.
+LATENCY_PROFILE = "balanced"
+
+# The chosen microphone/system devices are saved here and reused on the next
+# start if they are still present, skipping the full device probe. Delete the
+# file to probe again (e.g. after enabling Stereo Mix).
+DEVICE_PROFILE_FILE = ".device_profile.json"
+# Open a short test stream on each device while probing
+DEVICE_TEST_STREAMS = True
+
+# Pipeline metrics (latency, queue depth, xruns, transcription phase times) are
+# written to METRICS_FILE every METRICS_INTERVAL seconds while a session runs,
+# as "json" or "prometheus" text. Leave empty to turn the export off.
+METRICS_FILE = ""
+METRICS_FORMAT = "json"
+METRICS_INTERVAL = 5
+# Seconds between console level meter updates
+METER_INTERVAL = 0.25
@@ -0,0 +1,52 @@
+import queue
+
+
+class Controls:
+    """Control events between the user and the capture loop.
+
+    Keyboard hooks and prompt answers post events, and the capture loop
+    polls them between blocks without ever waiting. Questions the loop
+    wants to ask are answered on another thread (see serve_prompts), so
+    capture and mixing carry on however long the user takes to reply.
+    """
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.questions = queue.Queue()
+        self.pending = set()  # Keys of questions asked but not yet answered
+
+    def post(self, event, value=None):
+        """Queue an event ('pause', 'resume', 'stop' or 'answer') for the loop"""
+        self.events.put((event, value))
+
+    def poll(self):
+        """Return every event posted since the last call, without blocking"""
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def ask(self, key, question):
+        """Ask a yes/no question unless the same one is still open.
+
+        The answer comes back later as an ('answer', (key, response)) event.
+        """
+        if key in self.pending:
+            return False
+        self.pending.add(key)
+        self.questions.put((key, question))
+        return True
+
+    def serve_prompts(self, thread, interval=0.2):
+        """Answer questions with input() until thread (the recording) ends"""
+        while thread.is_alive():
+            try:
+                key, question = self.questions.get(timeout=interval)
+            except queue.Empty:
+                continue
+            print(question)
+            response = input().strip().lower()
+            self.pending.discard(key)
+            self.post('answer', (key, response))
@@ -0,0 +1,274 @@
+"""Offline spectral-gating noise reduction for a finished recording's upload copy.
+
+The capture loop can only afford a per-sample amplitude gate. Once
+recording has stopped there is time for more: a noise profile is taken
+from the silent stretches, and every time-frequency bin of the STFT that
+does not rise clearly above it is turned down. Steady hiss and hum go,
+quiet speech stays. Chunks of the file are processed in parallel worker
+processes while the file is streamed through in order, so memory is
+bounded by the chunks in flight whatever the length of the recording.
+
+    python denoise.py recording_20240315_143022_upload.flac --workers 4
+"""
+import argparse
+import collections
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from lazy import LazyModule
+
+sf = LazyModule('soundfile')
+
+
+def noise_path_for(path):
+    """Path of the noise profile saved once path has been denoised"""
+    return os.path.splitext(path)[0] + "_noise.json"
+
+
+def workers_per_job(jobs, workers=0):
+    """Worker processes for each of jobs recordings denoised at once: a fair
+    share of the cores, or workers if that is fewer (0 = no limit of its own)"""
+    share = max(1, (os.cpu_count() or 1) // jobs)
+    return min(workers, share) if workers else share
+
+
+def denoised_with(path):
+    """reduction_db path was denoised with, or None if it has not been"""
+    try:
+        with open(noise_path_for(path), encoding="utf-8") as f:
+            return json.load(f)['reduction_db']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def stft(samples, n_fft, hop):
+    """Hann-windowed STFT of samples already padded for it; (frames, bins)"""
+    window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+    frames = sliding_window_view(samples, n_fft)[::hop] * window
+    return np.fft.rfft(frames, axis=1)
+
+
+def istft(spectrum, n_fft, hop, length):
+    """Overlap-add inverse of stft() for length samples"""
+    window = np.hanning(n_fft + 1)[:-1].astype(np.float32)
+    frames = np.fft.irfft(spectrum, n=n_fft, axis=1).astype(np.float32) * window
+    overlap = n_fft // hop
+    count = len(frames)
+    out = np.zeros((count + overlap - 1, hop), dtype=np.float32)
+    norm = np.zeros((count + overlap - 1, hop), dtype=np.float32)
+    for j in range(overlap):
+        out[j:j + count] += frames[:, j * hop:(j + 1) * hop]
+        norm[j:j + count] += (window[j * hop:(j + 1) * hop] ** 2)
+    out = out.reshape(-1)[:length]
+    norm = norm.reshape(-1)[:length]
+    return out / np.maximum(norm, 1e-3)
+
+
+def _smooth(mask, bins, frames):
+    """Moving average of the 0/1 speech mask over +-bins and +-frames"""
+    for axis, radius in ((1, bins), (0, frames)):
+        if radius:
+            padded = np.pad(mask, [(radius, radius) if a == axis else (0, 0) for a in range(2)], mode='edge')
+            summed = np.cumsum(padded, axis=axis, dtype=np.float32)
+            summed = np.insert(summed, 0, 0.0, axis=axis)
+            width = 2 * radius + 1
+            upper = np.take(summed, np.arange(width, summed.shape[axis]), axis=axis)
+            lower = np.take(summed, np.arange(0, summed.shape[axis] - width), axis=axis)
+            mask = (upper - lower) / width
+    return mask
+
+
+def gate(samples, threshold_db, n_fft=512, hop=128, reduction_db=12.0, smooth_bins=2, smooth_frames=2):
+    """Spectral gate for mono samples: bins under threshold_db are turned down by reduction_db"""
+    edge = n_fft - hop
+    padded = np.pad(samples.astype(np.float32, copy=False), (edge, edge + n_fft))
+    spectrum = stft(padded, n_fft, hop)
+    level_db = 20 * np.log10(np.abs(spectrum) + 1e-10)
+    mask = _smooth((level_db > threshold_db).astype(np.float32), smooth_bins, smooth_frames)
+    floor = 10 ** (-reduction_db / 20)
+    spectrum *= floor + (1 - floor) * mask
+    return istft(spectrum, n_fft, hop, len(padded))[edge:edge + len(samples)]
+
+
+def denoise_chunk(samples, start, length, threshold_db, options):
+    """Worker: gate a chunk with its context and return the chunk proper.
+
+    The context either side keeps the chunk's edges identical to what
+    gating the whole file at once would give.
+    """
+    if samples.ndim == 1:
+        return gate(samples, threshold_db, **options)[start:start + length]
+    return np.column_stack([gate(samples[:, c], threshold_db, **options)[start:start + length]
+                            for c in range(samples.shape[1])])
+
+
+class NoiseProfile:
+    """Per-bin level (mean and spread, in dB) of the recording's background noise.
+
+    Taken from stretches where the frame RMS stays under the recorder's
+    silence threshold. When the recording has too little of that (say a
+    constant hiss keeps it above the threshold), the quietest tenth of its
+    frames is used instead.
+    """
+
+    def __init__(self, mean_db, std_db, noise_seconds, threshold):
+        self.mean_db = np.asarray(mean_db, dtype=np.float32)
+        self.std_db = np.asarray(std_db, dtype=np.float32)
+        self.noise_seconds = noise_seconds
+        self.threshold = threshold
+
+    def gate_threshold(self, n_std=1.5):
+        return self.mean_db + n_std * self.std_db
+
+    @classmethod
+    def measure(cls, path, silence_threshold=0.001, n_fft=512, hop=128, frame_seconds=0.02,
+                min_seconds=1.0, max_seconds=60.0, blocksize=1 << 16):
+        with sf.SoundFile(path, 'r') as f:
+            samplerate = f.samplerate
+        frame = max(1, int(frame_seconds * samplerate))
+        runs, seconds, levels = cls._silent_runs(path, silence_threshold, frame, n_fft, max_seconds, blocksize)
+        threshold = silence_threshold
+        if seconds < min_seconds and len(levels):
+            threshold = float(np.percentile(levels, 10)) * 1.01
+            runs, seconds, _ = cls._silent_runs(path, threshold, frame, n_fft, max_seconds, blocksize)
+        if not runs:
+            return None
+        spectra = np.concatenate([np.abs(stft(run, n_fft, hop)) for run in runs])
+        level_db = 20 * np.log10(spectra + 1e-10)
+        return cls(level_db.mean(axis=0), level_db.std(axis=0), seconds, threshold)
+
+    @staticmethod
+    def _silent_runs(path, threshold, frame, min_samples, max_seconds, blocksize):
+        """Stretches of consecutive quiet frames, at least min_samples long, up to max_seconds in all.
+
+        Also returns every frame's RMS, for picking a threshold when the
+        given one finds too little.
+        """
+        runs = []
+        run = []  # Pieces of the stretch still open at the end of the last block
+        kept = 0
+        levels = []
+
+        def close_run():
+            nonlocal kept
+            samples = np.concatenate(run)
+            if len(samples) >= min_samples and kept < limit:
+                runs.append(samples)
+                kept += len(samples)
+            run.clear()
+
+        with sf.SoundFile(path, 'r') as f:
+            samplerate = f.samplerate
+            limit = int(max_seconds * samplerate)
+            for block in f.blocks(blocksize - blocksize % frame, dtype='float32', always_2d=True):
+                mono = block.mean(axis=1)
+                count = len(mono) // frame
+                rms = np.sqrt(np.mean(mono[:count * frame].reshape(-1, frame) ** 2, axis=1))
+                levels.append(rms)
+                if kept >= limit or not count:
+                    continue
+                # Alternating start and end frames of the quiet stretches
+                edges = np.flatnonzero(np.diff(np.concatenate(([False], rms < threshold, [False]))))
+                if run and (not len(edges) or edges[0] != 0):
+                    close_run()
+                for start, end in zip(edges[::2], edges[1::2]):
+                    run.append(mono[start * frame:end * frame])  # Continues an open stretch at 0
+                    if end < count:
+                        close_run()
+        if run:
+            close_run()
+        levels = np.concatenate(levels) if levels else np.zeros(0, dtype=np.float32)
+        return runs, kept / samplerate, levels
+
+    def save(self, path, **details):
+        temp = f"{path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({'noise_seconds': self.noise_seconds, 'threshold': self.threshold,
+                       'mean_db': [round(float(v), 2) for v in self.mean_db],
+                       'std_db': [round(float(v), 2) for v in self.std_db], **details}, f)
+        os.replace(temp, path)
+
+
+def _overlapping_chunks(f, chunk, pad):
+    """Yield (samples, start, length): the file chunk by chunk with pad
+    samples of context either side; the chunk itself is samples[start:start + length]"""
+    before = np.zeros((0, f.channels), dtype=np.float32)
+    current = f.read(chunk, dtype='float32', always_2d=True)
+    while len(current):
+        after = f.read(chunk, dtype='float32', always_2d=True)
+        context = before[len(before) - min(pad, len(before)):]
+        samples = np.concatenate((context, current, after[:pad]))
+        yield (samples[:, 0] if f.channels == 1 else samples), len(context), len(current)
+        before, current = current, after
+
+
+def denoise_file(path, silence_threshold=0.001, workers=None, chunk_seconds=30.0, reduction_db=12.0,
+                 n_fft=512, hop=128):
+    """Spectral-gate path in place and save its noise profile next to it.
+
+    Returns the NoiseProfile, or None when the recording has no quiet
+    stretch to take one from (the file is then left as it is).
+    """
+    profile = NoiseProfile.measure(path, silence_threshold, n_fft, hop)
+    if profile is None:
+        return None
+    options = {'n_fft': n_fft, 'hop': hop, 'reduction_db': reduction_db}
+    threshold_db = profile.gate_threshold()
+    workers = workers or os.cpu_count() or 1
+
+    base, extension = os.path.splitext(path)
+    temp = f"{base}_denoising{extension}"
+    try:
+        with sf.SoundFile(path, 'r') as source:
+            # Chunks and context are whole hops, so every chunk's STFT frames
+            # fall on the same grid as the whole file's
+            chunk = max(hop, int(chunk_seconds * source.samplerate) // hop * hop)
+            pad = 4 * n_fft
+            with sf.SoundFile(temp, 'w', samplerate=source.samplerate, channels=source.channels,
+                              format=source.format, subtype=source.subtype) as out:
+                # Spawned, not forked: this runs on a background thread while
+                # others (the console prompt, the writer) hold locks a fork would copy
+                with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                            mp_context=multiprocessing.get_context("spawn")) as pool:
+                    # At most two chunks per worker in flight, written back in order
+                    pending = collections.deque()
+                    for samples, start, length in _overlapping_chunks(source, chunk, pad):
+                        pending.append(pool.submit(denoise_chunk, samples, start, length, threshold_db, options))
+                        if len(pending) >= 2 * workers:
+                            out.write(pending.popleft().result())
+                    while pending:
+                        out.write(pending.popleft().result())
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp, path)
+    profile.save(noise_path_for(path), reduction_db=reduction_db, n_fft=n_fft, hop=hop)
+    return profile
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spectral-gate a recording's upload copy in place")
+    parser.add_argument('path', help="Audio file to denoise (e.g. the _upload.flac copy)")
+    parser.add_argument('--workers', type=int, help="Worker processes (default: one per core)")
+    parser.add_argument('--reduction-db', type=float, default=12.0, help="How far noise is turned down")
+    parser.add_argument('--silence-threshold', type=float, default=0.001,
+                        help="Frame RMS under which audio counts as silence")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    profile = denoise_file(args.path, args.silence_threshold, args.workers, reduction_db=args.reduction_db)
+    if profile is None:
+        print("No quiet stretch to take a noise profile from; file left unchanged.")
+    else:
+        print(f"Denoised in {time.perf_counter() - start:.1f} s "
+              f"(noise profile from {profile.noise_seconds:.1f} s of silence)")
+
+
+if __name__ == "__main__":
+    main()
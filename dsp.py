@@ -0,0 +1,227 @@
+import importlib.util
+
+import numpy as np
+
+from lazy import LazyModule
+
+# Optional: only speeds up MixEngine, and is imported when the first one is built
+HAVE_NUMBA = importlib.util.find_spec('numba') is not None
+numba = LazyModule('numba')
+_kernels = {}
+
+
+class Downsampler:
+    """Streaming mono downmix and integer-factor FIR decimation.
+
+    Used to turn the 48 kHz mix into 16 kHz speech audio. Filter history
+    and the decimation phase carry over between blocks, so feeding a
+    recording block by block gives the same result as one big call.
+    """
+
+    def __init__(self, factor=3, taps=63):
+        self.factor = factor
+        n = np.arange(taps) - (taps - 1) / 2
+        cutoff = 0.45 / factor  # Just under the new Nyquist frequency
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+        self.taps = (h / h.sum()).astype(np.float32)
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        self.offset = 0  # Index of the next kept sample within the next block
+
+    def process(self, block):
+        """Downmix and decimate one block; returns float32 mono samples"""
+        mono = block.mean(axis=1, dtype=np.float32) if block.ndim == 2 else block
+        x = np.concatenate((self.history, mono.astype(np.float32, copy=False)))
+        filtered = np.convolve(x, self.taps, mode='valid')
+        out = filtered[self.offset::self.factor]
+        self.offset = (self.offset - len(mono)) % self.factor
+        self.history = x[len(x) - len(self.history):]
+        return out
+
+
+def to_pcm16(samples):
+    """Convert float samples in [-1, 1] to little-endian 16-bit PCM bytes"""
+    return (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+
+
+def reduce_noise(audio_data, noise_threshold=0.005):
+    """Simple noise gate (modifies audio_data in place)"""
+    audio_data[abs(audio_data) < noise_threshold] = 0
+    return audio_data
+
+
+def mix_audio(mic_data, sys_data):
+    """Improved audio mixing with dynamic leveling"""
+    # Calculate RMS levels
+    mic_rms = np.sqrt(np.mean(mic_data**2))
+
+    # Adjust mixing ratio based on levels
+    if mic_rms > 0.01:  # If there's significant mic input
+        mic_gain = 0.7
+        sys_gain = 0.3
+    else:  # If mic is quiet, boost system audio
+        mic_gain = 0.4
+        sys_gain = 0.6
+
+    # Mix with soft limiting
+    mixed = mic_gain * mic_data + sys_gain * sys_data
+
+    # Apply soft limiting to prevent clipping
+    threshold = 0.95
+    mixed = np.where(
+        abs(mixed) > threshold,
+        np.sign(mixed) * (threshold + (abs(mixed) - threshold) * 0.1),
+        mixed
+    )
+
+    return mixed
+
+
+# Body of MixEngine's compiled kernel; far too slow to run uncompiled
+def _fused_mix(mic, sys, out, gate, loud_mic, limit):
+    frames, mic_channels = mic.shape
+    sys_channels = sys.shape[1]
+    out_channels = out.shape[1]
+
+    # Pass 1: levels of the gated mic and of the system audio
+    mic_sum = 0.0
+    sys_sum = 0.0
+    for i in range(frames):
+        for c in range(mic_channels):
+            v = mic[i, c]
+            if abs(v) >= gate:
+                mic_sum += v * v
+        for c in range(sys_channels):
+            sys_sum += sys[i, c] * sys[i, c]
+    mic_rms = np.sqrt(mic_sum / (frames * mic_channels))
+    sys_rms = np.sqrt(sys_sum / (frames * sys_channels))
+
+    if mic_rms > loud_mic:
+        mic_gain, sys_gain = 0.7, 0.3
+    else:
+        mic_gain, sys_gain = 0.4, 0.6
+
+    # Pass 2: gate, mix and soft-limit straight into the output, one
+    # output channel at a time so the inner loop stays branch-light
+    for c in range(out_channels):
+        mc = c % mic_channels
+        sc = c % sys_channels
+        for i in range(frames):
+            m = mic[i, mc]
+            if abs(m) < gate:
+                m = 0.0
+            x = mic_gain * m + sys_gain * sys[i, sc]
+            a = abs(x)
+            if a > limit:
+                x = np.copysign(limit + (a - limit) * 0.1, x)
+            out[i, c] = x
+    return mic_rms, sys_rms
+
+
+def compiled_fused_mix():
+    """_fused_mix compiled with numba, built (or loaded from cache) on first use"""
+    if 'fused_mix' not in _kernels:
+        _kernels['fused_mix'] = numba.njit(cache=True)(_fused_mix)
+    return _kernels['fused_mix']
+
+
+class MixEngine:
+    """Noise gate, gain selection, mix, soft limiting and level metering in one stage.
+
+    Equivalent to reduce_noise() + mix_audio() + the two RMS level readings
+    in the record loop, but it works in preallocated scratch buffers with
+    in-place NumPy operations (or a compiled kernel when numba is
+    installed), and each RMS is computed once and returned for metering.
+    Source channels are spread over the output channels cyclically, which
+    is the same upmix as duplicating stereo or repeating mono.
+
+    source_channels lists the channel count of each source. The first is
+    the microphone: it is the one gated, and its level picks the gains.
+    Any other sources share the system audio's gain; a microphone on its
+    own is passed through at full level.
+    """
+
+    def __init__(self, max_frames, source_channels, out_channels=4,
+                 noise_threshold=0.005, loud_mic=0.01, limit=0.95, compiled=True):
+        self.max_frames = max_frames
+        self.noise_threshold = noise_threshold
+        self.loud_mic = loud_mic
+        self.limit = limit
+        # The kernel handles the usual microphone + system audio pair
+        self.compiled = compiled and HAVE_NUMBA and len(source_channels) == 2
+        self.kernel = compiled_fused_mix() if self.compiled else None
+
+        mic_channels = source_channels[0]
+        self.out = np.zeros((max_frames, out_channels), dtype=np.float32)
+        self._gated = np.zeros((max_frames, mic_channels), dtype=np.float32)
+        self._mask = np.zeros((max_frames, mic_channels), dtype=np.float32)
+        self._column = np.zeros(max_frames, dtype=np.float32)
+        self._excess = np.zeros((max_frames, out_channels), dtype=np.float32)
+        self.levels = [0.0] * len(source_channels)
+
+        if self.compiled:
+            # numba compiles (or loads from its cache) on the first call; do that
+            # now rather than in the middle of a recording
+            self.process(*(np.zeros((1, channels), dtype=np.float32) for channels in source_channels))
+
+    def process(self, mic_data, *other_data):
+        """Mix one block of each source; returns (mixed view, level of each source).
+
+        The mixed view and the levels list point into scratch memory and
+        are overwritten by the next call.
+        """
+        frames = len(mic_data)
+        out = self.out[:frames]
+        levels = self.levels
+        if not frames:
+            levels[:] = [0.0] * len(levels)
+            return out, levels
+        if self.compiled:
+            mic_rms, sys_rms = self.kernel(mic_data, other_data[0], out, self.noise_threshold,
+                                          self.loud_mic, self.limit)
+            levels[0], levels[1] = float(mic_rms), float(sys_rms)
+            return out, levels
+
+        # Noise gate: multiply by a 0/1 mask instead of boolean indexing
+        gated = self._gated[:frames]
+        mask = self._mask[:frames]
+        np.abs(mic_data, out=mask)
+        np.greater_equal(mask, self.noise_threshold, out=mask, casting='unsafe')
+        np.multiply(mic_data, mask, out=gated)
+
+        # Levels, computed once for both the gain choice and the meter
+        flat = gated.reshape(-1)
+        levels[0] = float(np.sqrt(np.dot(flat, flat) / flat.size))
+        for i, data in enumerate(other_data, 1):
+            flat = data.reshape(-1)
+            levels[i] = float(np.sqrt(np.dot(flat, flat) / flat.size))
+
+        if not other_data:
+            mic_gain, sys_gain = 1.0, 0.0
+        elif levels[0] > self.loud_mic:
+            mic_gain, sys_gain = 0.7, 0.3 / len(other_data)
+        else:
+            mic_gain, sys_gain = 0.4, 0.6 / len(other_data)
+
+        # Mix, spreading each source over the output channels
+        mic_channels = gated.shape[1]
+        column_scratch = self._column[:frames]
+        gated *= mic_gain
+        for c in range(out.shape[1]):
+            column = out[:, c]
+            column[:] = gated[:, c % mic_channels]
+            for data in other_data:
+                np.multiply(data[:, c % data.shape[1]], sys_gain, out=column_scratch)
+                column += column_scratch
+
+        # Soft limit: pull anything over the limit back by 90% of the excess.
+        # Most blocks never reach it, so check the peak first.
+        excess = self._excess[:frames]
+        np.abs(out, out=excess)
+        if excess.max(initial=0.0) > self.limit:
+            excess -= self.limit
+            np.maximum(excess, 0.0, out=excess)
+            excess *= 0.9
+            np.copysign(excess, out, out=excess)
+            out -= excess
+
+        return out, levels
@@ -0,0 +1,295 @@
+import bisect
+import json
+import os
+
+import numpy as np
+
+from denoise import noise_path_for
+from dsp import Downsampler
+from lazy import LazyModule
+from stems import load_layout, mixed_blocks
+
+sf = LazyModule('soundfile')
+
+# name -> (container, subtype, extension)
+UPLOAD_FORMATS = {
+    'FLAC': ('FLAC', 'PCM_16', '.flac'),
+    'OPUS': ('OGG', 'OPUS', '.ogg'),
+}
+
+
+def upload_path_for(audio_file, upload_format='FLAC'):
+    """Path of the compact upload copy that belongs to a recording"""
+    return os.path.splitext(audio_file)[0] + "_upload" + UPLOAD_FORMATS[upload_format][2]
+
+
+def sources_path_for(audio_file, upload_format='FLAC'):
+    """Path of the upload copy with one channel per source, for multichannel transcription"""
+    return os.path.splitext(audio_file)[0] + "_sources" + UPLOAD_FORMATS[upload_format][2]
+
+
+def offsets_path_for(upload_file):
+    """Path of the offset map saved next to a silence-trimmed upload copy"""
+    return os.path.splitext(upload_file)[0] + "_offsets.json"
+
+
+def options_path_for(upload_file):
+    """Path of the trimming settings saved next to an upload copy"""
+    return os.path.splitext(upload_file)[0] + "_options.json"
+
+
+class SilenceTrimmer:
+    """Streaming voice-activity gate that leaves long silences out.
+
+    Audio is judged in short frames with the recorder's RMS-under-threshold
+    test. A silence longer than min_silence seconds is cut down to padding
+    seconds on either side, so speech keeps its lead-in and tail and the
+    transcript's pauses still read naturally. Memory is bounded by
+    min_silence, whatever the length of the recording.
+    """
+
+    def __init__(self, samplerate, threshold=0.001, min_silence=3.0, padding=0.5, frame_seconds=0.02):
+        self.samplerate = samplerate
+        self.threshold = threshold
+        self.frame = max(1, int(frame_seconds * samplerate))
+        self.padding = int(padding * samplerate)
+        self.max_gap = max(int(min_silence * samplerate), 2 * self.padding + self.frame)
+        self.remainder = np.zeros(0, dtype=np.float32)
+        self.held = []  # Silent frames since the last sound, not yet written
+        self.held_samples = 0
+        self.cutting = False
+        self.source_samples = 0  # Samples judged so far
+        self.output_samples = 0
+        self.spans = [(0, 0)]  # (output sample, source sample) where each kept stretch starts
+
+    def process(self, samples):
+        """Gate a block of mono samples; returns the samples to keep"""
+        samples = np.concatenate((self.remainder, samples))
+        whole = len(samples) // self.frame * self.frame
+        self.remainder = samples[whole:]
+        frames = samples[:whole].reshape(-1, self.frame)
+        voiced = np.sqrt(np.mean(frames ** 2, axis=1)) >= self.threshold
+
+        kept = []
+        for frame, is_voiced in zip(frames, voiced):
+            if is_voiced:
+                held = self._take_held()
+                if self.cutting:
+                    # Resume with a lead-in; this stretch starts a new span
+                    held = held[len(held) - self.padding:]
+                    self.spans.append((self.output_samples, self.source_samples - len(held)))
+                    self.cutting = False
+                kept += [held, frame]
+                self.output_samples += len(held) + len(frame)
+            else:
+                self.held.append(frame)
+                self.held_samples += len(frame)
+                if not self.cutting and self.held_samples > self.max_gap:
+                    # The pause is long enough to cut: keep its first padding as a tail
+                    held = self._take_held()
+                    kept.append(held[:self.padding])
+                    self.output_samples += self.padding
+                    self.held, self.held_samples = [held[len(held) - self.padding:]], self.padding
+                    self.cutting = True
+                elif self.cutting and self.held_samples > 2 * self.padding:
+                    held = self._take_held()
+                    held = held[len(held) - self.padding:]
+                    self.held, self.held_samples = [held], len(held)
+            self.source_samples += len(frame)
+        return np.concatenate(kept) if kept else self.remainder[:0]
+
+    def flush(self):
+        """End of stream: returns a short trailing pause, or nothing after a cut"""
+        self.source_samples += len(self.remainder)
+        if self.cutting:
+            tail = self.remainder[:0]
+        else:
+            tail = np.concatenate((self._take_held(), self.remainder))
+        self.output_samples += len(tail)
+        self.remainder = self.remainder[:0]
+        return tail
+
+    def offset_map(self):
+        return OffsetMap(self.spans, self.samplerate, self.source_samples, self.output_samples)
+
+    def _take_held(self):
+        held = np.concatenate(self.held) if self.held else self.remainder[:0]
+        self.held, self.held_samples = [], 0
+        return held
+
+
+class OffsetMap:
+    """Maps times in a silence-trimmed upload copy back onto the original recording"""
+
+    def __init__(self, spans, samplerate, source_samples, output_samples):
+        self.spans = [tuple(span) for span in spans]
+        self.samplerate = samplerate
+        self.source_samples = source_samples
+        self.output_samples = output_samples
+        self.output_starts = [output for output, _ in self.spans]
+
+    @property
+    def source_seconds(self):
+        return self.source_samples / self.samplerate
+
+    @property
+    def trimmed_seconds(self):
+        return (self.source_samples - self.output_samples) / self.samplerate
+
+    def to_source_ms(self, ms):
+        """Original recording time of a time (ms) in the trimmed copy"""
+        sample = ms * self.samplerate / 1000
+        i = max(bisect.bisect_right(self.output_starts, sample) - 1, 0)
+        output, source = self.spans[i]
+        return int(round((source + sample - output) * 1000 / self.samplerate))
+
+    def remap(self, utterances):
+        """Move utterance (and word) times onto the original timeline, in place"""
+        for utterance in utterances or []:
+            for item in [utterance] + list(getattr(utterance, 'words', None) or []):
+                item.start = self.to_source_ms(item.start)
+                item.end = self.to_source_ms(item.end)
+
+    def save(self, path):
+        temp = f"{path}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({'samplerate': self.samplerate, 'source_samples': self.source_samples,
+                       'output_samples': self.output_samples, 'spans': self.spans}, f)
+        os.replace(temp, path)
+
+    @classmethod
+    def load(cls, path):
+        """The saved map, or None if the upload copy was not trimmed"""
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            return cls(data['spans'], data['samplerate'], data['source_samples'], data['output_samples'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+class UploadEncoder:
+    """Writes a compact mono speech copy of the mix for transcription.
+
+    The archival WAV keeps full resolution; this copy is downmixed,
+    resampled to 16 kHz and compressed (lossless FLAC or Opus), which is
+    all speech recognition needs. Blocks are encoded as they arrive, so it
+    can run alongside the recorder or over an existing file.
+
+    With trim_silence, long silences are left out (see SilenceTrimmer) and
+    the offset map needed to restore the original timestamps is saved next
+    to the copy when it is closed. The trimming settings are saved next to
+    it too, so a copy made with other settings is not reused.
+    """
+
+    def __init__(self, path, source_rate=48000, target_rate=16000, upload_format='FLAC',
+                 trim_silence=False, silence_threshold=0.001, min_silence=3.0, padding=0.5):
+        if source_rate % target_rate:
+            # Only integer decimation is supported; keep the source rate otherwise
+            target_rate = source_rate
+        self.path = path
+        self.samplerate = target_rate
+        self.downsampler = Downsampler(factor=source_rate // target_rate)
+        container, subtype, _ = UPLOAD_FORMATS[upload_format]
+        self.file = sf.SoundFile(path, 'w', samplerate=target_rate, channels=1,
+                                 format=container, subtype=subtype)
+        self.trimmer = None
+        self.offsets = None
+        self.options = {'trim_silence': trim_silence, 'silence_threshold': silence_threshold,
+                        'min_silence': min_silence, 'padding': padding}
+        if trim_silence:
+            self.trimmer = SilenceTrimmer(target_rate, silence_threshold, min_silence, padding)
+        for stale in (offsets_path_for(path), noise_path_for(path), options_path_for(path)):
+            if os.path.exists(stale):
+                os.remove(stale)  # Belongs to the copy being replaced
+
+    def write(self, block):
+        samples = self.downsampler.process(block)
+        if self.trimmer is not None:
+            samples = self.trimmer.process(samples)
+        if len(samples):
+            self.file.write(samples)
+
+    def close(self):
+        if self.file.closed:
+            return
+        if self.trimmer is not None:
+            tail = self.trimmer.flush()
+            if len(tail):
+                self.file.write(tail)
+        self.file.close()
+        if self.trimmer is not None:
+            self.offsets = self.trimmer.offset_map()
+            self.offsets.save(offsets_path_for(self.path))
+        options_file = options_path_for(self.path)
+        with open(f"{options_file}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.options, f)
+        os.replace(f"{options_file}.tmp", options_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def encode_for_upload(audio_file, path=None, upload_format='FLAC', blocksize=8192, **trim_options):
+    """Stream a recording into an upload copy with bounded memory.
+
+    trim_options are UploadEncoder's silence trimming arguments. Returns
+    the path and the offset map (None when not trimming).
+    """
+    path = path or upload_path_for(audio_file, upload_format)
+    with UploadEncoder(path, sf.info(audio_file).samplerate, upload_format=upload_format,
+                       **trim_options) as encoder:
+        for block in mixed_blocks(audio_file, blocksize):
+            encoder.write(block)
+    return path, encoder.offsets
+
+
+def encode_sources(audio_file, path=None, upload_format='FLAC', target_rate=16000, blocksize=65536):
+    """Stream a stem recording into a 16 kHz copy with the microphone on
+    channel 1 and the system audio on channel 2, each downmixed to mono.
+
+    Silences are kept, so the channels' timestamps need no remapping.
+    """
+    path = path or sources_path_for(audio_file, upload_format)
+    mic_channels, _ = load_layout(audio_file)
+    container, subtype, _ = UPLOAD_FORMATS[upload_format]
+    with sf.SoundFile(audio_file, 'r') as source:
+        factor = 1 if source.samplerate % target_rate else source.samplerate // target_rate
+        mic, system = Downsampler(factor=factor), Downsampler(factor=factor)
+        with sf.SoundFile(path, 'w', samplerate=source.samplerate // factor, channels=2,
+                          format=container, subtype=subtype) as copy:
+            for block in source.blocks(blocksize, dtype='float32', always_2d=True):
+                copy.write(np.column_stack((mic.process(block[:, :mic_channels]),
+                                            system.process(block[:, mic_channels:]))))
+    return path
+
+
+def is_complete_copy(path, audio_file, tolerance=0.5, trim_options=None):
+    """True if path exists and covers the whole recording.
+
+    The copy's header is only finalized when it is closed cleanly, so a
+    copy left behind by a crash reports the wrong length and is rebuilt.
+    A trimmed copy is checked against the lengths in its offset map. With
+    trim_options, the copy must also have been encoded with them.
+    """
+    if not os.path.exists(path):
+        return False
+    if trim_options is not None:
+        try:
+            with open(options_path_for(path), encoding="utf-8") as f:
+                if json.load(f) != trim_options:
+                    return False
+        except (OSError, ValueError):
+            return False
+    try:
+        offsets = OffsetMap.load(offsets_path_for(path))
+        if offsets is None:
+            return abs(sf.info(path).duration - sf.info(audio_file).duration) <= tolerance
+        return (abs(sf.info(path).duration - offsets.output_samples / offsets.samplerate) <= tolerance
+                and abs(offsets.source_seconds - sf.info(audio_file).duration) <= tolerance)
+    except RuntimeError:
+        return False
+
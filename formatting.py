@@ -0,0 +1,152 @@
+"""Transcript writers: the speaker-grouped text script, SRT, WebVTT and JSON.
+
+Each writer takes utterances one at a time and writes as it goes, so
+write_transcript() can feed any number of them (files and the console)
+from a single pass over a transcript, and an 8-hour session never has
+to exist as one big string.
+"""
+import json
+
+
+def format_time(start_ms):
+    """[MM:SS] as used in the text transcript"""
+    seconds = int(start_ms / 1000)
+    minutes = seconds // 60
+    seconds = seconds % 60
+    return f"[{minutes:02d}:{seconds:02d}]"
+
+
+def cue_time(ms, separator):
+    """HH:MM:SS,mmm (SRT) or HH:MM:SS.mmm (WebVTT)"""
+    ms = max(0, int(ms))
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+class TextWriter:
+    """The script-style transcript: consecutive utterances of a speaker form a block.
+
+    With max_blocks, only that many blocks are written followed by a note
+    of how many were left out (used for the console preview).
+    """
+
+    def __init__(self, f, speaker_names, max_blocks=None):
+        self.f = f
+        self.max_blocks = max_blocks
+        self.blocks = 0
+        self.skipped = 0
+        self.speaker = None
+        self.start = 0
+        self.texts = []
+
+        header = "=== Complete Transcript with Speaker Identification ===\n"
+        header += "\nSpeaker mapping:"
+        for speaker, name in speaker_names.items():
+            header += f"\n{speaker} → {name}"
+        header += "\n\n" + "=" * 50 + "\n"
+        f.write(header)
+
+    def add(self, utterance, speaker):
+        if speaker != self.speaker:
+            self._write_block()
+            self.speaker = speaker
+            self.start = utterance.start  # Each block is stamped with its own first utterance
+        self.texts.append(utterance.text)
+
+    def close(self):
+        self._write_block()
+        if self.skipped:
+            self.f.write(f"\n\n... {self.skipped} more speaker blocks not shown\n")
+
+    def _write_block(self):
+        if not self.texts:
+            return
+        if self.max_blocks is None or self.blocks < self.max_blocks:
+            separator = "\n" if self.blocks else ""
+            self.f.write(f"{separator}\n{format_time(self.start)} {self.speaker}:\n    " + " ".join(self.texts))
+            self.blocks += 1
+        else:
+            self.skipped += 1
+        self.texts = []
+
+
+class SrtWriter:
+    """SubRip subtitles, one numbered cue per utterance"""
+
+    separator = ","
+
+    def __init__(self, f, speaker_names):
+        self.f = f
+        self.cues = 0
+
+    def add(self, utterance, speaker):
+        self.cues += 1
+        self.f.write(f"{self.cues}\n{cue_time(utterance.start, self.separator)} --> "
+                     f"{cue_time(utterance.end, self.separator)}\n{speaker}: {utterance.text}\n\n")
+
+    def close(self):
+        pass
+
+
+class VttWriter(SrtWriter):
+    """WebVTT captions, one cue per utterance with a voice tag for the speaker"""
+
+    separator = "."
+
+    def __init__(self, f, speaker_names):
+        super().__init__(f, speaker_names)
+        f.write("WEBVTT\n\n")
+
+    def add(self, utterance, speaker):
+        self.cues += 1
+        self.f.write(f"{self.cues}\n{cue_time(utterance.start, self.separator)} --> "
+                     f"{cue_time(utterance.end, self.separator)}\n<v {speaker}>{utterance.text}\n\n")
+
+
+class JsonWriter:
+    """The speaker mapping and every utterance with its speaker's name, times in ms"""
+
+    def __init__(self, f, speaker_names):
+        self.f = f
+        self.first = True
+        self.encode = json.JSONEncoder(ensure_ascii=False).encode  # json.dumps would build one per call
+        f.write('{"speakers": ' + self.encode(speaker_names) + ', "utterances": [')
+
+    def add(self, utterance, speaker):
+        item = {'speaker': speaker, 'label': utterance.speaker, 'start': utterance.start,
+                'end': utterance.end, 'text': utterance.text,
+                'confidence': getattr(utterance, 'confidence', None)}
+        self.f.write(("\n" if self.first else ",\n") + self.encode(item))
+        self.first = False
+
+    def close(self):
+        self.f.write("\n]}\n")
+
+
+WRITERS = {'txt': TextWriter, 'srt': SrtWriter, 'vtt': VttWriter, 'json': JsonWriter}
+
+
+def known_formats(formats):
+    """The formats to write: txt first, then those of formats that WRITERS has.
+
+    Unknown entries are dropped with a warning, so a typo in the config
+    costs only that format rather than every transcript file.
+    """
+    formats = [str(fmt).lower() for fmt in formats]
+    unknown = [fmt for fmt in formats if fmt not in WRITERS]
+    if unknown:
+        print(f"Ignoring unknown transcript format{'s' if len(unknown) > 1 else ''} {', '.join(unknown)} "
+              f"in TRANSCRIPT_FORMATS (known: {', '.join(WRITERS)})")
+    return ['txt'] + [fmt for fmt in dict.fromkeys(formats) if fmt in WRITERS and fmt != 'txt']
+
+
+def write_transcript(transcript, speaker_names, writers):
+    """Feed every utterance, with its speaker's name, to each writer in one pass"""
+    for utterance in transcript.utterances or []:
+        speaker = speaker_names.get(utterance.speaker, utterance.speaker)
+        for writer in writers:
+            writer.add(utterance, speaker)
+    for writer in writers:
+        writer.close()
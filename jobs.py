@@ -0,0 +1,281 @@
+"""Uploads and transcription jobs that survive network trouble and restarts.
+
+Every upload and request is retried with exponential backoff. Jobs are
+submitted on background threads and polled from one more, each at its
+own pace: the interval grows while a job is still processing and backs
+off further after failed polls. Submit returns a Future straight away,
+so callers carry on while jobs are started and run.
+
+Upload URLs (by file content) and job ids (by upload and settings) are
+kept in a journal file. A process restarted after a crash finds its
+uploads and jobs there: nothing is uploaded or submitted twice, and jobs
+that finished meanwhile are simply collected. Processes sharing the
+journal (a recorder, a batch run and the service) merge their changes
+into it under a file lock instead of overwriting each other's.
+"""
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+from lazy import LazyModule
+from uploads import RETRY_STATUS, api_client, file_digest, transcript_from_response, upload_file, with_retries
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+aai = LazyModule('assemblyai')
+httpx = LazyModule('httpx')
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path (created if missing) across processes"""
+    with open(path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class JobJournal:
+    """Upload URLs and job ids on disk, dropped after max_age_hours.
+
+    Only this process's own puts and forgets are written: each save merges
+    them into whatever is on disk by then. An empty path keeps the journal
+    in memory only.
+    """
+
+    def __init__(self, path, max_age_hours=24.0):
+        self.path = path
+        self.max_age = max_age_hours * 3600
+        self.lock = threading.Lock()
+        self.changes = []  # (section, key, entry or None to forget) not yet saved
+        self.data = self._expire(self._read())
+
+    def _read(self):
+        data = {'uploads': {}, 'jobs': {}}
+        if self.path:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    data.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        return data
+
+    def _expire(self, data):
+        cutoff = time.time() - self.max_age
+        for section in data.values():
+            for key in [key for key, entry in section.items() if entry['time'] < cutoff]:
+                del section[key]
+        return data
+
+    def get(self, section, key):
+        with self.lock:
+            entry = self.data[section].get(key)
+        return entry['value'] if entry else None
+
+    def put(self, section, key, value):
+        with self.lock:
+            entry = {'value': value, 'time': time.time()}
+            self.data[section][key] = entry
+            self.changes.append((section, key, entry))
+            self._save()
+
+    def forget(self, section, key):
+        with self.lock:
+            if self.data[section].pop(key, None) is not None:
+                self.changes.append((section, key, None))
+                self._save()
+
+    def forget_value(self, section, value):
+        with self.lock:
+            keys = [key for key, entry in self.data[section].items() if entry['value'] == value]
+            for key in keys:
+                del self.data[section][key]
+                self.changes.append((section, key, None))
+            if keys:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            self.changes = []
+            return
+        with file_lock(f"{self.path}.lock"):
+            # Other processes may have saved since: apply this one's changes on top
+            data = self._read()
+            for section, key, entry in self.changes:
+                if entry is None:
+                    data[section].pop(key, None)
+                else:
+                    data[section][key] = entry
+            self.data = self._expire(data)
+            self.changes = []
+            temp = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f)
+            os.replace(temp, self.path)
+
+
+class TranscriptionJobs:
+    """Uploads files and runs transcription jobs against the AssemblyAI REST API.
+
+    One instance is meant to be shared by everything transcribing in a
+    process (see service.py and batch.py), so all jobs are polled by the
+    same thread and recorded in the same journal.
+    """
+
+    def __init__(self, journal_path="", chunk_size=8 << 20, retries=5, backoff=1.0,
+                 interval=None, max_interval=10.0, submit_workers=4):
+        self.journal = JobJournal(journal_path)
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.interval = interval  # First poll delay; the SDK's polling_interval if None
+        self.max_interval = max_interval
+        self.pending = {}  # Job id -> state of its polling
+        self.submitter = concurrent.futures.ThreadPoolExecutor(max_workers=submit_workers)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+
+    def upload(self, path, echo=True):
+        """Upload path unless the journal has its content already.
+
+        Returns (upload URL, whether an earlier upload was reused). With
+        echo off, retries are not announced; the same goes for submit().
+        """
+        digest = file_digest(path)
+        upload_url = self.journal.get('uploads', digest)
+        if upload_url is not None:
+            return upload_url, True
+        upload_url = upload_file(path, self.chunk_size, self.retries, self.backoff, echo)
+        self.journal.put('uploads', digest, upload_url)
+        return upload_url, False
+
+    def submit(self, upload_url, params, echo=True):
+        """Start (or pick up) a job for upload_url with the request fields in params.
+
+        Returns a Future of its Transcript.
+        """
+        future = concurrent.futures.Future()
+        self.submitter.submit(self._start, upload_url, params, future, echo)
+        return future
+
+    def transcribe(self, upload_url, params, echo=True):
+        return self.submit(upload_url, params, echo).result()
+
+    def _start(self, upload_url, params, future, echo):
+        try:
+            key, job_id = self._job_for(upload_url, params, echo)
+        except Exception as e:
+            future.set_exception(e)
+            return
+        interval = self.interval or aai.settings.polling_interval
+        with self.lock:
+            if job_id in self.pending:  # The same job asked for twice shares its result
+                self.pending[job_id]['futures'].append(future)
+                self.pending[job_id]['echo'] |= echo
+                return
+            self.pending[job_id] = {'futures': [future], 'key': key, 'due': time.monotonic() + interval,
+                                    'interval': interval, 'failures': 0, 'echo': echo}
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._poll_forever, daemon=True)
+                self.thread.start()
+        self.wake.set()
+
+    def _job_for(self, upload_url, params, echo=True):
+        """(journal key, job id), submitting the job unless the journal has it"""
+        request = {'audio_url': upload_url, **params}
+        key = hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        job_id = self.journal.get('jobs', key)
+        if job_id is None:
+            client = api_client()
+            response = with_retries(lambda: client.post("/v2/transcript", json=request),
+                                    "Submitting transcription", self.retries, self.backoff, echo)
+            if response.status_code != 200:
+                # Perhaps an upload that has expired: the next attempt uploads again
+                self.journal.forget_value('uploads', upload_url)
+                raise RuntimeError(f"Submitting transcription failed: {response.status_code} {response.text}")
+            job_id = response.json()['id']
+            self.journal.put('jobs', key, job_id)
+        return key, job_id
+
+    def _poll_forever(self):
+        while True:
+            self.wake.clear()  # Before looking, so a job submitted from here on wakes the wait below
+            now = time.monotonic()
+            with self.lock:
+                due = [job_id for job_id, job in self.pending.items() if job['due'] <= now]
+            for job_id in due:
+                try:
+                    self._poll(job_id)
+                except Exception as e:
+                    self._finish(job_id, error=f"Polling transcript {job_id} failed: {str(e)}")
+            with self.lock:
+                next_due = min((job['due'] for job in self.pending.values()), default=None)
+            self.wake.wait(None if next_due is None else max(0.0, next_due - time.monotonic()))
+
+    def _poll(self, job_id):
+        job = self.pending[job_id]
+        try:
+            response = api_client().get(f"/v2/transcript/{job_id}")
+            problem = None
+            if response.status_code in RETRY_STATUS:
+                problem = f"{response.status_code} {response.text[:200]}"
+        except httpx.TransportError as e:
+            response, problem = None, f"{type(e).__name__}: {e}"
+
+        if problem is not None:
+            # Back off, and give up only after retries polls in a row have failed
+            job['failures'] += 1
+            if job['failures'] < self.retries:
+                delay = min(self.backoff * 2 ** job['failures'], self.max_interval)
+                job['due'] = time.monotonic() + delay
+                if job['echo']:
+                    print(f"Polling transcript {job_id} failed ({problem}); retrying in {delay:.1f} s")
+                return
+            self._finish(job_id, error=f"Polling transcript {job_id} failed after {self.retries} attempts: "
+                                       f"{problem}")
+            return
+        job['failures'] = 0
+
+        if response.status_code != 200:
+            # Unknown or expired job: forget it, so trying again submits a new one
+            self.journal.forget('jobs', job['key'])
+            self._finish(job_id, error=f"Polling transcript {job_id} failed: {response.status_code} {response.text}")
+            return
+        data = response.json()
+        if data['status'] == 'completed':
+            self._finish(job_id, transcript=transcript_from_response(data))
+        elif data['status'] == 'error':
+            self.journal.forget('jobs', job['key'])
+            self._finish(job_id, error=data.get('error') or "transcription failed")
+        else:
+            # A quarter longer each time: a job is noticed at most about that late
+            job['interval'] = min(job['interval'] * 1.25, self.max_interval)
+            job['due'] = time.monotonic() + job['interval']
+
+    def _finish(self, job_id, transcript=None, error=None):
+        with self.lock:
+            job = self.pending.pop(job_id)
+        for future in job['futures']:
+            if error is None:
+                future.set_result(transcript)
+            else:
+                future.set_exception(RuntimeError(error))
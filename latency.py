@@ -0,0 +1,98 @@
+"""Capture latency profiles, and the adaptive mode that moves between them."""
+
+# name -> (frames per device callback, PortAudio latency hint, seconds per disk write).
+# A latency hint of None leaves the host API's default.
+LATENCY_PROFILES = {
+    'low-latency': (512, 'low', 0.1),
+    'balanced': (2048, None, 0.5),
+    'throughput': (8192, 'high', 1.0),
+}
+
+
+def metric_name(profile):
+    """Name of the callback-to-disk timing recorded while profile is in use"""
+    return "callback_to_disk_" + profile.replace('-', '_')
+
+
+class LatencyController:
+    """Chooses the capture settings, and in adaptive mode changes them as the session runs.
+
+    Adaptive mode starts out balanced. Any new overflow (a callback's
+    input_overflow flag, or a ring or the disk writer dropping a block)
+    or the loop falling more than max_lag seconds behind capture steps up
+    to larger blocks and more buffering; calm_seconds without either
+    steps back down. Changes are at least hold_seconds apart, so trouble
+    caused by the change itself is not answered again, and every time a
+    step down has to be undone the calm needed for the next one doubles.
+    """
+
+    STEPS = ('low-latency', 'balanced', 'throughput')
+
+    def __init__(self, profile='balanced', max_lag=1.0, calm_seconds=60.0, hold_seconds=5.0):
+        if profile != 'adaptive' and profile not in LATENCY_PROFILES:
+            raise ValueError(f"Unknown latency profile {profile!r}")
+        self.adaptive = profile == 'adaptive'
+        self.profile = 'balanced' if self.adaptive else profile
+        self.max_lag = max_lag
+        self.calm_seconds = calm_seconds
+        self.hold_seconds = hold_seconds
+        self.overflows = 0
+        self.changed_at = 0.0
+        self.calm_since = 0.0
+        self.stepped_down = False
+        self.changes = []  # (time, old profile, new profile, reason)
+
+    @property
+    def settings(self):
+        """(blocksize, latency hint, writer batch seconds) of the current profile"""
+        return LATENCY_PROFILES[self.profile]
+
+    @property
+    def largest_blocksize(self):
+        """Largest blocksize this session may use, for sizing buffers once"""
+        if self.adaptive:
+            return max(LATENCY_PROFILES[name][0] for name in self.STEPS)
+        return self.settings[0]
+
+    def start(self, now, overflows=0):
+        self.overflows = overflows
+        self.changed_at = self.calm_since = now
+
+    def update(self, now, overflows, lag):
+        """Feed the running overflow total and the current lag behind capture.
+
+        Returns (old profile, new profile, reason) when the settings should
+        change, otherwise None.
+        """
+        if not self.adaptive:
+            return None
+        new_overflows = overflows - self.overflows
+        self.overflows = overflows
+        if new_overflows:
+            trouble = f"{new_overflows} overflow{'s' if new_overflows > 1 else ''}"
+        elif lag > self.max_lag:
+            trouble = f"{lag:.2f} s behind capture"
+        else:
+            trouble = None
+        if trouble:
+            self.calm_since = now
+        if now - self.changed_at < self.hold_seconds:
+            return None
+
+        step = self.STEPS.index(self.profile)
+        if trouble and step < len(self.STEPS) - 1:
+            if self.stepped_down:
+                self.calm_seconds *= 2
+            self.stepped_down = False
+            return self._change(now, self.STEPS[step + 1], trouble)
+        if not trouble and step > 0 and now - self.calm_since >= self.calm_seconds:
+            self.stepped_down = True
+            return self._change(now, self.STEPS[step - 1], f"no overflows for {now - self.calm_since:.0f} s")
+        return None
+
+    def _change(self, now, profile, reason):
+        change = (self.profile, profile, reason)
+        self.changes.append((now,) + change)
+        self.profile = profile
+        self.changed_at = self.calm_since = now
+        return change
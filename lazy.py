@@ -0,0 +1,32 @@
+import importlib
+import time
+
+# Seconds spent importing each lazily loaded module, for startup reporting
+IMPORT_TIMES = {}
+
+
+class LazyModule:
+    """Placeholder for a module that is only imported when first used.
+
+    Heavy dependencies (assemblyai, sounddevice, soundfile, keyboard, ...)
+    are bound to a LazyModule at the top of a file instead of imported, so
+    starting the program only pays for what the chosen path actually uses.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            start = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            IMPORT_TIMES[self._name] = time.perf_counter() - start
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
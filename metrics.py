@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """Counters, high-water marks and timings for the recording pipeline.
+
+    Updates are a dict operation under an uncontended lock, cheap enough
+    for the capture loop and the audio callbacks. Values that other
+    objects already count (ring overflows, aligner drops, ...) are pulled
+    in by collectors only when a snapshot is taken. When a path is given,
+    a background thread writes the snapshot there every interval seconds
+    as JSON or Prometheus text, replacing the file atomically.
+    """
+
+    def __init__(self, path=None, fmt='json', interval=5.0, prefix='recorder'):
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.timings = {}  # name -> [count, total seconds, max seconds, last seconds]
+        self.collectors = []
+        self.flusher = None
+        self.stopping = threading.Event()
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        with self.lock:
+            self.gauges[name] = value
+
+    def high_water(self, name, value):
+        """Keep the largest value seen for name"""
+        with self.lock:
+            if value > self.gauges.get(name, value - 1):
+                self.gauges[name] = value
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+                timing[3] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def add_collector(self, collector):
+        """collector() returns {name: value}, read at snapshot time"""
+        self.collectors.append(collector)
+
+    def snapshot(self):
+        collected = {}
+        for collector in self.collectors:
+            try:
+                collected.update(collector())
+            except Exception:
+                pass  # A collector whose source is gone must not break the export
+        with self.lock:
+            return {
+                'time': time.time(),
+                'counters': dict(self.counters),
+                'gauges': {**self.gauges, **collected},
+                'timings': {name: {'count': c, 'total': t, 'mean': t / c, 'max': m, 'last': last}
+                            for name, (c, t, m, last) in self.timings.items()},
+            }
+
+    def prometheus_text(self, snapshot):
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            lines += [f"# TYPE {self.prefix}_{name}_total counter", f"{self.prefix}_{name}_total {value}"]
+        for name, value in sorted(snapshot['gauges'].items()):
+            lines += [f"# TYPE {self.prefix}_{name} gauge", f"{self.prefix}_{name} {value}"]
+        for name, timing in sorted(snapshot['timings'].items()):
+            metric = f"{self.prefix}_{name}_seconds"
+            lines += [f"# TYPE {metric} summary",
+                      f"{metric}_count {timing['count']}",
+                      f"{metric}_sum {timing['total']:.6f}",
+                      f"# TYPE {metric}_max gauge",
+                      f"{metric}_max {timing['max']:.6f}"]
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Write the current snapshot to path (no-op without a path)"""
+        if not self.path:
+            return
+        snapshot = self.snapshot()
+        if self.fmt == 'prometheus':
+            text = self.prometheus_text(snapshot)
+        else:
+            text = json.dumps(snapshot, indent=2)
+        temp = f"{self.path}.tmp"
+        try:
+            with open(temp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp, self.path)
+        except OSError as e:
+            print(f"\nCould not write metrics: {e}")
+
+    def start(self):
+        """Flush every interval seconds from a background thread until stop()"""
+        if not self.path or self.flusher is not None:
+            return self
+        self.stopping.clear()
+        self.flusher = threading.Thread(target=self._run, name="metrics-flusher", daemon=True)
+        self.flusher.start()
+        return self
+
+    def stop(self):
+        if self.flusher is not None:
+            self.stopping.set()
+            self.flusher.join()
+            self.flusher = None
+        self.flush()
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            self.flush()
+
+
+class RateLimiter:
+    """ready() is True at most once per interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_time = 0.0
+
+    def ready(self):
+        now = time.monotonic()
+        if now < self.next_time:
+            return False
+        self.next_time = now + self.interval
+        return True
@@ -0,0 +1,353 @@
+"""Local stand-ins for the AssemblyAI services, for testing without the network.
+
+Run it and point config.py at it, e.g.:
+
+    python mock_assemblyai.py --port 8700 --realtime-port 8765
+    ASSEMBLYAI_BASE_URL = "http://127.0.0.1:8700"
+    ASSEMBLYAI_REALTIME_URL = "ws://127.0.0.1:8765/v2/realtime/ws"
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import soundfile as sf
+from websockets.exceptions import ConnectionClosed
+from websockets.sync.server import serve
+
+
+class RealtimeStandIn:
+    """Emulates the real-time websocket protocol.
+
+    Every utterance_ms of received audio becomes a FinalTranscript, with a
+    PartialTranscript after each audio message in between.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, utterance_ms=5000):
+        self.host = host
+        self.port = port
+        self.utterance_ms = utterance_ms
+        self.sessions = 0
+        self.audio_ms_received = 0
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}/v2/realtime/ws"
+
+    def start(self):
+        self.server = serve(self._handle, self.host, self.port)
+        self.port = self.server.socket.getsockname()[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.thread.join()
+
+    def _handle(self, websocket):
+        query = parse_qs(urlparse(websocket.request.path).query)
+        sample_rate = int(query.get('sample_rate', ['16000'])[0])
+        self.sessions += 1
+
+        websocket.send(json.dumps({
+            'message_type': 'SessionBegins',
+            'session_id': str(uuid.uuid4()),
+            'expires_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(time.time() + 3600)),
+        }))
+
+        received_ms = 0
+        utterance_start = 0
+        count = 0
+
+        def transcript(message_type):
+            return json.dumps({
+                'message_type': message_type,
+                'audio_start': int(utterance_start),
+                'audio_end': int(received_ms),
+                'confidence': 0.9,
+                'text': f"Stand-in utterance {count + 1}",
+                'words': [],
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            })
+
+        try:
+            for raw in websocket:
+                message = json.loads(raw)
+                if 'audio_data' in message:
+                    samples = len(base64.b64decode(message['audio_data'])) // 2
+                    received_ms += samples * 1000 / sample_rate
+                    self.audio_ms_received += samples * 1000 / sample_rate
+                    if received_ms - utterance_start >= self.utterance_ms:
+                        websocket.send(transcript('FinalTranscript'))
+                        count += 1
+                        utterance_start = received_ms
+                    else:
+                        websocket.send(transcript('PartialTranscript'))
+                elif message.get('terminate_session'):
+                    if received_ms > utterance_start:
+                        websocket.send(transcript('FinalTranscript'))
+                    websocket.send(json.dumps({'message_type': 'SessionTerminated'}))
+                    break
+        except ConnectionClosed:
+            pass
+
+
+class TranscriptionStandIn:
+    """Emulates the upload and transcript REST endpoints.
+
+    A job completes latency + audio duration * realtime_factor seconds after
+    it is submitted, and jobs run concurrently like the real service. The
+    utterances come from the uploaded audio itself: stretches of sound
+    become utterances, and a crude pitch-based diarization labels speakers
+    A, B, ... in order of first appearance within each job.
+
+    With failure_rate, that share of requests fails the way a flaky
+    network or an overloaded service would: the connection is dropped
+    before the request is read (mid-upload for uploads), or the answer is
+    a 503 or a 429. Seed the failures for repeatable runs.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=1.0, realtime_factor=0.0,
+                 utterance_ms=5000, silence_threshold=0.001, failure_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.utterance_ms = utterance_ms
+        self.silence_threshold = silence_threshold
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+        self.uploads = {}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.upload_count = 0
+        self.bytes_uploaded = 0
+        self.failures = 0  # Requests failed on purpose
+        self.server = None
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                stand_in._dispatch(self, 'POST')
+
+            def do_GET(self):
+                stand_in._dispatch(self, 'GET')
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _dispatch(self, handler, method):
+        path = urlparse(handler.path).path
+        fault = self._fault()
+        if fault == 'drop':
+            handler.close_connection = True  # Unread request, no answer: the client sees a reset
+            return
+        body = self._read_body(handler)
+        if fault is not None:
+            status, payload = fault, {'error': "Injected failure"}
+        elif method == 'POST' and path == '/v2/upload':
+            status, payload = self._upload(body)
+        elif method == 'POST' and path == '/v2/transcript':
+            status, payload = self._submit(json.loads(body))
+        elif method == 'GET' and path.startswith('/v2/transcript/'):
+            status, payload = self._poll(path.rsplit('/', 1)[-1])
+        else:
+            status, payload = 404, {'error': f"Unknown endpoint {method} {path}"}
+        self._reply(handler, status, payload)
+
+    def _fault(self):
+        """'drop', a status code to fail with, or None to answer normally"""
+        with self.lock:
+            if self.random.random() >= self.failure_rate:
+                return None
+            self.failures += 1
+            return self.random.choice(('drop', 503, 429))
+
+    def _read_body(self, handler):
+        if 'chunked' in handler.headers.get('Transfer-Encoding', ''):
+            parts = []
+            while True:
+                size = int(handler.rfile.readline().split(b';')[0], 16)
+                if size == 0:
+                    handler.rfile.readline()
+                    break
+                parts.append(handler.rfile.read(size))
+                handler.rfile.readline()
+            return b''.join(parts)
+        return handler.rfile.read(int(handler.headers.get('Content-Length', 0)))
+
+    def _reply(self, handler, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _upload(self, body):
+        upload_id = uuid.uuid4().hex
+        with self.lock:
+            self.uploads[upload_id] = body
+            self.upload_count += 1
+            self.bytes_uploaded += len(body)
+        return 200, {'upload_url': f"{self.base_url}/uploads/{upload_id}"}
+
+    def _submit(self, request):
+        upload_id = request['audio_url'].rsplit('/', 1)[-1]
+        if upload_id not in self.uploads:
+            return 400, {'error': f"Unknown audio_url {request['audio_url']}"}
+        samples, samplerate = sf.read(io.BytesIO(self.uploads[upload_id]), dtype='float32', always_2d=True)
+
+        # Honour audio_start_from / audio_end_at (milliseconds)
+        start = int((request.get('audio_start_from') or 0) * samplerate / 1000)
+        end = request.get('audio_end_at')
+        end = len(samples) if end is None else min(len(samples), int(end * samplerate / 1000))
+        duration = (end - start) / samplerate
+
+        if request.get('multichannel'):
+            # Each channel is transcribed on its own and labelled by its number
+            utterances = []
+            for c in range(samples.shape[1]):
+                channel = str(c + 1)
+                for u in self._diarize(samples[start:end, c], samplerate, start * 1000 / samplerate):
+                    u['speaker'] = u['channel'] = channel
+                    for w in u['words']:
+                        w['speaker'] = w['channel'] = channel
+                    utterances.append(u)
+            utterances.sort(key=lambda u: u['start'])
+        else:
+            utterances = self._diarize(samples[start:end].mean(axis=1), samplerate, start * 1000 / samplerate)
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'request': request,
+            'ready_at': time.time() + self.latency + duration * self.realtime_factor,
+            'utterances': utterances,
+            'audio_duration': duration,
+        }
+        with self.lock:
+            self.jobs[job['id']] = job
+        return 200, self._transcript(job, 'queued')
+
+    def _poll(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return 404, {'error': "Transcript not found"}
+        status = 'completed' if time.time() >= job['ready_at'] else 'processing'
+        return 200, self._transcript(job, status)
+
+    def _transcript(self, job, status):
+        payload = dict(job['request'])
+        payload.update({'id': job['id'], 'status': status})
+        if status == 'completed':
+            utterances = job['utterances']
+            payload.update({
+                'text': " ".join(u['text'] for u in utterances),
+                'words': [w for u in utterances for w in u['words']],
+                'utterances': utterances,
+                'confidence': 0.9,
+                'audio_duration': job['audio_duration'],
+            })
+        return payload
+
+    def _diarize(self, samples, samplerate, offset_ms):
+        frame = int(0.1 * samplerate)
+        utterances = []
+        labels = {}
+        current = None
+
+        def close(utterance):
+            text = f"Stand-in utterance {len(utterances) + 1}"
+            utterance.update({
+                'text': text,
+                'confidence': 0.9,
+                'words': [{'text': word, 'start': utterance['start'], 'end': utterance['end'],
+                           'confidence': 0.9, 'speaker': utterance['speaker']} for word in text.split()],
+            })
+            utterances.append(utterance)
+
+        for i in range(0, len(samples) - frame + 1, frame):
+            block = samples[i:i + frame]
+            t = int(offset_ms + i * 1000 / samplerate)
+            if np.sqrt(np.mean(block ** 2)) < self.silence_threshold:
+                if current is not None:
+                    close(current)
+                    current = None
+                continue
+
+            # Which "voice": low or high dominant pitch
+            spectrum = np.abs(np.fft.rfft(block))
+            voice = 'low' if np.argmax(spectrum) * samplerate / frame < 250 else 'high'
+            speaker = labels.setdefault(voice, chr(ord('A') + len(labels)))
+            if current is not None and (current['speaker'] != speaker or t - current['start'] >= self.utterance_ms):
+                close(current)
+                current = None
+            if current is None:
+                current = {'speaker': speaker, 'start': t, 'end': t}
+            current['end'] = int(t + frame * 1000 / samplerate)
+        if current is not None:
+            close(current)
+        return utterances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local AssemblyAI stand-in")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    parser.add_argument('--realtime-port', type=int, default=8765)
+    parser.add_argument('--utterance-ms', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=1.0,
+                        help="Seconds before a submitted job completes")
+    parser.add_argument('--realtime-factor', type=float, default=0.0,
+                        help="Extra processing seconds per second of audio")
+    parser.add_argument('--failure-rate', type=float, default=0.0,
+                        help="Share of REST requests to fail (dropped connections, 503s and 429s)")
+    args = parser.parse_args()
+
+    transcription = TranscriptionStandIn(args.host, args.port, args.latency, args.realtime_factor,
+                                         args.utterance_ms, failure_rate=args.failure_rate).start()
+    realtime = RealtimeStandIn(args.host, args.realtime_port, args.utterance_ms).start()
+    print(f"Transcription stand-in listening on {transcription.base_url}")
+    print(f"Real-time stand-in listening on {realtime.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        transcription.stop()
+        realtime.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import concurrent.futures
+import os
+
+from encoding import UPLOAD_FORMATS, UploadEncoder, offsets_path_for, options_path_for
+
+
+def preview_path_for(audio_file, upload_format='FLAC'):
+    """Path of the compact copy of a recording's first minutes"""
+    return os.path.splitext(audio_file)[0] + "_preview" + UPLOAD_FORMATS[upload_format][2]
+
+
+class BackgroundPreview:
+    """Transcribes the start of a recording while the rest is still being recorded.
+
+    Works as a RecordingWriter sink: the mix is encoded into a compact
+    preview copy until seconds of audio have gone by, then
+    transcribe(path, offsets) runs on a background thread. By the time
+    recording stops its result (the speaker segments to ask about) is
+    usually ready, so naming can start without another round-trip.
+    """
+
+    def __init__(self, path, transcribe, samplerate=48000, seconds=120, upload_format='FLAC',
+                 **trim_options):
+        self.path = path
+        self.transcribe = transcribe
+        self.frames_left = int(seconds * samplerate)
+        self.encoder = UploadEncoder(path, samplerate, upload_format=upload_format, **trim_options)
+        self.future = None
+
+    @property
+    def started(self):
+        return self.future is not None
+
+    def write(self, block):
+        if self.frames_left <= 0:
+            return
+        block = block[:self.frames_left]
+        self.encoder.write(block)
+        self.frames_left -= len(block)
+        if self.frames_left <= 0:
+            self.encoder.close()
+            background = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            self.future = background.submit(self._run, self.encoder.offsets)
+            background.shutdown(wait=False)
+
+    def close(self):
+        """Recording stopped; a preview that never started is thrown away"""
+        if not self.started:
+            self.encoder.close()
+            self._remove_files()
+
+    def result(self):
+        """What transcribe returned, or None if the preview never started or failed"""
+        if self.future is None:
+            return None
+        try:
+            return self.future.result()
+        except Exception as e:
+            print(f"Background preview failed: {str(e)}")
+            return None
+
+    def _run(self, offsets):
+        try:
+            return self.transcribe(self.path, offsets)
+        finally:
+            self._remove_files()
+
+    def _remove_files(self):
+        for path in (self.path, offsets_path_for(self.path), options_path_for(self.path)):
+            if os.path.exists(path):
+                os.remove(path)
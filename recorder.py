@@ -1,30 +1,176 @@
-import sounddevice as sd
-import numpy as np
-import soundfile as sf
-import assemblyai as aai
+import json
 import os
-import queue
 import threading
+import concurrent.futures
+import contextlib
+import io
+import sys
+import time
 from datetime import datetime
-from config import ASSEMBLYAI_API_KEY
+
+# Must come before the imports below, so the startup time shown before the menu covers them
+STARTED = time.perf_counter()
+
+import numpy as np
+from config import (ASSEMBLYAI_API_KEY, ASSEMBLYAI_BASE_URL, ASSEMBLYAI_REALTIME_URL, LIVE_TRANSCRIPTION,
+                    UPLOAD_FORMAT, CHUNKED_TRANSCRIPTION, CHUNK_SECONDS, CHUNK_WORKERS,
+                    TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB, SEGMENT_MINUTES,
+                    DEVICE_PROFILE_FILE, DEVICE_TEST_STREAMS, METRICS_FILE, METRICS_FORMAT,
+                    METRICS_INTERVAL, METER_INTERVAL, TRIM_SILENCE, TRIM_SILENCE_SECONDS,
+                    TRIM_PADDING_SECONDS, TRANSCRIPT_FORMATS, CONSOLE_PREVIEW_BLOCKS,
+                    MULTICHANNEL_TRANSCRIPTION, LATENCY_PROFILE, DENOISE, DENOISE_WORKERS,
+                    DENOISE_REDUCTION_DB, SPEAKER_PROFILES_FILE, SPEAKER_MATCH_THRESHOLD,
+                    TRANSCRIPTION_JOURNAL, UPLOAD_CHUNK_MB, UPLOAD_RETRIES)
+from lazy import IMPORT_TIMES, LazyModule
+from ringbuffer import RingBuffer
+from alignment import StreamAligner
+from latency import LatencyController, metric_name
+from streaming import StreamingTranscriber
+from dsp import MixEngine, mix_audio, reduce_noise
+from encoding import (OffsetMap, UploadEncoder, encode_for_upload, encode_sources, is_complete_copy,
+                      offsets_path_for, sources_path_for, upload_path_for)
+from chunking import ChunkedTranscriber
+from denoise import denoise_file, denoised_with
+from preview import BackgroundPreview, preview_path_for
+from speakers import SpeakerProfiles, voice_fingerprint
+from formatting import WRITERS, TextWriter, known_formats, write_transcript
+from jobs import TranscriptionJobs
+from stems import load_layout, loudest_source, save_layout
+from transcript_cache import TranscriptCache
+from writer import RecordingWriter
+from controls import Controls
+from metrics import Metrics, RateLimiter
 import platform
-import keyboard  # Cross-platform keyboard input
-import time
+
+# Heavy modules are imported on first use so the menu comes up quickly
+sd = LazyModule('sounddevice')
+sf = LazyModule('soundfile')
+aai = LazyModule('assemblyai')
+keyboard = LazyModule('keyboard')  # Cross-platform keyboard input
+
+# Checked once at startup rather than when a transcript is saved
+TRANSCRIPT_FILE_FORMATS = known_formats(TRANSCRIPT_FORMATS)
 
 class AudioRecorder:
-    def __init__(self, assemblyai_api_key):
+    def __init__(self, assemblyai_api_key, live_transcription=False, detect_devices=True,
+                 transcript_cache=None, jobs=None):
         self.assemblyai_api_key = assemblyai_api_key
+        self.live_transcription = live_transcription
+        self.live_transcriber = None
         self.recording = False
         self.paused = False
         self.audio_data = []
         self.sample_rate = 48000
-        self.audio_queue = queue.Queue()
+        self.latency_profile = LATENCY_PROFILE  # Block size and buffering; see latency.py
+        self.blocksize = None  # Frames per device callback, overriding the latency profile's
+        self.latency = None  # LatencyController of the current recording
+        self.xruns = 0  # Input overflow flags seen by the callbacks this recording
+        self.ring_seconds = 10  # Capture headroom per source before blocks are dropped
+        self.silence_threshold = 0.001  # RMS below which both sources count as silent
+        self.denoise_workers = DENOISE_WORKERS or None  # Noise reduction processes (None = one per core)
         self.speaker_names = {}
+        self.name_speakers = True  # Ask for names after a preview; otherwise use speaker_map
+        self.speaker_map = {}  # Speaker label -> name, used when name_speakers is off
+        self.speaker_profiles_file = SPEAKER_PROFILES_FILE  # Voices of named speakers ("" = always ask)
+        self.preview = None  # BackgroundPreview of the current recording
+        self.controls = Controls()
+        self.metrics = Metrics()
+        self.stream_factory = None  # Replaces sd.InputStream, e.g. with synthetic sources
+        self.hotkeys = True  # Install the p/r/s keyboard hooks while recording
+        self.show_meter = True  # Print the level meter while recording
+        self.output_dir = ""  # Where recordings are written (default: current directory)
+        self.base_url = ASSEMBLYAI_BASE_URL
         self.system = platform.system()
+        self.transcript_cache = transcript_cache or TranscriptCache(TRANSCRIPT_CACHE_DIR,
+                                                                    TRANSCRIPT_CACHE_MAX_MB * 1000 * 1000)
+        # Uploads and transcription jobs, shared by recorders transcribing side by side
+        self.jobs = jobs or TranscriptionJobs(TRANSCRIPTION_JOURNAL, chunk_size=UPLOAD_CHUNK_MB << 20,
+                                              retries=UPLOAD_RETRIES)
         
-        # Initialize AssemblyAI
+        # Transcribing existing files (batch mode) needs no audio devices
+        self.device_setup_seconds = 0.0
+        self.device_profile_used = False
+        if detect_devices:
+            start = time.perf_counter()
+            self.setup_devices()
+            self.device_setup_seconds = time.perf_counter() - start
+
+    def configure_assemblyai(self):
+        """Apply the API settings; done on first transcription so startup skips the import"""
         aai.settings.api_key = self.assemblyai_api_key
-        
+        aai.settings.base_url = self.base_url
+
+    def setup_devices(self):
+        """Use the saved device profile if it still matches, otherwise probe the devices"""
+        if self.load_device_profile():
+            self.device_profile_used = True
+            print(f"\nUsing saved audio devices: {self.mic_name}"
+                  + (f" + {self.system_name}" if self.system_id is not None else " (no system audio)"))
+            return
+        self.probe_devices()
+        self.save_device_profile()
+
+    def load_device_profile(self):
+        """Load the saved devices; True only if they are still present and unchanged.
+
+        Costs one device query per saved device instead of listing every
+        device and opening test streams.
+        """
+        try:
+            with open(DEVICE_PROFILE_FILE, encoding="utf-8") as f:
+                profile = json.load(f)
+            if sd.default.device[0] != profile['mic_id']:
+                return False  # The default microphone changed
+            for device_id, name, channels in ((profile['mic_id'], profile['mic_name'], profile['mic_channels']),
+                                              (profile['system_id'], profile['system_name'], profile['sys_channels'])):
+                if device_id is None:
+                    continue
+                info = sd.query_devices(device_id)
+                if info.get('name') != name or info.get('max_input_channels') != channels:
+                    return False
+        except Exception:
+            return False
+
+        self.mic_id = profile['mic_id']
+        self.mic_name = profile['mic_name']
+        self.mic_channels = profile['mic_channels']
+        self.system_id = profile['system_id']
+        self.system_name = profile['system_name']
+        self.sys_channels = profile['sys_channels']
+        return True
+
+    def use_devices(self, mic_id, system_id=None):
+        """Record from the given device ids instead of the detected ones"""
+        mic = sd.query_devices(mic_id)
+        if mic['max_input_channels'] < 1:
+            raise ValueError(f"Device {mic_id} ({mic['name']}) has no inputs")
+        self.mic_id, self.mic_name, self.mic_channels = mic_id, mic['name'], mic['max_input_channels']
+        self.system_id = self.system_name = None
+        self.sys_channels = 0
+        if system_id is not None:
+            system = sd.query_devices(system_id)
+            if system['max_input_channels'] < 1:
+                raise ValueError(f"Device {system_id} ({system['name']}) has no inputs")
+            self.system_id, self.system_name = system_id, system['name']
+            self.sys_channels = system['max_input_channels']
+
+    def save_device_profile(self):
+        profile = {
+            'mic_id': self.mic_id,
+            'mic_name': self.mic_name,
+            'mic_channels': self.mic_channels,
+            'system_id': self.system_id,
+            'system_name': self.system_name,
+            'sys_channels': self.sys_channels,
+        }
+        try:
+            with open(DEVICE_PROFILE_FILE, "w", encoding="utf-8") as f:
+                json.dump(profile, f, indent=2)
+        except OSError as e:
+            print(f"Could not save device profile: {str(e)}")
+
+    def probe_devices(self):
+        """Find the microphone and system audio devices and check they open"""
         try:
             print("\nDetecting audio devices...")
             devices = sd.query_devices()
@@ -47,16 +193,17 @@ class AudioRecorder:
             
             # Handle different device info formats
             if isinstance(mic_info, dict):
-                mic_name = mic_info.get('name', 'Default Microphone')
+                self.mic_name = mic_info.get('name', 'Default Microphone')
                 self.mic_channels = mic_info.get('max_input_channels', 1)
             else:
-                mic_name = str(mic_info)
+                self.mic_name = str(mic_info)
                 self.mic_channels = 1
                 
-            print(f"\nUsing default input device: {mic_name}")
+            print(f"\nUsing default input device: {self.mic_name}")
             
             # Find system audio device (Stereo Mix/What U Hear)
             self.system_id = None
+            self.system_name = None
             for i, device in enumerate(devices):
                 # Handle different device info formats
                 if isinstance(device, dict):
@@ -69,6 +216,7 @@ class AudioRecorder:
                 if channels > 0:
                     if 'stereo mix' in name or 'what u hear' in name or 'system' in name:
                         self.system_id = i
+                        self.system_name = device.get('name') if isinstance(device, dict) else str(device)
                         print(f"Found system audio device: {name}")
                         break
             
@@ -94,111 +242,167 @@ class AudioRecorder:
                 self.sys_channels = 0
             
             # Test device access
-            print("\nTesting device access...")
-            with sd.InputStream(device=self.mic_id, channels=1, samplerate=self.sample_rate):
-                pass
-            if self.system_id is not None:
-                with sd.InputStream(device=self.system_id, channels=1, samplerate=self.sample_rate):
+            if DEVICE_TEST_STREAMS:
+                print("\nTesting device access...")
+                with sd.InputStream(device=self.mic_id, channels=1, samplerate=self.sample_rate):
                     pass
-            print("Device access test successful")
+                if self.system_id is not None:
+                    with sd.InputStream(device=self.system_id, channels=1, samplerate=self.sample_rate):
+                        pass
+                print("Device access test successful")
             
         except Exception as e:
             print(f"\nError during audio device initialization: {str(e)}")
             raise
 
-    def audio_callback(self, indata, frames, time, status):
-        if status:
-            print(f"Status: {status}")
-        self.audio_queue.put(indata.copy())
-
     def record(self):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.filepath = f"recording_{timestamp}.wav"
+        self.filepath = os.path.join(self.output_dir, f"recording_{timestamp}.wav")
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
         
         try:
-            # Get device info to check channels
-            mic_info = sd.query_devices(self.mic_id)
-            sys_info = sd.query_devices(self.system_id) if self.system_id is not None else None
-            
-            # Handle device info across platforms
-            if isinstance(mic_info, dict):
-                mic_channels = mic_info.get('max_input_channels', 1)
-            else:
-                mic_channels = 1
-                
-            if sys_info is not None and isinstance(sys_info, dict):
-                sys_channels = sys_info.get('max_input_channels', 1)
-            else:
-                sys_channels = 1
+            # Channel counts found by setup_devices()
+            mic_channels = self.mic_channels
+            sys_channels = self.sys_channels if self.system_id is not None else 0
             
             print(f"Operating System: {self.system}")
             print(f"Microphone channels: {mic_channels}")
-            print(f"System audio channels: {sys_channels}")
+            if sys_channels:
+                print(f"System audio channels: {sys_channels}")
             
-            with sf.SoundFile(self.filepath, mode='x', 
-                            samplerate=self.sample_rate,
-                            channels=4,
-                            subtype='PCM_24') as file:
+            # The WAV keeps each source at its own channel count, mic first; the
+            # mix is only made (at the widest source's width) for the sinks
+            stem_channels = mic_channels + sys_channels
+            mix_channels = max(mic_channels, sys_channels)
+            save_layout(self.filepath, mic_channels, sys_channels)
+            
+            # Compact speech copy for transcription, encoded alongside the archival WAV
+            self.upload_encoder = UploadEncoder(upload_path_for(self.filepath, UPLOAD_FORMAT),
+                                                self.sample_rate, upload_format=UPLOAD_FORMAT,
+                                                **self.trim_options())
+            sinks = [self.upload_encoder]
+            
+            # Transcribe the first 2 minutes while recording goes on, so speaker
+            # names can be asked for as soon as recording stops
+            self.preview = None
+            multichannel = MULTICHANNEL_TRANSCRIPTION and self.system_id is not None
+            if self.name_speakers and self.live_transcriber is None and not multichannel:
+                self.preview = BackgroundPreview(preview_path_for(self.filepath, UPLOAD_FORMAT),
+                                                 self.transcribe_preview, self.sample_rate, seconds=120,
+                                                 upload_format=UPLOAD_FORMAT, **self.trim_options())
+                sinks.append(self.preview)
+            
+            # Block size, buffering and latency hint from the latency profile;
+            # an explicit self.blocksize overrides the profile's
+            self.latency = LatencyController(self.latency_profile)
+            self.xruns = 0
+            blocksize, latency, batch_seconds = self.latency.settings
+            if self.blocksize:
+                blocksize = self.blocksize
+            
+            # Disk writes (and the upload copy) happen on the writer's own thread
+            segment_seconds = SEGMENT_MINUTES * 60 if SEGMENT_MINUTES else None
+            with RecordingWriter(self.filepath, self.sample_rate, stem_channels, subtype='PCM_24',
+                                 sinks=sinks, sink_channels=mix_channels, batch_seconds=batch_seconds,
+                                 segment_seconds=segment_seconds, metrics=self.metrics) as self.writer:
+                self.writer.latency_metric = metric_name(self.latency.profile)
+                
+                # Preallocated per-source rings; the callbacks only copy into them
+                ring_frames = int(self.ring_seconds * self.sample_rate)
+                self.mic_ring = RingBuffer(ring_frames, mic_channels)
+                self.system_ring = RingBuffer(ring_frames, sys_channels) if self.system_id is not None else None
+                
+                # System audio is resampled onto the mic's clock; leftovers carry over
+                self.aligner = None
+                if self.system_ring is not None:
+                    self.aligner = StreamAligner(self.sample_rate, sys_channels, self.sample_rate)
+                
+                # Every source present, mic first: (name, channels, ring, aligner). The
+                # mic's clock is the recording's; the others are aligned onto it
+                sources = [('mic', mic_channels, self.mic_ring, None)]
+                if self.system_ring is not None:
+                    sources.append(('system', sys_channels, self.system_ring, self.aligner))
+                
+                # Gate, mix, limit and meter in preallocated buffers, a few blocks at a time
+                max_blocksize = max(blocksize, self.latency.largest_blocksize)
+                self.mix_engine = MixEngine(4 * max_blocksize, [channels for _, channels, _, _ in sources],
+                                            out_channels=mix_channels)
+                # Stems and mix side by side, as the writer takes them
+                frames = np.zeros((self.mix_engine.max_frames, stem_channels + mix_channels), dtype=np.float32)
+                
+                # Everything already counted elsewhere is read only when metrics are exported
+                self.metrics.add_collector(self.pipeline_counts)
                 
                 def mic_callback(indata, frames, time, status):
                     if status:
-                        print(f"Mic status: {status}")
-                    data = indata.copy()
-                    self.audio_queue.put(('mic', data))
+                        self.count_status('mic', status)
+                    self.mic_ring.write(indata, time.inputBufferAdcTime or time.currentTime)
                 
                 def system_callback(indata, frames, time, status):
                     if status:
-                        print(f"System status: {status}")
-                    data = indata.copy()
-                    # Upmix stereo to 4 channels
-                    if data.shape[1] == 2:
-                        data = np.column_stack((data, data))
-                    elif data.shape[1] == 1:
-                        data = np.repeat(data, 4, axis=1)
-                    self.audio_queue.put(('system', data))
+                        self.count_status('system', status)
+                    self.system_ring.write(indata, time.inputBufferAdcTime or time.currentTime)
                 
-                # Create input streams with optimized settings
-                blocksize = 2048
+                open_stream = self.stream_factory or sd.InputStream
                 streams = []
                 
-                # Always create microphone stream
-                streams.append(sd.InputStream(
-                    samplerate=self.sample_rate,
-                    device=self.mic_id,
-                    channels=mic_channels,
-                    callback=mic_callback,
-                    blocksize=blocksize,
-                    dtype=np.float32
-                ))
-                
-                # Add system audio stream if available
-                if self.system_id is not None:
-                    streams.append(sd.InputStream(
+                def open_streams(blocksize, latency):
+                    """(Re)open and start the input streams with these settings"""
+                    for stream in streams:
+                        stream.stop()
+                        stream.close()
+                    streams.clear()
+                    
+                    # Always create microphone stream
+                    streams.append(open_stream(
                         samplerate=self.sample_rate,
-                        device=self.system_id,
-                        channels=sys_channels,
-                        callback=system_callback,
+                        device=self.mic_id,
+                        channels=mic_channels,
+                        callback=mic_callback,
                         blocksize=blocksize,
+                        latency=latency,
                         dtype=np.float32
                     ))
+                    
+                    # Add system audio stream if available
+                    if self.system_id is not None:
+                        streams.append(open_stream(
+                            samplerate=self.sample_rate,
+                            device=self.system_id,
+                            channels=sys_channels,
+                            callback=system_callback,
+                            blocksize=blocksize,
+                            latency=latency,
+                            dtype=np.float32
+                        ))
+                    
+                    # Start all streams
+                    for stream in streams:
+                        stream.start()
+                    self.metrics.gauge('blocksize', blocksize)
                 
-                # Start all streams
-                for stream in streams:
-                    stream.start()
+                open_streams(blocksize, latency)
+                self.latency.start(time.monotonic(), self.overflow_count())
+                latency_check = RateLimiter(1.0)
+                capture_lag = 0.0
                 
+                print(f"Latency profile: {self.latency_profile} ({blocksize} frames per block"
+                      + (f", {latency} latency)" if latency else ")"))
                 print("Recording started... Press 'p' to pause, 'r' to resume, or 's' to stop.")
                 print("Recording from microphone" + (" and system audio" if self.system_id is not None else " only"))
                 
-                # Set up keyboard hooks
-                keyboard.on_press_key('p', lambda _: self.pause_recording() if not self.paused else None)
-                keyboard.on_press_key('r', lambda _: self.resume_recording() if self.paused else None)
-                keyboard.on_press_key('s', lambda _: setattr(self, 'recording', False))
+                # Set up keyboard hooks; they only post events for the loop to apply
+                if self.hotkeys:
+                    keyboard.on_press_key('p', lambda _: self.controls.post('pause'))
+                    keyboard.on_press_key('r', lambda _: self.controls.post('resume'))
+                    keyboard.on_press_key('s', lambda _: self.controls.post('stop'))
                 
-                mic_buffer = []
-                system_buffer = []
+                # Level meter on the console, at most a few times a second
+                meter = RateLimiter(METER_INTERVAL)
                 
                 # Variables for silence detection
-                silence_threshold = 0.001  # Adjust this value based on your needs
+                silence_threshold = self.silence_threshold
                 silence_start_time = None
                 silence_duration = 0
                 last_check_time = time.time()
@@ -209,51 +413,105 @@ class AudioRecorder:
                 
                 while self.recording:
                     try:
-                        # Skip processing if paused
+                        # Apply key presses and prompt answers without waiting for either
+                        for event, value in self.controls.poll():
+                            if event == 'pause':
+                                self.pause_recording()
+                            elif event == 'resume':
+                                self.resume_recording()
+                            elif event == 'stop':
+                                self.recording = False
+                            elif event == 'answer':
+                                question, response = value
+                                if question == 'silence':
+                                    if response == 'y':
+                                        self.recording = False
+                                    else:
+                                        silence_start_time = None  # Reset silence timer
+                                        silence_duration = 0
+                                elif question == 'hour' and response == 'n':
+                                    self.recording = False
+                        if not self.recording:
+                            break
+                        
+                        if self.writer.error is not None:
+                            print("\nStopping: the recording can no longer be written to disk")
+                            self.recording = False
+                            break
+                        
+                        # Drop captured audio while paused so the rings stay empty
                         if self.paused:
+                            for _, _, ring, aligner in sources:
+                                ring.discard()
+                                if aligner is not None:
+                                    aligner.discard()
                             time.sleep(0.1)  # Reduce CPU usage while paused
                             continue
                         
-                        source, audio_data = self.audio_queue.get(timeout=0.1)
+                        # How far behind capture the loop is, and how full the rings get
+                        self.metrics.high_water('mic_ring_max_frames', self.mic_ring.available())
+                        captured_at = None  # perf_counter() time the next mic frame was captured
+                        if self.mic_ring.last_timestamp is not None:
+                            frame, adc_time = self.mic_ring.last_timestamp
+                            captured = adc_time - (frame - self.mic_ring.source_position()) / self.sample_rate
+                            capture_lag = streams[0].time - captured
+                            captured_at = time.perf_counter() - capture_lag
+                            self.metrics.observe('capture_latency', capture_lag)
                         
-                        if source == 'mic':
-                            mic_buffer.append(audio_data)
-                        else:
-                            system_buffer.append(audio_data)
-                            
-                        # Process buffers when we have enough data
-                        if mic_buffer and system_buffer:
-                            # Get the minimum length between the two buffers
-                            mic_data = np.concatenate(mic_buffer)
-                            sys_data = np.concatenate(system_buffer)
-                            
-                            # Ensure system audio has 4 channels
-                            if sys_data.shape[1] != 4:
-                                if sys_data.shape[1] == 2:
-                                    sys_data = np.column_stack((sys_data, sys_data))
-                                elif sys_data.shape[1] == 1:
-                                    sys_data = np.repeat(sys_data, 4, axis=1)
-                            
-                            min_len = min(len(mic_data), len(sys_data))
-                            
-                            # Trim both to the same length
-                            mic_data = mic_data[:min_len]
-                            sys_data = sys_data[:min_len]
-                            
-                            # Apply gentle noise reduction to mic input
-                            mic_data = self.reduce_noise(mic_data)
+                        # Adaptive profile: larger blocks after overflows or lag, smaller when calm
+                        if self.latency.adaptive and latency_check.ready():
+                            change = self.latency.update(time.monotonic(), self.overflow_count(), capture_lag)
+                            if change is not None:
+                                self.log_latency_change(*change)
+                                blocksize, latency, batch_seconds = self.latency.settings
+                                reopen_start = time.perf_counter()
+                                open_streams(blocksize, latency)
+                                if self.aligner is not None:
+                                    self.aligner.reset_clocks()  # Frames lost while reopening break the fits
+                                self.writer.set_batch_seconds(batch_seconds)
+                                self.writer.latency_metric = metric_name(self.latency.profile)
+                                self.metrics.observe('stream_reopen', time.perf_counter() - reopen_start)
+                                continue
+                        
+                        # Contiguous mic view straight out of the ring, with every
+                        # other source resampled to line up with it
+                        mic_view = self.mic_ring.peek(self.mix_engine.max_frames)
+                        min_len = len(mic_view)
+                        for name, _, ring, aligner in sources[1:]:
+                            self.metrics.high_water(f'{name}_ring_max_frames', ring.available())
+                            with self.metrics.timer('align'):
+                                aligner.fill(ring)
+                                aligner.update(self.mic_ring.source_position(),
+                                               self.mic_ring.last_timestamp, ring.last_timestamp)
+                                min_len = aligner.ready_frames(min_len)
+                        
+                        # Process buffers when every source has data
+                        if min_len == 0:
+                            time.sleep(0.01)
+                            continue
+                        
+                        try:
+                            # The same stretch of every source; unread aligned
+                            # frames stay staged for the next pass
+                            data = [mic_view[:min_len]]
+                            for _, _, _, aligner in sources[1:]:
+                                data.append(aligner.read(min_len))
                             
-                            # Mix audio with improved balance
-                            mixed_audio = self.mix_audio(mic_data, sys_data)
+                            # Noise gate, mix, soft limiting and levels in one pass
+                            with self.metrics.timer('mix'):
+                                mixed_audio, levels = self.mix_engine.process(*data)
+                            mic_level = levels[0]
+                            sys_level = max(levels[1:], default=0.0)
                             
-                            # Calculate and show levels
-                            mic_level = np.sqrt(np.mean(mic_data**2))
-                            sys_level = np.sqrt(np.mean(sys_data**2))
-                            print(f"\rMic level: {mic_level:.6f}, System level: {sys_level:.6f}", end='', flush=True)
+                            # Keep the meter off an open question
+                            if self.show_meter and not self.controls.pending and meter.ready():
+                                print("\r" + ", ".join(f"{name.capitalize()} level: {level:.6f}"
+                                                        for (name, _, _, _), level in zip(sources, levels)),
+                                      end='', flush=True)
                             
                             # Check for silence
                             current_time = time.time()
-                            if mic_level < silence_threshold and sys_level < silence_threshold:
+                            if max(levels) < silence_threshold:
                                 if silence_start_time is None:
                                     silence_start_time = current_time
                                 silence_duration = current_time - silence_start_time
@@ -261,289 +519,688 @@ class AudioRecorder:
                                 silence_start_time = None
                                 silence_duration = 0
                             
-                            # Check if we should prompt to stop due to silence
+                            # Ask whether to stop after long silence; recording carries on
+                            # while the question is open and the answer arrives as an event
                             if silence_duration >= 120:  # 2 minutes of silence
-                                print("\n\nNo sound detected for 2 minutes. Would you like to stop recording? (y/n)")
-                                response = input().lower()
-                                if response == 'y':
-                                    self.recording = False
-                                    break
-                                else:
-                                    silence_start_time = None  # Reset silence timer
-                                    silence_duration = 0
+                                self.controls.ask('silence', "\n\nNo sound detected for 2 minutes. "
+                                                             "Would you like to stop recording? (y/n)")
                             
                             # Check if we should prompt to stop due to time
                             recording_duration = current_time - recording_start_time
                             if recording_duration >= 3600 and not hour_prompt_shown:  # 1 hour
-                                print("\n\nRecording has been going on for an hour. Would you like to continue? (y/n)")
-                                response = input().lower()
-                                if response == 'n':
-                                    self.recording = False
-                                    break
-                                else:
-                                    hour_prompt_shown = True  # Only show once per hour
+                                self.controls.ask('hour', "\n\nRecording has been going on for an hour. "
+                                                          "Would you like to continue? (y/n)")
+                                hour_prompt_shown = True  # Only show once per hour
                             
-                            file.write(mixed_audio)
+                            with self.metrics.timer('write'):
+                                block = frames[:min_len]
+                                column = 0
+                                for (_, channels, _, _), source_data in zip(sources, data):
+                                    block[:, column:column + channels] = source_data
+                                    column += channels
+                                block[:, stem_channels:] = mixed_audio
+                                self.writer.write(block, captured_at)
+                                
+                                # Stream the same mix to the live transcription session
+                                if self.live_transcriber is not None:
+                                    self.live_transcriber.feed(mixed_audio, mic_level, sys_level)
+                        finally:
+                            # Release ring space only once the block has been consumed;
+                            # unpaired system frames stay staged in the aligner
+                            self.mic_ring.advance(min_len)
                             
-                            # Clear buffers
-                            mic_buffer = []
-                            system_buffer = []
-                            
-                    except queue.Empty:
-                        continue
                     except Exception as e:
                         print(f"\nError writing audio data: {e}")
                         continue
                 
                 # Clean up keyboard hooks
-                keyboard.unhook_all()
+                if self.hotkeys:
+                    keyboard.unhook_all()
                 
+                for stream in streams:
+                    stream.stop()
+                    stream.close()
+                
+            # Closed after the writer has flushed so its header covers the full recording
+            self.upload_encoder.close()
+            if self.preview is not None:
+                self.preview.close()
+            
             print("\nRecording finished.")
+            if self.upload_encoder.offsets is not None:
+                self.report_trimming(self.upload_encoder.offsets)
+            if self.controls.pending:
+                print("Press Enter to dismiss the open question.")
+            stats = self.writer.stats()
+            print(f"Disk writer: {stats['batches']} writes, up to {stats['max_buffered_seconds']:.2f} s buffered, "
+                  f"{stats['overflows']} overflows ({stats['dropped_frames']} frames dropped)")
+            print(f"Mic ring overflows: {self.mic_ring.overflows} ({self.mic_ring.dropped_frames} frames dropped)")
+            if self.system_ring is not None:
+                print(f"System ring overflows: {self.system_ring.overflows} ({self.system_ring.dropped_frames} frames dropped)")
+                stats = self.aligner.stats()
+                print(f"Stream alignment: drift {stats['drift_ppm']:+.1f} ppm, "
+                      f"{stats['inserted_samples']} samples inserted, {stats['dropped_samples']} dropped")
+            self.print_pipeline_summary()
+            changes = len(self.latency.changes)
+            print(f"Latency profile {self.latency.profile}" + (f" after {changes} changes" if changes else "")
+                  + f": {self.describe_latency(self.latency.profile)}")
             
         except Exception as e:
             print(f"Error during recording: {str(e)}")
+            if getattr(self, 'upload_encoder', None) is not None:
+                self.upload_encoder.close()
+            if self.preview is not None:
+                self.preview.close()
             return None
             
         return self.filepath
 
+    def count_status(self, source, status):
+        """Count a callback's xrun flags instead of printing from the audio thread"""
+        if status.input_overflow:
+            self.xruns += 1
+            self.metrics.incr(f'{source}_input_overflows')
+        if status.input_underflow:
+            self.metrics.incr(f'{source}_input_underflows')
+        if not (status.input_overflow or status.input_underflow):
+            self.metrics.incr(f'{source}_other_status_flags')
+
+    def overflow_count(self):
+        """Input overflows and blocks dropped anywhere in the pipeline so far"""
+        total = self.xruns + self.mic_ring.overflows + self.writer.ring.overflows
+        if self.system_ring is not None:
+            total += self.system_ring.overflows
+        return total
+
+    def log_latency_change(self, old, new, reason):
+        """Report a latency profile change with the callback-to-disk latency measured at the old one"""
+        self.metrics.incr('latency_profile_changes')
+        print(f"\nLatency profile {old} -> {new} ({reason}); {self.describe_latency(old)}")
+
+    def describe_latency(self, profile):
+        timing = self.metrics.snapshot()['timings'].get(metric_name(profile))
+        if timing is None:
+            return f"no callback-to-disk measurement at {profile}"
+        return (f"callback-to-disk at {profile}: {timing['mean'] * 1000:.0f} ms mean, "
+                f"{timing['max'] * 1000:.0f} ms max")
+
+    def pipeline_counts(self):
+        """Drop and queue counts kept by the pipeline's own objects, for metrics export"""
+        counts = {
+            'mic_ring_overflows': self.mic_ring.overflows,
+            'mic_ring_dropped_frames': self.mic_ring.dropped_frames,
+        }
+        for name, value in self.writer.stats().items():
+            counts[f'writer_{name}'] = value
+        if self.system_ring is not None:
+            counts['system_ring_overflows'] = self.system_ring.overflows
+            counts['system_ring_dropped_frames'] = self.system_ring.dropped_frames
+            stats = self.aligner.stats()
+            counts['align_drift_ppm'] = stats['drift_ppm']
+            counts['align_inserted_samples'] = stats['inserted_samples']
+            counts['align_dropped_samples'] = stats['dropped_samples']
+        if self.live_transcriber is not None:
+            counts['live_queue_depth'] = self.live_transcriber.send_queue.qsize()
+            counts['live_dropped_chunks'] = self.live_transcriber.dropped_chunks
+        return counts
+
+    def print_pipeline_summary(self):
+        snapshot = self.metrics.snapshot()
+        timings = snapshot['timings']
+        parts = [f"{name} {timings[name]['mean'] * 1000:.2f}/{timings[name]['max'] * 1000:.2f} ms"
+                 for name in ('capture_latency', 'align', 'mix', 'write', 'disk_write') if name in timings]
+        print("Pipeline mean/max: " + ", ".join(parts))
+        xruns = {name: value for name, value in snapshot['counters'].items() if 'status' in name or 'flows' in name}
+        print("Device xruns: " + (", ".join(f"{name} {value}" for name, value in xruns.items()) or "none"))
+
     def reduce_noise(self, audio_data):
-        """Simple noise reduction"""
-        # Apply a noise gate
-        noise_threshold = 0.005
-        audio_data[abs(audio_data) < noise_threshold] = 0
-        return audio_data
+        """Simple noise reduction (reference for MixEngine)"""
+        return reduce_noise(audio_data)
 
     def mix_audio(self, mic_data, sys_data):
-        """Improved audio mixing with dynamic leveling"""
-        # Calculate RMS levels
-        mic_rms = np.sqrt(np.mean(mic_data**2))
-        sys_rms = np.sqrt(np.mean(sys_data**2))
-        
-        # Adjust mixing ratio based on levels
-        if mic_rms > 0.01:  # If there's significant mic input
-            mic_gain = 0.7
-            sys_gain = 0.3
-        else:  # If mic is quiet, boost system audio
-            mic_gain = 0.4
-            sys_gain = 0.6
-        
-        # Mix with soft limiting
-        mixed = mic_gain * mic_data + sys_gain * sys_data
-        
-        # Apply soft limiting to prevent clipping
-        threshold = 0.95
-        mixed = np.where(
-            abs(mixed) > threshold,
-            threshold * np.sign(mixed) + (abs(mixed) - threshold) * 0.1,
-            mixed
-        )
-        
-        return mixed
+        """Improved audio mixing with dynamic leveling (reference for MixEngine)"""
+        return mix_audio(mic_data, sys_data)
 
     def start_recording(self):
         self.recording = True
         
+        # Open the live transcription session before capture starts
+        self.live_transcriber = None
+        if self.live_transcription:
+            try:
+                self.live_transcriber = StreamingTranscriber(self.assemblyai_api_key,
+                                                             ASSEMBLYAI_REALTIME_URL,
+                                                             source_rate=self.sample_rate)
+                self.live_transcriber.start()
+                print("Live transcription connected.")
+            except Exception as e:
+                print(f"Could not start live transcription, will transcribe after recording: {str(e)}")
+                self.live_transcriber = None
+        
+        # Fresh metrics per session, exported while recording and transcribing
+        self.metrics = Metrics(METRICS_FILE or None, METRICS_FORMAT, METRICS_INTERVAL).start()
+        
         # Start recording in a separate thread
+        self.controls = Controls()
         record_thread = threading.Thread(target=self.record)
         record_thread.start()
         
-        # Wait for recording to complete
+        # Answer the recording's questions from this thread until it completes
+        self.controls.serve_prompts(record_thread)
         record_thread.join()
         
         # Generate transcript if we have a valid audio file
         if hasattr(self, 'filepath') and self.filepath:
-            print("\nTranscribing audio...")
-            transcript = self.transcribe_audio(self.filepath)
+            if self.live_transcriber is not None:
+                print("\nFinishing live transcription...")
+                transcript = self.finish_live_transcription(self.filepath)
+            else:
+                print("\nTranscribing audio...")
+                transcript = self.transcribe_audio(self.filepath)
             
-            if transcript:
+            if transcript is not None:
                 # Save and display the formatted transcript
                 self.save_transcript(transcript, self.filepath)
         
+        self.metrics.stop()  # Final export, including the transcription phases
         return self.filepath
 
+    def finish_live_transcription(self, audio_file):
+        """End the live session and return its transcript, falling back to batch"""
+        live_transcriber, self.live_transcriber = self.live_transcriber, None
+        try:
+            live_transcript = live_transcriber.stop()
+        except Exception as e:
+            print(f"Error finishing live transcription: {str(e)}")
+            live_transcript = None
+        
+        if live_transcript is None or live_transcriber.error or not live_transcript.utterances:
+            print("Live transcript unavailable, transcribing the recording instead...")
+            return self.transcribe_audio(audio_file)
+        
+        print("\n=== Live Transcript Speakers (A = microphone, B = system audio) ===\n")
+        speaker_segments = self.find_speaker_segments(live_transcript.utterances)
+        self.prompt_speaker_names(speaker_segments)
+        
+        return live_transcript
+
+    def prepare_upload(self, audio_file, echo=True):
+        """Return the compact upload copy of a recording, encoding it if needed.
+
+        A copy trimmed or denoised with other settings than the current
+        ones is encoded again.
+        """
+        upload_file = upload_path_for(audio_file, UPLOAD_FORMAT)
+        denoised = denoised_with(upload_file)
+        if (not is_complete_copy(upload_file, audio_file, trim_options=self.trim_options())
+                or denoised not in (None, DENOISE_REDUCTION_DB if DENOISE else None)):
+            denoised = None  # The new copy starts out noisy
+            if echo:
+                print("\nEncoding upload copy...")
+            start = time.time()
+            _, offsets = encode_for_upload(audio_file, upload_file, UPLOAD_FORMAT, **self.trim_options())
+            if echo:
+                print(f"Encoded in {time.time() - start:.1f} s")
+            if offsets is not None:
+                self.report_trimming(offsets, echo=echo)
+        if DENOISE and denoised is None:
+            self.reduce_upload_noise(upload_file, echo=echo)
+        
+        wav_size = os.path.getsize(audio_file)
+        upload_size = os.path.getsize(upload_file)
+        if echo:
+            print(f"Upload size: {upload_size / 1e6:.1f} MB instead of {wav_size / 1e6:.1f} MB "
+                  f"({100 * (1 - upload_size / wav_size):.0f}% smaller)")
+        return upload_file
+
+    def reduce_upload_noise(self, upload_file, echo=True):
+        """Spectral-gate the upload copy in place, on a pool of worker processes"""
+        if echo:
+            print("Reducing background noise...")
+        start = time.perf_counter()
+        try:
+            profile = denoise_file(upload_file, self.silence_threshold, self.denoise_workers,
+                                   reduction_db=DENOISE_REDUCTION_DB)
+        except Exception as e:
+            self.metrics.incr('denoise_failures')
+            if echo:
+                print(f"Noise reduction failed, uploading the copy as it is: {str(e)}")
+            return
+        elapsed = time.perf_counter() - start
+        self.metrics.observe('denoise', elapsed)
+        if not echo:
+            return
+        if profile is None:
+            print("No silence to take a noise profile from; upload copy left as it is")
+        else:
+            print(f"Noise reduced in {elapsed:.1f} s (profile from {profile.noise_seconds:.1f} s of silence)")
+
+    def trim_options(self):
+        """UploadEncoder arguments for leaving silences out of the upload copy"""
+        return {'trim_silence': TRIM_SILENCE, 'silence_threshold': self.silence_threshold,
+                'min_silence': TRIM_SILENCE_SECONDS, 'padding': TRIM_PADDING_SECONDS}
+
+    def report_trimming(self, offsets, echo=True):
+        """Print how much silence the upload copy leaves out"""
+        self.metrics.gauge('upload_trimmed_seconds', offsets.trimmed_seconds)
+        if echo and offsets.source_seconds:
+            print(f"Silence removed from upload: {offsets.trimmed_seconds / 60:.1f} of "
+                  f"{offsets.source_seconds / 60:.1f} minutes "
+                  f"({100 * offsets.trimmed_seconds / offsets.source_seconds:.0f}% less to transcribe)")
+
+    def upload_audio(self, path, echo=True):
+        """Upload a file to AssemblyAI and return its URL, reporting size and time"""
+        start = time.time()
+        upload_url, reused = self.jobs.upload(path, echo)
+        elapsed = time.time() - start
+        size = os.path.getsize(path)
+        if echo and reused:
+            print(f"Reusing the upload of {os.path.basename(path)} from an earlier attempt")
+        elif echo:
+            print(f"Uploaded {size / 1e6:.1f} MB in {elapsed:.1f} s ({size / 1e6 / max(elapsed, 1e-6):.1f} MB/s)")
+        return upload_url
+
+    def upload_and_submit(self, audio_file, config, use_chunks, duration, with_preview=True, echo=True):
+        """Upload the compact copy and start the transcription jobs.
+
+        Returns (offset map, preview future or None, full future, submit time);
+        for short recordings the preview and full futures are the same job.
+        """
+        # Step 1: Upload the compact copy once; the preview and full passes share it
+        upload_start = time.perf_counter()
+        compact_file = self.prepare_upload(audio_file, echo=echo)
+        # Service times are on the trimmed copy's timeline until mapped back
+        offsets = OffsetMap.load(offsets_path_for(compact_file))
+        
+        if use_chunks:
+            # Long recording: transcribe silence-delimited chunks in parallel.
+            # The first chunk starts at 0, so it doubles as the preview source.
+            chunked = ChunkedTranscriber(config, max_workers=CHUNK_WORKERS,
+                                         target_seconds=CHUNK_SECONDS,
+                                         max_seconds=1.5 * CHUNK_SECONDS,
+                                         silence_threshold=self.silence_threshold, jobs=self.jobs, echo=echo)
+            chunked.prepare(compact_file)
+            preview_url = chunked.upload_urls[0]
+        else:
+            chunked = None
+            upload_url = self.upload_audio(compact_file, echo=echo)
+            preview_url = upload_url
+        self.metrics.observe('transcription_upload', time.perf_counter() - upload_start)
+        
+        # Step 2: Submit the preview, then start the full transcription in the
+        # background so it runs while speaker names are being entered
+        submitted = time.perf_counter()
+        params = config.raw.dict(exclude_none=True)
+        short_recording = chunked is None and duration <= 120
+        preview_future = None
+        if not with_preview:
+            # Names come from speaker_map or an earlier preview
+            if chunked is not None:
+                full_future = chunked.submit()
+            else:
+                full_future = self.jobs.submit(upload_url, params, echo)
+        elif short_recording:
+            # The preview would cover everything, so one job serves both passes
+            preview_future = self.jobs.submit(preview_url, params, echo)
+            full_future = preview_future
+        else:
+            preview_params = dict(params, audio_end_at=120 * 1000)  # 2 minutes, in milliseconds
+            preview_future = self.jobs.submit(preview_url, preview_params, echo)
+            if chunked is not None:
+                full_future = chunked.submit()
+            else:
+                full_future = self.jobs.submit(upload_url, params, echo)
+        return offsets, preview_future, full_future, submitted
+
+    def background_preview_segments(self, audio_file):
+        """Speaker segments of the preview made while recording audio_file, or None"""
+        preview, self.preview = self.preview, None
+        if (not self.name_speakers or preview is None or not preview.started
+                or preview.path != preview_path_for(audio_file, UPLOAD_FORMAT)):
+            return None
+        start = time.perf_counter()
+        speaker_segments = preview.result()
+        if speaker_segments is not None and time.perf_counter() - start > 0.5:
+            print(f"Waited {time.perf_counter() - start:.1f} s for the speaker preview")
+        return speaker_segments
+
+    def transcribe_preview(self, path, offsets):
+        """Transcribe a BackgroundPreview's copy and find each speaker's longest segment.
+
+        Runs while recording goes on, so retries are not printed over the meter.
+        """
+        self.configure_assemblyai()
+        start = time.perf_counter()
+        upload_url, _ = self.jobs.upload(path, echo=False)
+        transcript = self.jobs.transcribe(upload_url, {'speaker_labels': True, 'language_code': "en"}, echo=False)
+        if offsets is not None:
+            offsets.remap(transcript.utterances)
+        self.metrics.observe('transcription_preview', time.perf_counter() - start)
+        return self.find_speaker_segments(transcript.utterances)
+
+    def transcribe_sources(self, audio_file):
+        """Transcribe the microphone and system audio stems as separate channels"""
+        sources_file = sources_path_for(audio_file, UPLOAD_FORMAT)
+        upload_start = time.perf_counter()
+        if not is_complete_copy(sources_file, audio_file):
+            print("\nEncoding per-source upload copy...")
+            start = time.time()
+            encode_sources(audio_file, sources_file, UPLOAD_FORMAT)
+            print(f"Encoded in {time.time() - start:.1f} s")
+        upload_url = self.upload_audio(sources_file)
+        self.metrics.observe('transcription_upload', time.perf_counter() - upload_start)
+        
+        print("\nTranscribing microphone and system audio as separate channels...")
+        submitted = time.perf_counter()
+        # One speaker per channel instead of diarizing a mix
+        transcript = self.jobs.transcribe(upload_url, {'multichannel': True, 'language_code': "en"})
+        self.metrics.observe('transcription_full', time.perf_counter() - submitted)
+        return transcript
+
     def transcribe_audio(self, audio_file):
         if not os.path.exists(audio_file):
             print(f"Audio file {audio_file} not found.")
             return None
 
         try:
-            # Step 1: Create a 2-minute preview clip
-            print("\nCreating preview clip...")
-            preview_file = audio_file.replace(".wav", "_preview.wav")
-            
-            # Read the first 2 minutes of the audio file
-            with sf.SoundFile(audio_file, 'r') as f:
-                preview_data = f.read(int(120 * self.sample_rate))  # 2 minutes = 120 seconds
-            
-            # Save the preview clip
-            with sf.SoundFile(preview_file, 'w', 
-                            samplerate=self.sample_rate,
-                            channels=2,
-                            subtype='PCM_24') as f:
-                f.write(preview_data)
-            
-            # Step 2: Transcribe the preview clip
-            print("\nTranscribing preview clip...")
+            self.configure_assemblyai()
             config = aai.TranscriptionConfig(
                 speaker_labels=True,
                 language_code="en"
             )
+            duration = sf.info(audio_file).duration
+            use_chunks = CHUNKED_TRANSCRIPTION and duration > 1.5 * CHUNK_SECONDS
             
-            preview_transcript = aai.Transcriber().transcribe(preview_file, config=config)
-            
-            # Step 3: Get speaker names from preview
-            print("\n=== Preview Transcript (First 2 minutes) ===\n")
+            # Step 0: Reuse an earlier transcription of the same audio and settings
+            layout = load_layout(audio_file)
+            multichannel = MULTICHANNEL_TRANSCRIPTION and layout is not None and layout[1] > 0
+            cache_key = self.transcript_cache.key_for(audio_file, config, chunked=use_chunks,
+                                                      trim_silence=TRIM_SILENCE, multichannel=multichannel,
+                                                      denoise=DENOISE)
+            cached = self.transcript_cache.get(cache_key)
+            profiles = self.load_speaker_profiles()
+            self.print_cache_stats()
+            if cached is not None:
+                cached_transcript, self.speaker_names = cached
+                if not self.name_speakers and self.speaker_map:
+                    self.apply_speaker_map(cached_transcript.utterances)
+                print("\nUsing cached transcript for this recording.")
+                return cached_transcript
             
-            # Find the longest continuous speech for each speaker
-            speaker_segments = {}
-            current_speaker = None
-            current_start = None
-            current_text = []
-            
-            for utterance in preview_transcript.utterances:
-                if current_speaker is None:
-                    current_speaker = utterance.speaker
-                    current_start = utterance.start
-                    current_text = [utterance.text]
-                elif utterance.speaker == current_speaker:
-                    current_text.append(utterance.text)
+            if multichannel:
+                # One speaker per source, so no diarization and no preview
+                full_transcript = self.transcribe_sources(audio_file)
+                if self.name_speakers:
+                    print("\n=== Speakers (A = microphone, B = system audio) ===\n")
+                    with self.metrics.timer('speaker_naming'):
+                        self.identify_speakers(audio_file, self.find_speaker_segments(full_transcript.utterances),
+                                               profiles)
                 else:
-                    # Store the previous segment
-                    duration = utterance.start - current_start
-                    if current_speaker not in speaker_segments or duration > speaker_segments[current_speaker]['duration']:
-                        speaker_segments[current_speaker] = {
-                            'start': current_start,
-                            'duration': duration,
-                            'text': ' '.join(current_text)
-                        }
-                    
-                    # Start new segment
-                    current_speaker = utterance.speaker
-                    current_start = utterance.start
-                    current_text = [utterance.text]
-            
-            # Don't forget the last segment
-            if current_speaker is not None:
-                duration = preview_transcript.utterances[-1].end - current_start
-                if current_speaker not in speaker_segments or duration > speaker_segments[current_speaker]['duration']:
-                    speaker_segments[current_speaker] = {
-                        'start': current_start,
-                        'duration': duration,
-                        'text': ' '.join(current_text)
-                    }
-            
-            # Format and display the longest segments
-            def format_time(start_ms):
-                seconds = int(start_ms / 1000)
-                minutes = seconds // 60
-                seconds = seconds % 60
-                return f"[{minutes:02d}:{seconds:02d}]"
-            
-            print("\nLongest continuous speech segments from each speaker:")
-            for speaker, segment in speaker_segments.items():
-                timestamp = format_time(segment['start'])
-                print(f"\n{timestamp} {speaker}:")
-                print(f"    {segment['text']}\n")
-            
-            # Get names for each speaker
-            print("\nBased on the preview above, please provide names for each speaker:")
-            self.speaker_names = {}
-            
-            for speaker in sorted(speaker_segments.keys()):
-                while True:
-                    name = input(f"Enter name for {speaker}: ").strip()
-                    if name:
-                        self.speaker_names[speaker] = name
-                        break
-                    print("Please enter a valid name.")
-            
-            # Show the mapping
-            print("\nSpeaker mapping:")
-            for speaker, name in self.speaker_names.items():
-                print(f"{speaker} → {name}")
+                    self.apply_speaker_map(full_transcript.utterances)
+                    self.recognize_speakers(audio_file, full_transcript.utterances, profiles)
+                self.transcript_cache.put(cache_key, full_transcript, self.speaker_names)
+                return full_transcript
             
-            print("\nThese names will be used for the full transcription.")
+            # Speaker segments from the preview transcribed while recording, if ready
+            speaker_segments = self.background_preview_segments(audio_file)
+            if speaker_segments is not None:
+                # Ask for names right away; upload and transcription run meanwhile
+                background = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+                submission = background.submit(self.upload_and_submit, audio_file, config, use_chunks,
+                                               duration, with_preview=False, echo=False)
+                background.shutdown(wait=False)
+                print("\n=== Preview Transcript (First 2 minutes, transcribed while recording) ===\n")
+                with self.metrics.timer('speaker_naming'):
+                    self.identify_speakers(audio_file, speaker_segments, profiles)
+                offsets, preview_future, full_future, submitted = submission.result()
+            else:
+                offsets, preview_future, full_future, submitted = self.upload_and_submit(
+                    audio_file, config, use_chunks, duration, with_preview=self.name_speakers)
             
-            # Step 4: Transcribe the full audio with the same speaker mapping
-            print("\nTranscribing full audio...")
-            full_transcript = aai.Transcriber().transcribe(audio_file, config=config)
+            if preview_future is not None:
+                print("\nTranscribing preview (first 2 minutes)...")
+                preview_transcript = preview_future.result()
+                if offsets is not None:
+                    offsets.remap(preview_transcript.utterances)
+                self.metrics.observe('transcription_preview', time.perf_counter() - submitted)
+                
+                # Step 3: Get speaker names from preview
+                print("\n=== Preview Transcript (First 2 minutes) ===\n")
+                
+                speaker_segments = self.find_speaker_segments(preview_transcript.utterances)
+                with self.metrics.timer('speaker_naming'):
+                    self.identify_speakers(audio_file, speaker_segments, profiles)
             
-            # Step 5: Format the full transcript with the names from preview
-            formatted_transcript = self.format_transcript(full_transcript)
+            # Step 4: Collect the full transcript, which has been running meanwhile
+            print("\nWaiting for full transcription...")
+            wait_start = time.time()
+            full_transcript = full_future.result()
+            self.metrics.observe('transcription_full', time.perf_counter() - submitted)
+            if full_transcript.utterances is None:
+                raise RuntimeError(getattr(full_transcript, 'error', None) or "no utterances returned")
+            if offsets is not None and full_future is not preview_future:  # Else remapped above
+                offsets.remap(full_transcript.utterances)
+            if self.name_speakers:
+                print(f"Full transcript ready {time.time() - wait_start:.1f} s after naming speakers")
+            else:
+                self.apply_speaker_map(full_transcript.utterances)
+            # Known voices among speakers who only turn up after the preview
+            self.recognize_speakers(audio_file, full_transcript.utterances, profiles)
             
-            # Clean up the preview file
-            os.remove(preview_file)
+            self.transcript_cache.put(cache_key, full_transcript, self.speaker_names)
             
-            return formatted_transcript
+            # Formatted with the names from the preview by save_transcript()
+            return full_transcript
             
         except Exception as e:
             print(f"Error during transcription: {str(e)}")
+            if TRANSCRIPTION_JOURNAL:
+                print(f"Its upload and jobs are kept: python batch.py {audio_file} picks up where this left off")
             return None
 
-    def format_transcript(self, transcript):
-        """Format the transcript like a script with real names and timestamps"""
-        formatted_lines = []
+    def print_cache_stats(self):
+        stats = self.transcript_cache.stats()
+        print(f"Transcript cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['bytes'] / 1e6:.1f} MB), {stats['evictions']} evicted")
+
+    def find_speaker_segments(self, utterances):
+        """Find the longest continuous speech segment for each speaker"""
+        speaker_segments = {}
         current_speaker = None
+        current_start = None
         current_text = []
-        
+
+        for utterance in utterances:
+            if current_speaker is None:
+                current_speaker = utterance.speaker
+                current_start = utterance.start
+                current_text = [utterance.text]
+            elif utterance.speaker == current_speaker:
+                current_text.append(utterance.text)
+            else:
+                # Store the previous segment
+                duration = utterance.start - current_start
+                if current_speaker not in speaker_segments or duration > speaker_segments[current_speaker]['duration']:
+                    speaker_segments[current_speaker] = {
+                        'start': current_start,
+                        'duration': duration,
+                        'text': ' '.join(current_text)
+                    }
+
+                # Start new segment
+                current_speaker = utterance.speaker
+                current_start = utterance.start
+                current_text = [utterance.text]
+
+        # Don't forget the last segment
+        if current_speaker is not None:
+            duration = utterances[-1].end - current_start
+            if current_speaker not in speaker_segments or duration > speaker_segments[current_speaker]['duration']:
+                speaker_segments[current_speaker] = {
+                    'start': current_start,
+                    'duration': duration,
+                    'text': ' '.join(current_text)
+                }
+
+        return speaker_segments
+
+    def load_speaker_profiles(self):
+        """The voices of speakers named in earlier sessions, or None when not kept"""
+        if not self.speaker_profiles_file:
+            return None
+        return SpeakerProfiles(self.speaker_profiles_file, threshold=SPEAKER_MATCH_THRESHOLD)
+
+    def speaker_fingerprints(self, audio_file, speaker_segments, max_seconds=30.0):
+        """Voice fingerprint of each speaker's longest segment (None if too short to tell).
+
+        Taken from the stem the speaker is loudest in, so the other
+        source's silence or noise doesn't end up in their voice.
+        """
+        fingerprints = {}
+        layout = load_layout(audio_file)
+        with sf.SoundFile(audio_file, 'r') as f:
+            for speaker, segment in speaker_segments.items():
+                start = int(segment['start'] * f.samplerate / 1000)
+                frames = int(min(segment['duration'] / 1000, max_seconds) * f.samplerate)
+                f.seek(min(start, f.frames))
+                samples = loudest_source(f.read(max(frames, 0), dtype='float32', always_2d=True), layout)
+                fingerprints[speaker] = voice_fingerprint(samples, f.samplerate)
+        return fingerprints
+
+    def identify_speakers(self, audio_file, speaker_segments, profiles):
+        """Name the speakers whose voices are on file and ask for the rest.
+
+        Every voice named this session is then stored (or refined), so the
+        next session recognizes it.
+        """
+        if profiles is None:
+            self.prompt_speaker_names(speaker_segments)
+            return
+        fingerprints = self.speaker_fingerprints(audio_file, speaker_segments)
+        known = profiles.match(fingerprints)
+        self.prompt_speaker_names(speaker_segments, known)
+        for speaker, name in self.speaker_names.items():
+            if fingerprints.get(speaker) is not None:
+                row = known[speaker][2] if speaker in known and known[speaker][0] == name else None
+                profiles.remember(name, fingerprints[speaker], row)
+        try:
+            profiles.save()
+        except OSError as e:
+            print(f"Could not save speaker profiles: {str(e)}")
+
+    def recognize_speakers(self, audio_file, utterances, profiles):
+        """Name speakers left unnamed from the voices on file, without asking.
+
+        A voice matching someone already named this session stays unnamed:
+        two labels must not end up as the same person.
+        """
+        if not profiles or not utterances:
+            return
+        speaker_segments = {speaker: segment for speaker, segment in self.find_speaker_segments(utterances).items()
+                            if speaker not in self.speaker_names}
+        known = profiles.match(self.speaker_fingerprints(audio_file, speaker_segments))
+        for speaker, match in known.items():
+            if match[0] not in self.speaker_names.values():
+                self.speaker_names[speaker] = match[0]
+
+    def prompt_speaker_names(self, speaker_segments, known=None):
+        """Show each speaker's longest segment and ask for their names.
+
+        known: {speaker: (name, similarity, ...)} of voices already
+        recognized, which are named without asking.
+        """
+        known = known or {}
+        # Format and display the longest segments
         def format_time(start_ms):
             seconds = int(start_ms / 1000)
             minutes = seconds // 60
             seconds = seconds % 60
             return f"[{minutes:02d}:{seconds:02d}]"
-        
-        # Process each utterance with real names
-        for utterance in transcript.utterances:
-            # Use provided name if available, otherwise use original speaker label
-            speaker = self.speaker_names.get(utterance.speaker, utterance.speaker)
-            timestamp = format_time(utterance.start)
-            
-            # If speaker changes, print the accumulated text
-            if current_speaker and speaker != current_speaker:
-                time_marker = format_time(transcript.utterances[0].start)
-                formatted_lines.append(f"\n{time_marker} {current_speaker}:")
-                formatted_lines.append("    " + " ".join(current_text))
-                current_text = []
-            
-            # Add current text to buffer
-            current_text.append(utterance.text)
-            current_speaker = speaker
-        
-        # Don't forget to print the last speaker's text
-        if current_text:
-            time_marker = format_time(transcript.utterances[-1].start)
-            formatted_lines.append(f"\n{time_marker} {current_speaker}:")
-            formatted_lines.append("    " + " ".join(current_text))
-        
-        # Join all lines and add header
-        final_transcript = "=== Complete Transcript with Speaker Identification ===\n"
-        final_transcript += "\nSpeaker mapping:"
+
+        self.speaker_names = {}
+        if known:
+            print("\nRecognized by voice:")
+            for speaker in sorted(known):
+                name, similarity = known[speaker][:2]
+                self.speaker_names[speaker] = name
+                print(f"{speaker} → {name} ({similarity:.2f})")
+        unknown = [speaker for speaker in sorted(speaker_segments) if speaker not in known]
+        if not unknown:
+            print("\nAll speakers recognized; no names needed.")
+            return
+
+        print("\nLongest continuous speech segments from each speaker:")
+        for speaker, segment in speaker_segments.items():
+            if speaker in known:
+                continue
+            timestamp = format_time(segment['start'])
+            print(f"\n{timestamp} {speaker}:")
+            print(f"    {segment['text']}\n")
+
+        # Get names for each speaker
+        print("\nBased on the preview above, please provide names for each speaker:")
+
+        for speaker in unknown:
+            while True:
+                name = input(f"Enter name for {speaker}: ").strip()
+                if name:
+                    self.speaker_names[speaker] = name
+                    break
+                print("Please enter a valid name.")
+
+        # Show the mapping, recognized and new speakers in label order
+        self.speaker_names = dict(sorted(self.speaker_names.items()))
+        print("\nSpeaker mapping:")
         for speaker, name in self.speaker_names.items():
-            final_transcript += f"\n{speaker} → {name}"
-        final_transcript += "\n\n" + "="*50 + "\n"
-        final_transcript += "\n".join(formatted_lines)
-        
-        return final_transcript
+            print(f"{speaker} → {name}")
+
+        print("\nThese names will be used for the full transcription.")
+
+    def apply_speaker_map(self, utterances):
+        """Name speakers from speaker_map instead of asking; unmapped labels stay as they are"""
+        self.speaker_names = {}
+        for utterance in utterances:
+            if utterance.speaker in self.speaker_map:
+                self.speaker_names[utterance.speaker] = self.speaker_map[utterance.speaker]
+
+    def format_transcript(self, transcript):
+        """Format the transcript like a script with real names and timestamps"""
+        text = io.StringIO()
+        write_transcript(transcript, self.speaker_names, [TextWriter(text, self.speaker_names)])
+        return text.getvalue()
+
+    def save_transcript(self, transcript, filepath, echo=True):
+        """Write the transcript next to the recording in each of TRANSCRIPT_FORMATS.
 
-    def save_transcript(self, transcript, filepath):
-        """Save the transcript to a file with proper formatting"""
-        transcript_file = filepath.replace(".wav", "_transcript.txt")
+        All files (and the console preview) are written in one streaming
+        pass. Returns the text transcript's path, or None on failure.
+        """
+        base = os.path.splitext(filepath)[0]
+        formats = TRANSCRIPT_FILE_FORMATS
+        paths = [f"{base}_transcript.{fmt}" for fmt in formats]
         
         try:
-            with open(transcript_file, "w", encoding="utf-8") as f:
-                f.write(transcript)
-            
-            print(f"\nTranscript saved to {transcript_file}")
+            with contextlib.ExitStack() as stack:
+                writers = [WRITERS[fmt](stack.enter_context(open(path, "w", encoding="utf-8")),
+                                        self.speaker_names)
+                           for fmt, path in zip(formats, paths)]
+                if echo:
+                    print("\n" + "="*50)
+                    print("FULL TRANSCRIPT:")
+                    print("="*50)
+                    writers.append(TextWriter(sys.stdout, self.speaker_names,
+                                              max_blocks=CONSOLE_PREVIEW_BLOCKS or None))
+                with self.metrics.timer('transcription_format'):
+                    write_transcript(transcript, self.speaker_names, writers)
+                if echo:
+                    print("\n" + "="*50 + "\n")
             
-            # Only show the full transcript, not the preview
-            print("\n" + "="*50)
-            print("FULL TRANSCRIPT:")
-            print("="*50)
-            print(transcript)
-            print("="*50 + "\n")
+            print(f"\nTranscript saved to {', '.join(paths)}")
+            return paths[0]
             
         except Exception as e:
             print(f"Error saving transcript: {str(e)}")
+            return None
 
     def pause_recording(self):
         """Pause the current recording"""
@@ -571,15 +1228,16 @@ def main():
 
     try:
         print("About to initialize AudioRecorder...")
-        # Test device listing before creating AudioRecorder
-        print("\nTesting audio device listing:")
-        devices = sd.query_devices()
-        print(f"Found {len(devices)} audio devices")
-        
-        # Now create the recorder
-        recorder = AudioRecorder(ASSEMBLYAI_API_KEY)
+        recorder = AudioRecorder(ASSEMBLYAI_API_KEY, live_transcription=LIVE_TRANSCRIPTION)
         print("AudioRecorder initialized successfully")
         
+        # Startup time, so slow imports or device probing show up
+        imports = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in IMPORT_TIMES.items())
+        print(f"Ready in {time.perf_counter() - STARTED:.2f} s "
+              f"(devices {recorder.device_setup_seconds:.2f} s"
+              f"{' from saved profile' if recorder.device_profile_used else ''}"
+              f"{'; imports: ' + imports if imports else ''})")
+        
         while True:
             print("\n=== Audio Recorder Menu ===")
             print("1. Start New Recording")
@@ -592,21 +1250,15 @@ def main():
                     print("\nPress Enter to start recording...")
                     input()
                     
-                    audio_file = recorder.start_recording()
+                    # Records, transcribes and saves the transcript in one go
+                    recorder.start_recording()
                     
-                    if audio_file:
-                        print("\nTranscribing audio...")
-                        transcript = recorder.transcribe_audio(audio_file)
-                        
-                        if transcript:
-                            # Save and display the formatted transcript
-                            recorder.save_transcript(transcript, audio_file)
-                            
                 except Exception as e:
                     print(f"Error during recording session: {str(e)}")
             
             elif choice == "2":
                 print("Goodbye!")
+                recorder.transcript_cache.close()
                 break
             
             else:
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Preallocated single-producer/single-consumer audio ring buffer.
+
+    The producer (a PortAudio callback) copies blocks in with write(); the
+    consumer reads contiguous views with peek() and releases them with
+    advance(). Nothing is allocated after construction, and when the ring is
+    full the incoming block is dropped and counted instead of growing.
+    """
+
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.buffer = np.zeros((self.capacity, channels), dtype=dtype)
+
+        # Monotonic frame counters. Only the producer moves write_pos and only
+        # the consumer moves read_pos, so no lock is needed between them.
+        self.write_pos = 0
+        self.read_pos = 0
+
+        self.overflows = 0
+        self.dropped_frames = 0
+
+        # (frame index, capture time) of the most recent block, replaced as a
+        # single tuple so the consumer never sees a torn pair
+        self.last_timestamp = None
+
+    def available(self):
+        """Number of frames ready to be read"""
+        return self.write_pos - self.read_pos
+
+    def free(self):
+        """Number of frames that can be written without overflowing"""
+        return self.capacity - (self.write_pos - self.read_pos)
+
+    def write(self, block, timestamp=None):
+        """Copy a block into the ring; returns False if it had to be dropped.
+
+        timestamp is the capture time of the block's first frame (the
+        callback's inputBufferAdcTime). Dropped blocks still advance the
+        frame count so the timestamps keep describing the source clock.
+        """
+        frames = len(block)
+        if frames > self.free():
+            if timestamp is not None:
+                self.last_timestamp = (self.write_pos + self.dropped_frames, timestamp)
+            self.overflows += 1
+            self.dropped_frames += frames
+            return False
+
+        start = self.write_pos % self.capacity
+        first = min(frames, self.capacity - start)
+        np.copyto(self.buffer[start:start + first], block[:first])
+        if first < frames:
+            np.copyto(self.buffer[:frames - first], block[first:])
+
+        # Publish only after the data is in place
+        self.write_pos += frames
+        if timestamp is not None:
+            self.last_timestamp = (self.write_pos - frames + self.dropped_frames, timestamp)
+        return True
+
+    def source_position(self):
+        """Source-clock frame index of the next unread frame, counting drops"""
+        return self.read_pos + self.dropped_frames
+
+    def peek(self, max_frames=None):
+        """Return a contiguous view of up to max_frames unread frames.
+
+        The view may be shorter than what is available when the readable
+        region wraps around the end of the buffer; call peek() again after
+        advance() to get the rest.
+        """
+        available = self.write_pos - self.read_pos
+        if max_frames is not None:
+            available = min(available, max_frames)
+        start = self.read_pos % self.capacity
+        frames = min(available, self.capacity - start)
+        return self.buffer[start:start + frames]
+
+    def advance(self, frames):
+        """Release frames previously returned by peek()"""
+        self.read_pos += frames
+
+    def discard(self):
+        """Drop everything currently readable"""
+        self.read_pos = self.write_pos
@@ -0,0 +1,355 @@
+"""Recording and transcription service for several capture stations at once.
+
+    python service.py --port 8750 --jobs 4
+    python service.py recordings/*.wav --speakers speakers.json
+
+Each session either records from a microphone/system audio device pair
+until it is stopped, or transcribes an existing file. Every transcription
+goes through one bounded scheduler whose jobs share one set of uploads
+and polled transcription jobs (and the SDK's pooled HTTP connections),
+and every job runs on a worker of its own, so a slow upload only holds up
+its own session.
+Nobody is at a console to name speakers, so names come from --speakers.
+
+Control the service over local HTTP with JSON bodies:
+
+    curl -X POST localhost:8750/sessions -d '{"mic": 1, "system": 3, "name": "room-a"}'
+    curl -X POST localhost:8750/sessions -d '{"file": "recording_20240315_143022.wav"}'
+    curl -X POST localhost:8750/sessions/1/stop
+    curl localhost:8750/sessions
+    curl localhost:8750/sessions/1
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import urlparse
+
+from batch import load_speaker_map
+from config import (ASSEMBLYAI_API_KEY, DENOISE_WORKERS, SERVICE_HOST, SERVICE_JOBS, SERVICE_OUTPUT_DIR,
+                    SERVICE_PORT, TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB, TRANSCRIPTION_JOURNAL,
+                    UPLOAD_CHUNK_MB, UPLOAD_RETRIES)
+from denoise import workers_per_job
+from jobs import TranscriptionJobs
+from recorder import AudioRecorder
+from transcript_cache import TranscriptCache
+
+
+class Session:
+    """One recording (or queued file) and its transcription"""
+
+    def __init__(self, session_id, name, path=None, devices=None):
+        self.id = session_id
+        self.name = name
+        self.path = path
+        self.devices = devices  # (mic id, system id) while recording
+        self.state = 'queued'
+        self.recorder = None
+        self.transcript_file = None
+        self.error = None
+        self.created = time.time()
+        self.updated = self.created
+
+    def set_state(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.updated = time.time()
+
+    def status(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'recording': self.path,
+            'transcript': self.transcript_file,
+            'error': self.error,
+            'created': self.created,
+            'updated': self.updated,
+        }
+
+
+class TranscriptionScheduler:
+    """Runs at most max_jobs transcriptions at once.
+
+    A transcription is blocking SDK work (upload, then polling), so each
+    job gets a worker thread of its own while the event loop just awaits
+    it; jobs over the limit wait their turn. One TranscriptionJobs is
+    shared by every job, so a single thread polls them all, and with it
+    the SDK's default client and its HTTP connection pool.
+    """
+
+    def __init__(self, max_jobs=SERVICE_JOBS):
+        self.max_jobs = max_jobs
+        self.slots = asyncio.Semaphore(max_jobs)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_jobs,
+                                                              thread_name_prefix="transcription")
+        self.jobs = TranscriptionJobs(TRANSCRIPTION_JOURNAL, chunk_size=UPLOAD_CHUNK_MB << 20,
+                                      retries=UPLOAD_RETRIES)
+        self.waiting = 0
+        self.running = 0
+        self.finished = 0
+
+    async def run(self, session):
+        """Transcribe a session's recording and save it; returns the transcript path"""
+        self.waiting += 1
+        async with self.slots:
+            self.waiting -= 1
+            self.running += 1
+            session.set_state('transcribing')
+            try:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, self._transcribe, session)
+            finally:
+                self.running -= 1
+                self.finished += 1
+
+    def status(self):
+        return {'max_jobs': self.max_jobs, 'running': self.running, 'waiting': self.waiting,
+                'finished': self.finished}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+    def _transcribe(self, session):
+        recorder = session.recorder
+        transcript = recorder.transcribe_audio(session.path)
+        if transcript is None:
+            raise RuntimeError("transcription failed")
+        transcript_file = recorder.save_transcript(transcript, session.path, echo=False)
+        if transcript_file is None:
+            raise RuntimeError("could not save the transcript")
+        return transcript_file
+
+
+class RecordingService:
+    """Manages concurrent recording sessions and queued files"""
+
+    def __init__(self, api_key, max_jobs=SERVICE_JOBS, output_dir=SERVICE_OUTPUT_DIR, speaker_map=None):
+        self.api_key = api_key
+        self.output_dir = output_dir
+        self.default_map, self.file_maps = speaker_map or ({}, {})
+        self.scheduler = TranscriptionScheduler(max_jobs)
+        self.cache = TranscriptCache(TRANSCRIPT_CACHE_DIR, TRANSCRIPT_CACHE_MAX_MB * 1000 * 1000)
+        self.sessions = {}
+        self.next_id = 1
+        self.tasks = set()
+
+    def new_recorder(self, path=None):
+        recorder = AudioRecorder(self.api_key, detect_devices=False, transcript_cache=self.cache,
+                                 jobs=self.scheduler.jobs)
+        recorder.name_speakers = False  # No console to ask at; names come from the speaker map
+        recorder.denoise_workers = workers_per_job(self.scheduler.max_jobs, DENOISE_WORKERS)
+        recorder.speaker_map = dict(self.default_map)
+        if path is not None:
+            recorder.speaker_map.update(self.file_maps.get(os.path.basename(path), {}))
+        recorder.hotkeys = False
+        recorder.show_meter = False
+        return recorder
+
+    def start_recording(self, mic, system=None, name=None):
+        """Start recording from a device pair; raises ValueError if a device is busy or invalid"""
+        for session in self.sessions.values():
+            if session.state == 'recording' and {mic, system} & set(session.devices) - {None}:
+                raise ValueError(f"A device is already recording in session {session.id}")
+        recorder = self.new_recorder()
+        recorder.use_devices(mic, system)
+        session = self._add(name or f"mic {mic}", devices=(mic, system))
+        recorder.output_dir = os.path.join(self.output_dir, f"session_{session.id}")
+        session.recorder = recorder
+        session.set_state('recording')
+        self._spawn(self._record_and_transcribe(session))
+        return session
+
+    def queue_file(self, path, name=None):
+        """Queue an existing recording for transcription"""
+        if not os.path.exists(path):
+            raise ValueError(f"{path} not found")
+        path = os.path.abspath(path)
+        session = self._add(name or os.path.basename(path), path=path)
+        session.recorder = self.new_recorder(path)
+        self._spawn(self._transcribe(session))
+        return session
+
+    def stop(self, session_id):
+        """Stop a recording session; False if it is not recording"""
+        session = self.sessions[session_id]
+        if session.state != 'recording':
+            return False
+        session.recorder.controls.post('stop')
+        return True
+
+    def status(self):
+        return {'sessions': [session.status() for session in self.sessions.values()],
+                'transcription': self.scheduler.status()}
+
+    async def shutdown(self):
+        """Stop every recording and let pending transcriptions finish"""
+        for session in self.sessions.values():
+            if session.state == 'recording':
+                session.recorder.controls.post('stop')
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.scheduler.shutdown()
+        self.cache.close()
+
+    async def _record_and_transcribe(self, session):
+        # A thread per recording (not a pool worker), so any number can run at once
+        loop = asyncio.get_running_loop()
+        finished = loop.create_future()
+
+        def record():
+            try:
+                result = session.recorder.record()
+            except Exception as e:
+                print(f"Session {session.id}: {str(e)}")
+                result = None
+            loop.call_soon_threadsafe(finished.set_result, result)
+
+        session.recorder.recording = True
+        threading.Thread(target=record, name=f"record-{session.id}", daemon=True).start()
+        path = await finished
+        if path is None:
+            session.set_state('failed', "recording failed")
+            return
+        session.path = os.path.abspath(path)
+        session.set_state('queued')
+        await self._transcribe(session)
+
+    async def _transcribe(self, session):
+        try:
+            session.transcript_file = await self.scheduler.run(session)
+            session.set_state('done')
+        except Exception as e:
+            session.set_state('failed', str(e))
+        print(f"Session {session.id} ({session.name}): {session.state}"
+              f"{': ' + session.error if session.error else ''}")
+
+    def _add(self, name, path=None, devices=None):
+        session = Session(self.next_id, name, path, devices)
+        self.sessions[session.id] = session
+        self.next_id += 1
+        return session
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+
+class ControlServer:
+    """Local JSON-over-HTTP control API for a RecordingService"""
+
+    def __init__(self, service, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.service = service
+        self.host = host
+        self.port = port
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def route(self, method, path, body):
+        """Returns (HTTP status, JSON payload)"""
+        parts = [part for part in path.split('/') if part]
+        if not parts or parts[0] != 'sessions':
+            return 404, {'error': "not found"}
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, self.service.status()
+            if method == 'POST':
+                request = json.loads(body or b'{}')
+                try:
+                    if 'file' in request:
+                        session = self.service.queue_file(request['file'], request.get('name'))
+                    elif 'mic' in request:
+                        system = request.get('system')
+                        session = self.service.start_recording(int(request['mic']),
+                                                               None if system is None else int(system),
+                                                               request.get('name'))
+                    else:
+                        return 400, {'error': "give either 'file' or 'mic' (and optionally 'system')"}
+                except (ValueError, TypeError) as e:
+                    return 400, {'error': str(e)}
+                return 201, session.status()
+            return 405, {'error': "method not allowed"}
+
+        try:
+            session = self.service.sessions[int(parts[1])]
+        except (ValueError, KeyError):
+            return 404, {'error': "no such session"}
+        if len(parts) == 2 and method == 'GET':
+            return 200, session.status()
+        if len(parts) == 3 and parts[2] == 'stop' and method == 'POST':
+            if not self.service.stop(session.id):
+                return 409, {'error': f"session is {session.state}, not recording"}
+            return 200, session.status()
+        return 404, {'error': "not found"}
+
+    async def _handle(self, reader, writer):
+        try:
+            method, target, _ = (await reader.readline()).decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            status, payload = self.route(method, urlparse(target).path, body)
+        except Exception as e:
+            status, payload = 400, {'error': str(e)}
+
+        data = json.dumps(payload, indent=2).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                     f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode('latin-1') + data)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    speaker_map = load_speaker_map(args.speakers) if args.speakers else None
+    service = RecordingService(ASSEMBLYAI_API_KEY, args.jobs, args.output_dir, speaker_map)
+    control = await ControlServer(service, args.host, args.port).start()
+    print(f"Service listening on http://{control.host}:{control.port} "
+          f"({args.jobs} transcriptions at a time)")
+    for path in args.files:
+        service.queue_file(path)
+    try:
+        await asyncio.Event().wait()  # Until interrupted
+    finally:
+        print("\nStopping: finishing recordings and pending transcriptions...")
+        await control.stop()
+        await service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and transcribe several sessions at once")
+    parser.add_argument('files', nargs='*', help="Recordings to queue for transcription at startup")
+    parser.add_argument('--host', default=SERVICE_HOST)
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--jobs', type=int, default=SERVICE_JOBS, help="Transcriptions run at once")
+    parser.add_argument('--output-dir', default=SERVICE_OUTPUT_DIR, help="Where recordings are written")
+    parser.add_argument('--speakers', help="JSON file mapping speaker labels to names (see batch.py)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
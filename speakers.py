@@ -0,0 +1,241 @@
+import argparse
+import os
+
+import numpy as np
+
+
+def speaker_label(index):
+    """AssemblyAI-style speaker label for a 0-based index: A, B, ..., Z, S26, ..."""
+    return chr(ord('A') + index) if index < 26 else f"S{index}"
+
+
+def _mel_filterbank(n_fft, sample_rate, n_bands, low=80.0, high=7600.0):
+    high = min(high, sample_rate / 2)
+    mel = lambda f: 2595 * np.log10(1 + f / 700)
+    hz = lambda m: 700 * (10 ** (m / 2595) - 1)
+    edges = hz(np.linspace(mel(low), mel(high), n_bands + 2))
+    bins = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    bank = np.zeros((n_bands, len(bins)))
+    for i in range(n_bands):
+        left, centre, right = edges[i:i + 3]
+        rising = (bins - left) / (centre - left)
+        falling = (right - bins) / (right - centre)
+        bank[i] = np.maximum(0, np.minimum(rising, falling))
+    return bank
+
+
+def voice_fingerprint(samples, sample_rate, n_bands=32, n_coeffs=16):
+    """Compact, unit-length voice signature for a stretch of mono speech.
+
+    Mean and spread of the MFCCs over the voiced frames. Crude next to a
+    real speaker embedding, but cheap, NumPy-only and good enough to tell
+    the handful of voices in one meeting apart. Returns None when there is
+    not enough voiced audio.
+    """
+    frame = 1 << int(np.ceil(np.log2(0.025 * sample_rate)))
+    hop = frame // 2
+    samples = np.asarray(samples, dtype=np.float32)
+    if len(samples) < frame * 4:
+        return None
+
+    count = 1 + (len(samples) - frame) // hop
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame)[::hop][:count]
+    power = np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1)) ** 2
+
+    energies = power @ _mel_filterbank(frame, sample_rate, n_bands).T
+    log_energies = np.log(energies + 1e-10)
+
+    # Keep the louder half of the frames, which is where the voice is
+    loudness = log_energies.sum(axis=1)
+    voiced = log_energies[loudness >= np.median(loudness)]
+    if len(voiced) < 4:
+        return None
+
+    # DCT-II to cepstral coefficients, dropping c0 (overall level)
+    k = np.arange(1, n_coeffs + 1)[:, None]
+    n = np.arange(n_bands)[None, :]
+    dct = np.cos(np.pi * k * (2 * n + 1) / (2 * n_bands))
+    cepstra = voiced @ dct.T
+
+    fingerprint = np.concatenate((cepstra.mean(axis=0), cepstra.std(axis=0)))
+    norm = np.linalg.norm(fingerprint)
+    return (fingerprint / norm).astype(np.float32) if norm > 0 else None
+
+
+def speaker_audio(samples, sample_rate, utterances, max_seconds=30.0):
+    """Concatenate up to max_seconds of each speaker's utterances.
+
+    utterances carry start/end in milliseconds relative to samples.
+    Returns {speaker: mono samples}.
+    """
+    pieces = {}
+    lengths = {}
+    limit = int(max_seconds * sample_rate)
+    for utterance in utterances:
+        if lengths.get(utterance.speaker, 0) >= limit:
+            continue
+        start = int(utterance.start * sample_rate / 1000)
+        end = int(utterance.end * sample_rate / 1000)
+        piece = samples[start:end]
+        pieces.setdefault(utterance.speaker, []).append(piece)
+        lengths[utterance.speaker] = lengths.get(utterance.speaker, 0) + len(piece)
+    return {speaker: np.concatenate(parts) for speaker, parts in pieces.items()}
+
+
+class SpeakerReconciler:
+    """Maps per-chunk speaker labels onto one set of global labels.
+
+    Diarization labels speakers independently in every chunk, so "A" in one
+    chunk can be "B" in the next. Each chunk's speakers are matched one to
+    one against the voices seen so far by fingerprint similarity; anyone
+    below the threshold becomes a new global speaker.
+    """
+
+    def __init__(self, threshold=0.85):
+        self.threshold = threshold
+        self.profiles = []  # Running sum of fingerprints per global speaker (None if unknown)
+
+    def assign(self, fingerprints):
+        """fingerprints: {local label: vector or None}; returns {local: global label}"""
+        pairs = []
+        for local, fingerprint in fingerprints.items():
+            if fingerprint is None:
+                continue
+            for index, profile in enumerate(self.profiles):
+                if profile is None:
+                    continue
+                similarity = float(np.dot(fingerprint, profile / np.linalg.norm(profile)))
+                pairs.append((similarity, local, index))
+
+        mapping = {}
+        taken = set()
+        for similarity, local, index in sorted(pairs, key=lambda p: p[0], reverse=True):
+            if similarity < self.threshold:
+                break
+            if local in mapping or index in taken:
+                continue
+            mapping[local] = index
+            taken.add(index)
+            self.profiles[index] = self.profiles[index] + fingerprints[local]
+
+        # Sorted so new speakers get labels in a stable order
+        for local in sorted(fingerprints):
+            if local in mapping:
+                continue
+            fingerprint = fingerprints[local]
+            if fingerprint is None and len(self.profiles) > len(taken):
+                # Too little audio to compare: fall back to the first free global speaker
+                index = next(i for i in range(len(self.profiles)) if i not in taken)
+            else:
+                index = len(self.profiles)
+                self.profiles.append(fingerprint)
+            mapping[local] = index
+            taken.add(index)
+
+        return {local: speaker_label(index) for local, index in mapping.items()}
+
+
+class SpeakerProfiles:
+    """Voice fingerprints of named speakers, kept from one session to the next.
+
+    Each stored voice is a row of one float32 matrix of unit-length
+    fingerprints, so matching a session's speakers against thousands of
+    voices is a single matrix product. A name can own several rows (the
+    same person heard in the room and over a call). Saved as a .npz file.
+
+    A speaker is recognized when their best row is at least threshold
+    similar and beats the best row of anyone else by margin.
+    """
+
+    def __init__(self, path, threshold=0.92, margin=0.05, max_weight=20):
+        self.path = path
+        self.threshold = threshold
+        self.margin = margin
+        self.max_weight = max_weight  # Sessions a row averages over before it starts to drift with the voice
+        self.names = np.zeros(0, dtype=str)
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.weights = np.zeros(0, dtype=np.int32)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                self.names = data['names']
+                self.vectors = np.ascontiguousarray(data['vectors'], dtype=np.float32)
+                self.weights = data['weights']
+        except (OSError, ValueError, KeyError):
+            pass  # No store yet, or an unreadable one that the next save replaces
+
+    def __len__(self):
+        return len(self.names)
+
+    def match(self, fingerprints):
+        """fingerprints: {label: vector or None}; returns {label: (name, similarity, row)}
+        for the labels recognized, each name given to one label at most"""
+        labels = [label for label, fingerprint in fingerprints.items() if fingerprint is not None]
+        if not labels or not len(self) or self.vectors.shape[1] != len(fingerprints[labels[0]]):
+            return {}
+        similarity = self.vectors @ np.stack([fingerprints[label] for label in labels]).T
+
+        candidates = []
+        for column, label in enumerate(labels):
+            scores = similarity[:, column]
+            row = int(np.argmax(scores))
+            others = scores[self.names != self.names[row]]
+            runner_up = float(others.max()) if len(others) else -1.0
+            if scores[row] >= self.threshold and scores[row] - runner_up >= self.margin:
+                candidates.append((float(scores[row]), label, row))
+
+        matches = {}
+        for score, label, row in sorted(candidates, reverse=True):
+            name = str(self.names[row])
+            if all(name != match[0] for match in matches.values()):
+                matches[label] = (name, score, row)
+        return matches
+
+    def remember(self, name, fingerprint, row=None):
+        """Fold fingerprint into row (a voice just recognized as name), or add it as a new voice"""
+        if row is not None and self.names[row] == name:
+            weight = min(int(self.weights[row]), self.max_weight)
+            blended = self.vectors[row] * weight + fingerprint
+            self.vectors[row] = blended / np.linalg.norm(blended)
+            self.weights[row] = weight + 1
+            return
+        vectors = self.vectors if len(self) else self.vectors.reshape(0, len(fingerprint))
+        self.vectors = np.vstack((vectors, fingerprint[None, :].astype(np.float32)))
+        self.names = np.append(self.names, name)
+        self.weights = np.append(self.weights, np.int32(1))
+
+    def forget(self, name):
+        """Drop every voice stored for name; returns how many there were"""
+        keep = self.names != name
+        removed = len(self) - int(keep.sum())
+        self.names, self.vectors, self.weights = self.names[keep], self.vectors[keep], self.weights[keep]
+        return removed
+
+    def save(self):
+        temp = f"{self.path}.tmp"
+        with open(temp, 'wb') as f:
+            np.savez(f, names=self.names, vectors=self.vectors, weights=self.weights)
+        os.replace(temp, self.path)
+
+
+def main():
+    from config import SPEAKER_PROFILES_FILE
+
+    parser = argparse.ArgumentParser(description="List or forget the voices used to name speakers")
+    parser.add_argument('--file', default=SPEAKER_PROFILES_FILE, help="Speaker profile store")
+    parser.add_argument('--forget', metavar='NAME', help="Remove every voice stored for NAME")
+    args = parser.parse_args()
+    profiles = SpeakerProfiles(args.file)
+    if args.forget:
+        removed = profiles.forget(args.forget)
+        profiles.save()
+        print(f"Forgot {removed} voice{'s' if removed != 1 else ''} of {args.forget}")
+        return
+    names, counts = np.unique(profiles.names, return_counts=True)
+    for name, count in zip(names, counts):
+        sessions = int(profiles.weights[profiles.names == name].sum())
+        print(f"{name}: {count} voice{'s' if count > 1 else ''}, {sessions} session{'s' if sessions > 1 else ''}")
+    print(f"{len(profiles)} voices of {len(names)} speakers in {args.file}")
+
+
+if __name__ == "__main__":
+    main()
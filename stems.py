@@ -0,0 +1,126 @@
+"""Recordings stored as per-source stems, and their mixdown.
+
+A recording's WAV holds the microphone channels followed by the system
+audio channels, each at its device's own channel count, with the layout
+saved next to it in a _stems.json file. The mix is only made from the
+stems when something needs it; to write it out as a WAV of its own:
+
+    python stems.py recording_20240315_143022.wav
+
+Recordings made before stems (no layout file) are already a mix and are
+read as they are.
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+from dsp import MixEngine
+from lazy import LazyModule
+
+sf = LazyModule('soundfile')
+
+
+def layout_path_for(audio_file):
+    return os.path.splitext(audio_file)[0] + "_stems.json"
+
+
+def mixdown_path_for(audio_file):
+    return os.path.splitext(audio_file)[0] + "_mix.wav"
+
+
+def save_layout(audio_file, mic_channels, sys_channels):
+    """Record which channels of a recording belong to which source (0 = no system audio)"""
+    path = layout_path_for(audio_file)
+    temp = f"{path}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump({'mic_channels': mic_channels, 'sys_channels': sys_channels}, f)
+    os.replace(temp, path)
+
+
+def load_layout(audio_file):
+    """(mic channels, system channels), or None for a recording stored as a mix"""
+    try:
+        with open(layout_path_for(audio_file), encoding="utf-8") as f:
+            data = json.load(f)
+        return data['mic_channels'], data['sys_channels']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def mix_channels(layout):
+    """Channels of the mix made from stems with this layout"""
+    mic_channels, sys_channels = layout
+    return max(mic_channels, sys_channels, 1)
+
+
+def loudest_source(block, layout):
+    """Mono samples of whichever source is loudest in block.
+
+    For looking at one speaker: their voice is in the stem they spoke
+    into, while the other stem holds silence or someone else. A block of
+    a recording stored as a mix (layout None) is simply downmixed.
+    """
+    if layout is None or not layout[1]:
+        return block.mean(axis=1)
+    mic_channels = layout[0]
+    sources = [block[:, :mic_channels], block[:, mic_channels:]]
+    return max(sources, key=lambda source: float(np.mean(np.square(source)))).mean(axis=1)
+
+
+def mixed_blocks(audio_file, blocksize=8192):
+    """Yield a recording's mix a block at a time.
+
+    Stems go through the same MixEngine as the recorder's live mix, in
+    blocks of about the size it mixes. Each block is a view into scratch
+    memory that the next one overwrites.
+    """
+    layout = load_layout(audio_file)
+    with sf.SoundFile(audio_file, 'r') as source:
+        if layout is None:
+            yield from source.blocks(blocksize, dtype='float32', always_2d=True)
+            return
+        mic_channels, sys_channels = layout
+        engine = MixEngine(blocksize, [channels for channels in layout if channels],
+                           out_channels=mix_channels(layout))
+        for block in source.blocks(blocksize, dtype='float32', always_2d=True):
+            sources = [np.ascontiguousarray(block[:, :mic_channels])]
+            if sys_channels:
+                sources.append(np.ascontiguousarray(block[:, mic_channels:]))
+            mixed, _ = engine.process(*sources)
+            yield mixed
+
+
+def mixdown(audio_file, path=None):
+    """Write a recording's mix to a WAV of its own, unless it is already there.
+
+    Returns the mix's path, which is the recording itself when it was
+    stored as a mix.
+    """
+    if load_layout(audio_file) is None:
+        return audio_file
+    path = path or mixdown_path_for(audio_file)
+    info = sf.info(audio_file)
+    try:
+        if sf.info(path).frames == info.frames:
+            return path
+    except RuntimeError:
+        pass  # Missing, or left unfinished by a crash
+    with sf.SoundFile(path, 'w', samplerate=info.samplerate, channels=mix_channels(load_layout(audio_file)),
+                      subtype=info.subtype) as f:
+        for block in mixed_blocks(audio_file):
+            f.write(block)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mix a stem recording down to one WAV")
+    parser.add_argument('recording', help="The recording's WAV")
+    parser.add_argument('--output', help="Mixed file (default: the recording name with _mix)")
+    args = parser.parse_args()
+    print(f"Mix written to {mixdown(args.recording, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import base64
+import json
+import queue
+import threading
+from array import array
+from urllib.parse import urlencode
+
+import numpy as np
+
+from dsp import Downsampler, to_pcm16
+from lazy import LazyModule
+from transcript import Transcript, Utterance
+
+websockets_client = LazyModule('websockets.sync.client')
+websockets_exceptions = LazyModule('websockets.exceptions')
+
+
+class StreamingTranscriber:
+    """Feeds the live mix to AssemblyAI's real-time API while recording.
+
+    Blocks are downmixed to 16 kHz PCM and queued for a sender thread, so the
+    capture loop never waits on the network. A receiver thread collects the
+    final utterances into a Transcript that format_transcript() accepts.
+
+    The real-time service does not diarize, so each utterance is attributed
+    to the microphone (speaker "A") or system audio (speaker "B") depending
+    on which was louder while it was spoken.
+    """
+
+    sample_rate = 16000
+    chunk_ms = 100  # The service accepts 100-2000 ms of audio per message
+    bin_ms = 100    # Resolution of the mic/system loudness timeline
+
+    def __init__(self, api_key, url, source_rate=48000, max_queued_chunks=300):
+        self.api_key = api_key
+        self.url = url
+        self.source_rate = source_rate
+        self.downsampler = Downsampler(factor=source_rate // self.sample_rate)
+        self.chunk_samples = self.sample_rate * self.chunk_ms // 1000
+
+        self.send_queue = queue.Queue(maxsize=max_queued_chunks)
+        self.pending = []
+        self.pending_samples = 0
+
+        self.fed_frames = 0         # Source frames fed, i.e. position in the recording
+        self.sent_samples = 0       # 16 kHz samples handed to the sender
+        self.gaps = []              # (service ms, ms skipped) for chunks dropped on a full queue
+        self.dropped_chunks = 0
+        self.dominance = array('d')  # Per bin: mic energy minus system energy
+
+        self.utterances = []
+        self.partial = ""
+        self.error = None
+        self.websocket = None
+        self.sender = None
+        self.receiver = None
+
+    def start(self):
+        """Open the real-time session and start the I/O threads"""
+        params = urlencode({'sample_rate': self.sample_rate})
+        self.websocket = websockets_client.connect(f"{self.url}?{params}",
+                                 additional_headers={'Authorization': self.api_key},
+                                 open_timeout=10)
+        self.sender = threading.Thread(target=self._send, daemon=True)
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.sender.start()
+        self.receiver.start()
+
+    def feed(self, mixed_audio, mic_level=0.0, sys_level=0.0):
+        """Queue one block of the mix; never blocks the capture loop"""
+        bin_index = int(self.fed_frames * 1000 / self.source_rate) // self.bin_ms
+        while len(self.dominance) <= bin_index:
+            self.dominance.append(0.0)
+        self.dominance[bin_index] += (mic_level ** 2 - sys_level ** 2) * len(mixed_audio)
+        self.fed_frames += len(mixed_audio)
+
+        samples = self.downsampler.process(mixed_audio)
+        self.pending.append(samples)
+        self.pending_samples += len(samples)
+        if self.pending_samples >= self.chunk_samples:
+            self._queue_pending()
+
+    def _queue_pending(self, pad=False):
+        samples = np.concatenate(self.pending)
+        if pad and len(samples) < self.chunk_samples:
+            samples = np.pad(samples, (0, self.chunk_samples - len(samples)))
+        self.pending = []
+        self.pending_samples = 0
+        try:
+            self.send_queue.put_nowait(to_pcm16(samples))
+            self.sent_samples += len(samples)
+        except queue.Full:
+            # Better a hole in the live transcript than a stalled recording;
+            # remember it so later timestamps still line up with the file
+            self.dropped_chunks += 1
+            self.gaps.append((self.sent_samples * 1000 / self.sample_rate,
+                              len(samples) * 1000 / self.sample_rate))
+
+    def _send(self):
+        while True:
+            chunk = self.send_queue.get()
+            if chunk is None:
+                break
+            message = json.dumps({'audio_data': base64.b64encode(chunk).decode('utf-8')})
+            try:
+                self.websocket.send(message)
+            except websockets_exceptions.ConnectionClosed as e:
+                self.error = f"Connection closed while streaming: {e}"
+                return
+        try:
+            self.websocket.send(json.dumps({'terminate_session': True}))
+        except websockets_exceptions.ConnectionClosed:
+            pass
+
+    def _receive(self):
+        while True:
+            try:
+                message = json.loads(self.websocket.recv())
+            except websockets_exceptions.ConnectionClosed:
+                break
+
+            message_type = message.get('message_type')
+            if message_type == 'FinalTranscript':
+                self.partial = ""
+                if message.get('text'):
+                    self.utterances.append(self._make_utterance(message))
+            elif message_type == 'PartialTranscript':
+                self.partial = message.get('text', "")
+            elif message_type == 'SessionTerminated':
+                break
+            elif 'error' in message:
+                self.error = message['error']
+                print(f"\nLive transcription error: {self.error}")
+
+    def _make_utterance(self, message):
+        start = self._to_recording_ms(message['audio_start'])
+        end = self._to_recording_ms(message['audio_end'])
+        return Utterance(self._speaker_between(start, end), start, end,
+                         message['text'], message.get('confidence'))
+
+    def _to_recording_ms(self, service_ms):
+        """Map a service timestamp back onto the recording timeline"""
+        offset = 0
+        for at, skipped in self.gaps:
+            if at > service_ms:
+                break
+            offset += skipped
+        return int(service_ms + offset)
+
+    def _speaker_between(self, start_ms, end_ms):
+        first = start_ms // self.bin_ms
+        last = max(first + 1, end_ms // self.bin_ms + 1)
+        return "A" if sum(self.dominance[first:last]) >= 0 else "B"
+
+    def stop(self, timeout=30):
+        """Flush the remaining audio, end the session and return the Transcript"""
+        if self.pending:
+            self._queue_pending(pad=True)
+        try:
+            self.send_queue.put(None, timeout=timeout)
+        except queue.Full:
+            self.error = "Timed out flushing audio to the live transcription service"
+
+        self.sender.join(timeout)
+        self.receiver.join(timeout)
+        self.websocket.close()
+
+        if self.dropped_chunks:
+            print(f"\nLive transcription skipped {self.dropped_chunks} chunks while the network was behind")
+        return Transcript(sorted(self.utterances, key=lambda u: u.start))
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from alignment import StreamAligner
+from ringbuffer import RingBuffer
+
+SR = 48000
+
+
+def tone(times):
+    return np.sin(2 * np.pi * 20 * times).astype(np.float32)[:, None]
+
+
+def simulate(ppm, start_delay=0.1, seconds=40.0, step=0.01):
+    """Feed a reference and a secondary ring whose clock runs ppm fast, as the
+    record loop does, and return the aligner plus the worst sample error over
+    the second half (after the clock fit has settled)."""
+    src_rate = SR * (1 + ppm / 1e6)
+    ref, src = RingBuffer(SR, 1), RingBuffer(SR, 1)
+    aligner = StreamAligner(SR, 1, SR)
+    ref_made = src_made = 0
+    worst = 0.0
+    for i in range(1, int(seconds / step) + 1):
+        now = i * step
+        n = int(now * SR) - ref_made
+        ref.write(tone((ref_made + np.arange(n)) / SR), ref_made / SR)
+        ref_made += n
+        if now > start_delay:
+            m = int((now - start_delay) * src_rate) - src_made
+            times = start_delay + (src_made + np.arange(m)) / src_rate
+            src.write(tone(times), times[0])
+            src_made += m
+
+        view = ref.peek(4096)
+        aligner.fill(src)
+        aligner.update(ref.source_position(), ref.last_timestamp, src.last_timestamp)
+        frames = aligner.ready_frames(len(view))
+        if not frames:
+            continue
+        out = aligner.read(frames)
+        if now > seconds / 2:
+            worst = max(worst, float(np.abs(out - view[:frames]).max()))
+        ref.advance(frames)
+    return aligner, worst
+
+
+@pytest.mark.parametrize("ppm", [0, 200, -300])
+def test_drift_is_estimated_and_corrected(ppm):
+    aligner, worst = simulate(ppm)
+    assert aligner.drift_ppm() == pytest.approx(ppm, abs=2)
+    assert worst < 0.01
+    assert aligner.dropped_samples == 0
+
+
+def test_late_start_is_padded_once():
+    aligner, _ = simulate(200, start_delay=0.1)
+    # The secondary source starts 0.1 s late; that gap is filled at once
+    # rather than slewed away over the whole recording
+    assert aligner.inserted_samples == int(0.1 * SR)
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from chunking import find_silences, plan_chunks, write_chunks
+
+SR = 8000
+
+
+def recording(path, parts):
+    """Write a file of (seconds, loud) parts: noise when loud, silence otherwise"""
+    rng = np.random.default_rng(0)
+    blocks = [rng.uniform(-0.1, 0.1, int(seconds * SR)) if loud else np.zeros(int(seconds * SR))
+              for seconds, loud in parts]
+    sf.write(path, np.concatenate(blocks).astype(np.float32), SR, subtype='FLOAT')
+    return path
+
+
+def test_find_silences(tmp_path):
+    path = recording(str(tmp_path / "a.wav"), [(2, True), (0.5, False), (3, True), (2, False), (1, True), (1.5, False)])
+    silences = find_silences(path, threshold=0.001, min_silence=1.0)
+    assert silences == [pytest.approx((5.5, 7.5)), pytest.approx((8.5, 10.0))]
+
+
+def test_short_files_are_one_chunk():
+    assert plan_chunks(800, [(100, 102)], target_seconds=600, max_seconds=900) == [(0.0, 800)]
+
+
+def test_chunks_are_cut_in_the_silence_nearest_the_target():
+    silences = [(250, 252), (590, 600), (640, 650), (1300, 1310)]
+    spans = plan_chunks(2000, silences, target_seconds=600, max_seconds=900)
+    assert spans == [(0.0, 595.0), (595.0, 1305.0), (1305.0, 2000)]
+
+
+def test_chunks_are_cut_hard_without_a_silence():
+    spans = plan_chunks(2000, [(100, 102)], target_seconds=600, max_seconds=900)
+    assert spans == [(0.0, 600.0), (600.0, 1200.0), (1200.0, 2000)]
+    assert all(end - start <= 900 for start, end in spans)
+
+
+def test_write_chunks_covers_the_recording(tmp_path):
+    path = recording(str(tmp_path / "a.wav"), [(2, True), (1, False), (2, True)])
+    chunk_files = write_chunks(path, [(0.0, 2.5), (2.5, 5.0)], str(tmp_path))
+
+    original, _ = sf.read(path, dtype='float32')
+    joined = np.concatenate([sf.read(f, dtype='float32')[0] for f in chunk_files])
+    np.testing.assert_array_equal(joined, original)
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from encoding import OffsetMap, SilenceTrimmer
+
+SR = 16000
+
+
+def speech(seconds, seed=0):
+    return np.random.default_rng(seed).uniform(-0.1, 0.1, int(seconds * SR)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SR), dtype=np.float32)
+
+
+def trim(samples, blocksize=4096, **options):
+    trimmer = SilenceTrimmer(SR, min_silence=3.0, padding=0.5, **options)
+    kept = [trimmer.process(samples[i:i + blocksize]) for i in range(0, len(samples), blocksize)]
+    kept.append(trimmer.flush())
+    return np.concatenate(kept), trimmer.offset_map()
+
+
+def test_long_silence_is_cut_to_padding():
+    audio = np.concatenate((speech(2, 1), silence(10), speech(2, 2)))
+    out, offsets = trim(audio)
+
+    assert len(out) == 5 * SR  # 2 s + 0.5 s tail + 0.5 s lead-in + 2 s
+    assert offsets.source_samples == len(audio)
+    assert offsets.output_samples == len(out)
+    assert offsets.trimmed_seconds == pytest.approx(9.0)
+    np.testing.assert_array_equal(out[:2 * SR], audio[:2 * SR])
+    np.testing.assert_array_equal(out[-2 * SR:], audio[-2 * SR:])
+
+
+def test_short_pauses_are_kept_exactly():
+    audio = np.concatenate((speech(2, 1), silence(1), speech(1, 2), silence(2.5), speech(1, 3), silence(1)))
+    out, offsets = trim(audio)
+
+    np.testing.assert_array_equal(out, audio)
+    assert offsets.trimmed_seconds == 0
+    assert offsets.to_source_ms(4321) == 4321
+
+
+def test_output_does_not_depend_on_block_size():
+    audio = np.concatenate((silence(4), speech(1, 1), silence(7), speech(3, 2), silence(5)))
+    reference, reference_map = trim(audio, blocksize=len(audio))
+    for blocksize in (7, 317, 4096, 48000):
+        out, offsets = trim(audio, blocksize=blocksize)
+        np.testing.assert_array_equal(out, reference)
+        assert offsets.spans == reference_map.spans
+
+
+def test_offset_map_restores_original_times():
+    audio = np.concatenate((speech(2, 1), silence(10), speech(2, 2)))
+    _, offsets = trim(audio)
+
+    assert offsets.to_source_ms(1000) == 1000  # Before the cut
+    assert offsets.to_source_ms(2400) == 2400  # In the kept tail
+    assert offsets.to_source_ms(2500) == 11500  # The lead-in before the next speech
+    assert offsets.to_source_ms(3000) == 12000  # Second stretch of speech starts
+    assert offsets.to_source_ms(4500) == 13500
+
+
+def test_remap_moves_utterance_and_word_times():
+    offsets = OffsetMap([(0, 0), (48000, 144000)], SR, 16 * SR, 6 * SR)
+    words = [SimpleNamespace(start=2500, end=2900), SimpleNamespace(start=3100, end=3600)]
+    utterance = SimpleNamespace(start=2500, end=3600, words=words)
+
+    offsets.remap([utterance])
+
+    assert (utterance.start, utterance.end) == (2500, 9600)
+    assert [(w.start, w.end) for w in words] == [(2500, 2900), (9100, 9600)]
+
+
+def test_offset_map_save_and_load(tmp_path):
+    offsets = OffsetMap([(0, 0), (48000, 144000)], SR, 16 * SR, 6 * SR)
+    path = tmp_path / "offsets.json"
+    offsets.save(path)
+
+    loaded = OffsetMap.load(path)
+    assert loaded.spans == offsets.spans
+    assert loaded.to_source_ms(3500) == offsets.to_source_ms(3500)
+    assert OffsetMap.load(tmp_path / "missing.json") is None
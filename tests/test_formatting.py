@@ -0,0 +1,79 @@
+import io
+import json
+
+from formatting import (JsonWriter, SrtWriter, TextWriter, VttWriter, cue_time, known_formats,
+                        write_transcript)
+from transcript import Transcript, Utterance
+
+NAMES = {"A": "Alice", "B": "Bob"}
+TRANSCRIPT = Transcript([
+    Utterance("A", 0, 2500, "Hello.", 0.9),
+    Utterance("A", 2600, 4000, "How are you?", 0.8),
+    Utterance("B", 3723004, 3725999, "Fine, thanks.", 0.95),
+])
+
+
+def render(writer_class):
+    f = io.StringIO()
+    write_transcript(TRANSCRIPT, NAMES, [writer_class(f, NAMES)])
+    return f.getvalue()
+
+
+def test_cue_time():
+    assert cue_time(0, ",") == "00:00:00,000"
+    assert cue_time(3723004, ",") == "01:02:03,004"
+    assert cue_time(3723004, ".") == "01:02:03.004"
+    assert cue_time(-5, ",") == "00:00:00,000"
+    assert cue_time(1500.7, ".") == "00:00:01.500"
+
+
+def test_srt_cues():
+    assert render(SrtWriter) == (
+        "1\n00:00:00,000 --> 00:00:02,500\nAlice: Hello.\n\n"
+        "2\n00:00:02,600 --> 00:00:04,000\nAlice: How are you?\n\n"
+        "3\n01:02:03,004 --> 01:02:05,999\nBob: Fine, thanks.\n\n"
+    )
+
+
+def test_vtt_cues():
+    assert render(VttWriter) == (
+        "WEBVTT\n\n"
+        "1\n00:00:00.000 --> 00:00:02.500\n<v Alice>Hello.\n\n"
+        "2\n00:00:02.600 --> 00:00:04.000\n<v Alice>How are you?\n\n"
+        "3\n01:02:03.004 --> 01:02:05.999\n<v Bob>Fine, thanks.\n\n"
+    )
+
+
+def test_text_groups_a_speakers_utterances():
+    text = render(TextWriter)
+    assert "A → Alice\nB → Bob" in text
+    assert "[00:00] Alice:\n    Hello. How are you?" in text
+    assert "[62:03] Bob:\n    Fine, thanks." in text
+
+
+def test_json_is_valid_and_complete():
+    data = json.loads(render(JsonWriter))
+    assert data["speakers"] == NAMES
+    assert [u["speaker"] for u in data["utterances"]] == ["Alice", "Alice", "Bob"]
+    assert data["utterances"][2] == {"speaker": "Bob", "label": "B", "start": 3723004, "end": 3725999,
+                                     "text": "Fine, thanks.", "confidence": 0.95}
+
+
+def test_one_pass_feeds_every_writer():
+    srt, vtt = io.StringIO(), io.StringIO()
+    write_transcript(TRANSCRIPT, NAMES, [SrtWriter(srt, NAMES), VttWriter(vtt, NAMES)])
+    assert srt.getvalue() == render(SrtWriter)
+    assert vtt.getvalue() == render(VttWriter)
+
+
+def test_unnamed_speakers_keep_their_label():
+    f = io.StringIO()
+    write_transcript(TRANSCRIPT, {"A": "Alice"}, [SrtWriter(f, {})])
+    assert "\nB: Fine, thanks." in f.getvalue()
+
+
+def test_known_formats_drops_unknown_entries(capsys):
+    assert known_formats(["SRT", "docx", "vtt", "srt", "txt"]) == ["txt", "srt", "vtt"]
+    assert "docx" in capsys.readouterr().out
+    assert known_formats([]) == ["txt"]
+    assert capsys.readouterr().out == ""
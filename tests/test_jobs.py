@@ -0,0 +1,102 @@
+import json
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from jobs import JobJournal, TranscriptionJobs
+
+
+def test_journal_resumes_from_disk(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path)
+    journal.put('uploads', 'digest', 'https://example/upload')
+    journal.put('jobs', 'key', 'job-1')
+    journal.put('jobs', 'other', 'job-2')
+    journal.forget('jobs', 'other')
+
+    resumed = JobJournal(path)
+    assert resumed.get('uploads', 'digest') == 'https://example/upload'
+    assert resumed.get('jobs', 'key') == 'job-1'
+    assert resumed.get('jobs', 'other') is None
+
+
+def test_forget_value_drops_every_key_with_it(tmp_path):
+    path = str(tmp_path / "journal.json")
+    journal = JobJournal(path)
+    journal.put('uploads', 'a', 'url')
+    journal.put('uploads', 'b', 'url')
+    journal.put('uploads', 'c', 'other-url')
+    journal.forget_value('uploads', 'url')
+
+    resumed = JobJournal(path)
+    assert [resumed.get('uploads', key) for key in 'abc'] == [None, None, 'other-url']
+
+
+def test_journals_sharing_a_file_merge_their_changes(tmp_path):
+    path = str(tmp_path / "journal.json")
+    first, second = JobJournal(path), JobJournal(path)
+    first.put('jobs', 'a', 'job-a')
+    second.put('jobs', 'b', 'job-b')  # Must not overwrite first's entry
+    first.forget('jobs', 'a')
+    second.put('jobs', 'c', 'job-c')  # Must not bring 'a' back
+
+    resumed = JobJournal(path)
+    assert [resumed.get('jobs', key) for key in 'abc'] == [None, 'job-b', 'job-c']
+
+
+def test_old_entries_expire(tmp_path):
+    path = tmp_path / "journal.json"
+    now = time.time()
+    path.write_text(json.dumps({
+        'uploads': {'old': {'value': 'u1', 'time': now - 7200}, 'new': {'value': 'u2', 'time': now - 60}},
+        'jobs': {},
+    }))
+    journal = JobJournal(str(path), max_age_hours=1)
+    assert journal.get('uploads', 'old') is None
+    assert journal.get('uploads', 'new') == 'u2'
+
+
+def test_in_memory_journal_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    journal = JobJournal("")
+    journal.put('jobs', 'key', 'job-1')
+    assert journal.get('jobs', 'key') == 'job-1'
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    aai = pytest.importorskip("assemblyai")
+    from mock_assemblyai import TranscriptionStandIn
+
+    server = TranscriptionStandIn(latency=0.2, failure_rate=0.2, seed=3).start()
+    monkeypatch.setattr(aai.settings, "api_key", "test-key")
+    monkeypatch.setattr(aai.settings, "base_url", server.base_url)
+    yield server
+    server.stop()
+
+
+def test_restart_collects_jobs_without_uploading_again(tmp_path, stand_in):
+    audio = str(tmp_path / "take.flac")
+    rng = np.random.default_rng(0)
+    sound = np.concatenate((rng.uniform(-0.1, 0.1, 32000), np.zeros(16000), rng.uniform(-0.1, 0.1, 32000)))
+    sf.write(audio, sound.astype(np.float32), 16000)
+    journal = str(tmp_path / "journal.json")
+
+    def transcribe():
+        jobs = TranscriptionJobs(journal, retries=8, backoff=0.01, interval=0.05)
+        upload_url, reused = jobs.upload(audio, echo=False)
+        return reused, jobs.transcribe(upload_url, {'speaker_labels': True}, echo=False)
+
+    reused, transcript = transcribe()
+    assert not reused
+    assert len(transcript.utterances) == 2
+    uploads, submitted = stand_in.upload_count, len(stand_in.jobs)
+
+    # A new process on the same journal picks up the upload and the finished job
+    reused, again = transcribe()
+    assert reused
+    assert (stand_in.upload_count, len(stand_in.jobs)) == (uploads, submitted)
+    assert [(u.start, u.end) for u in again.utterances] == [(u.start, u.end) for u in transcript.utterances]
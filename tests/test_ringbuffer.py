@@ -0,0 +1,80 @@
+import numpy as np
+
+from ringbuffer import RingBuffer
+
+
+def frames(start, count, channels=2):
+    """Blocks whose every sample is its frame number, so order is easy to check"""
+    return np.repeat(np.arange(start, start + count, dtype=np.float32)[:, None], channels, axis=1)
+
+
+def read_all(ring):
+    parts = []
+    while ring.available():
+        view = ring.peek()
+        parts.append(view.copy())
+        ring.advance(len(view))
+    return np.concatenate(parts)
+
+
+def test_wraparound_reads_back_in_order():
+    ring = RingBuffer(10, 2)
+    assert ring.write(frames(0, 7))
+    ring.advance(len(ring.peek()))
+    assert ring.write(frames(7, 6))  # Starts at slot 7 and wraps to slot 0
+
+    first = ring.peek()
+    assert len(first) == 3  # Up to the end of the buffer only
+    np.testing.assert_array_equal(first, frames(7, 3))
+    ring.advance(3)
+    np.testing.assert_array_equal(ring.peek(), frames(10, 3))
+
+
+def test_many_wraps_keep_every_frame():
+    ring = RingBuffer(64, 1)
+    written = 0
+    out = []
+    for size in [5, 17, 31, 3, 63, 1, 40, 29] * 10:
+        assert ring.write(frames(written, size, 1))
+        written += size
+        out.append(read_all(ring))
+    np.testing.assert_array_equal(np.concatenate(out)[:, 0], np.arange(written))
+
+
+def test_peek_limits_to_max_frames():
+    ring = RingBuffer(16, 1)
+    ring.write(frames(0, 10, 1))
+    assert len(ring.peek(4)) == 4
+    assert ring.available() == 10
+
+
+def test_overrun_drops_the_block_and_counts_it():
+    ring = RingBuffer(10, 2)
+    assert ring.write(frames(0, 8))
+    assert not ring.write(frames(8, 5))  # Only 2 frames free
+
+    assert ring.overflows == 1
+    assert ring.dropped_frames == 5
+    assert ring.available() == 8
+    np.testing.assert_array_equal(read_all(ring), frames(0, 8))
+
+
+def test_source_position_and_timestamps_count_dropped_frames():
+    ring = RingBuffer(10, 1)
+    ring.write(frames(0, 8, 1), timestamp=1.0)
+    ring.write(frames(8, 5, 1), timestamp=2.0)  # Dropped
+    assert ring.last_timestamp == (8, 2.0)
+
+    ring.advance(8)
+    assert ring.source_position() == 13  # The next frame read is source frame 13
+    ring.write(frames(13, 4, 1), timestamp=3.0)
+    assert ring.last_timestamp == (13, 3.0)
+    assert ring.peek()[0, 0] == 13
+
+
+def test_discard_empties_the_ring():
+    ring = RingBuffer(10, 1)
+    ring.write(frames(0, 6, 1))
+    ring.discard()
+    assert ring.available() == 0
+    assert ring.free() == 10
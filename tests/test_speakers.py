@@ -0,0 +1,111 @@
+import numpy as np
+import soundfile as sf
+
+from recorder import AudioRecorder
+from speakers import SpeakerProfiles, voice_fingerprint
+from stems import loudest_source, save_layout
+from transcript import Utterance
+from transcript_cache import TranscriptCache
+
+SR = 16000
+
+
+def voice(f0, formants, seconds=20, seed=0):
+    """Harmonics of f0 shaped by formant peaks, with speech-like loudness changes"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SR)) / SR
+    phase = 2 * np.pi * f0 * np.cumsum(1 + 0.03 * np.sin(2 * np.pi * rng.uniform(0.2, 0.5) * t)) / SR
+    signal = sum(sum(np.exp(-((k * f0 - f) / 150) ** 2) for f in formants) / k ** 0.5 * np.sin(k * phase)
+                 for k in range(1, int(4000 / f0)))
+    envelope = np.repeat(rng.uniform(0.2, 1.0, seconds * 4), SR // 4)[:len(t)]
+    signal = signal * envelope + rng.normal(0, 0.001, len(t))
+    return (0.1 * signal / np.abs(signal).max()).astype(np.float32)
+
+
+ALICE = (210, (800, 2400))
+BOB = (110, (500, 1500))
+BOB_LOOKALIKE = (120, (500, 1500))  # Hardly distinguishable from BOB
+
+
+def fingerprint(speaker, seed=0):
+    return voice_fingerprint(voice(*speaker, seed=seed), SR)
+
+
+def profiles_with(tmp_path, **voices):
+    profiles = SpeakerProfiles(str(tmp_path / "profiles.npz"))
+    for name, speaker in voices.items():
+        profiles.remember(name, fingerprint(speaker))
+    return profiles
+
+
+def test_known_voice_is_recognized_in_another_take(tmp_path):
+    profiles = profiles_with(tmp_path, Alice=ALICE, Bob=BOB)
+    matches = profiles.match({'A': fingerprint(BOB, seed=1), 'B': fingerprint(ALICE, seed=1)})
+    assert {label: match[0] for label, match in matches.items()} == {'A': 'Bob', 'B': 'Alice'}
+
+
+def test_distinct_voice_is_not_taken_for_a_stored_one(tmp_path):
+    profiles = profiles_with(tmp_path, Alice=ALICE)
+    assert profiles.match({'A': fingerprint(BOB, seed=1)}) == {}
+
+
+def test_lookalike_voices_are_asked_about_rather_than_guessed(tmp_path):
+    profiles = profiles_with(tmp_path, Bob=BOB, Dave=BOB_LOOKALIKE)
+    assert profiles.match({'A': fingerprint(BOB, seed=1)}) == {}
+
+
+def test_a_name_goes_to_one_label_per_match(tmp_path):
+    profiles = profiles_with(tmp_path, Alice=ALICE)
+    matches = profiles.match({'A': fingerprint(ALICE, seed=1), 'B': fingerprint(ALICE, seed=2)})
+    assert [match[0] for match in matches.values()] == ['Alice']
+
+
+def test_profiles_survive_a_save(tmp_path):
+    profiles = profiles_with(tmp_path, Alice=ALICE)
+    profiles.save()
+    assert SpeakerProfiles(profiles.path).match({'A': fingerprint(ALICE, seed=1)})['A'][0] == 'Alice'
+
+
+def test_loudest_source_picks_the_stem_with_the_voice():
+    speech = voice(*ALICE, seconds=2)
+    block = np.stack([speech, speech, np.zeros_like(speech)], axis=1)  # Stereo mic, mono system
+    np.testing.assert_allclose(loudest_source(block, (2, 1)), speech)
+    np.testing.assert_allclose(loudest_source(block[:, ::-1], (1, 2)), speech)
+
+
+def recorder_for(tmp_path):
+    recorder = AudioRecorder("test", detect_devices=False,
+                             transcript_cache=TranscriptCache(str(tmp_path / "cache")))
+    recorder.speaker_profiles_file = ""
+    return recorder
+
+
+def test_recognize_speakers_does_not_reuse_a_name_given_this_session(tmp_path):
+    # Diarization split Alice into A and C; A was named in the preview
+    path = str(tmp_path / "recording.wav")
+    sf.write(path, np.concatenate([voice(*ALICE, seconds=10, seed=1), voice(*ALICE, seconds=10, seed=2)]), SR)
+    utterances = [Utterance('A', 0, 10000, "first", 0.9), Utterance('C', 10000, 20000, "second", 0.9)]
+    profiles = profiles_with(tmp_path, Alice=ALICE)
+
+    recorder = recorder_for(tmp_path)
+    recorder.speaker_names = {'A': 'Alice'}
+    recorder.recognize_speakers(path, utterances, profiles)
+    assert recorder.speaker_names == {'A': 'Alice'}
+
+    recorder.speaker_names = {}
+    recorder.recognize_speakers(path, utterances[1:], profiles)
+    assert recorder.speaker_names == {'C': 'Alice'}
+
+
+def test_fingerprints_come_from_the_speakers_own_stem(tmp_path):
+    # Alice on the microphone with Bob quietly talking over her on the call, then Bob alone
+    path = str(tmp_path / "recording.wav")
+    mic = np.concatenate([voice(*ALICE, seconds=10, seed=1), np.zeros(10 * SR, np.float32)])
+    system = np.concatenate([0.3 * voice(*BOB, seconds=10, seed=2), voice(*BOB, seconds=10, seed=1)])
+    sf.write(path, np.stack([mic, system], axis=1), SR)
+    save_layout(path, 1, 1)
+
+    fingerprints = recorder_for(tmp_path).speaker_fingerprints(
+        path, {'A': {'start': 0, 'duration': 10000}, 'B': {'start': 10000, 'duration': 10000}})
+    assert float(fingerprints['A'] @ fingerprint(ALICE, seed=1)) > 0.99
+    assert float(fingerprints['B'] @ fingerprint(BOB, seed=1)) > 0.99
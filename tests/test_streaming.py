@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from streaming import StreamingTranscriber
+
+SR = 48000
+
+
+def blocks(seconds, blocksize=4800, seed=0):
+    audio = np.random.default_rng(seed).uniform(-0.1, 0.1, int(seconds * SR)).astype(np.float32)
+    return [audio[i:i + blocksize] for i in range(0, len(audio), blocksize)]
+
+
+@pytest.fixture
+def realtime():
+    pytest.importorskip("websockets")
+    from mock_assemblyai import RealtimeStandIn
+
+    server = RealtimeStandIn(utterance_ms=5000).start()
+    yield server
+    server.stop()
+
+
+def test_live_session_attributes_speakers_by_loudness(realtime):
+    streamer = StreamingTranscriber("test-key", realtime.url, source_rate=SR)
+    streamer.start()
+    fed = 0
+    for block in blocks(12):
+        mic_louder = fed < 6 * SR
+        streamer.feed(block, mic_level=0.5 if mic_louder else 0.1, sys_level=0.1 if mic_louder else 0.5)
+        fed += len(block)
+    transcript = streamer.stop(timeout=10)
+
+    assert streamer.error is None
+    assert [(u.start, u.end) for u in transcript.utterances] == [(0, 5000), (5000, 10000), (10000, 12000)]
+    assert [u.speaker for u in transcript.utterances] == ["A", "B", "B"]
+    assert realtime.audio_ms_received == pytest.approx(12000)
+
+
+def test_dropped_chunks_keep_later_times_on_the_recording():
+    # Never started, so the queue fills up after two 100 ms chunks
+    streamer = StreamingTranscriber("test-key", "ws://unused", source_rate=SR, max_queued_chunks=2)
+    for block in blocks(0.5):
+        streamer.feed(block)
+
+    assert streamer.dropped_chunks == 3
+    assert streamer.gaps == [(200, 100), (200, 100), (200, 100)]
+    assert streamer._to_recording_ms(150) == 150
+    assert streamer._to_recording_ms(250) == 550
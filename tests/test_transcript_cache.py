@@ -0,0 +1,87 @@
+import os
+
+from transcript import Transcript, Utterance
+from transcript_cache import TranscriptCache
+
+
+def transcript(text):
+    return Transcript([Utterance("A", 0, 1500, text, 0.9)])
+
+
+def age(cache, key, mtime):
+    path = cache._entry_path(key)
+    os.utime(path, (mtime, mtime))
+
+
+def test_round_trip_keeps_speaker_names(tmp_path):
+    cache = TranscriptCache(str(tmp_path / "cache"))
+    cache.put("k", transcript("hello there"), {"A": "Alice"})
+
+    result, names = cache.get("k")
+    assert [u.text for u in result.utterances] == ["hello there"]
+    assert (result.utterances[0].start, result.utterances[0].end) == (0, 1500)
+    assert names == {"A": "Alice"}
+    assert cache.get("missing") is None
+
+
+def test_directory_is_made_on_first_write(tmp_path):
+    directory = tmp_path / "cache"
+    cache = TranscriptCache(str(directory))
+    assert cache.get("k") is None
+    assert not directory.exists()
+    cache.put("k", transcript("hi"), {})
+    assert directory.is_dir()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=10 ** 9)
+    for i, key in enumerate("abc"):
+        cache.put(key, transcript("same length"), {})
+        age(cache, key, 1000 + i)
+    entry_size = os.path.getsize(cache._entry_path("a"))
+
+    assert cache.get("a") is not None  # Now the most recently used
+    cache.max_bytes = 3 * entry_size
+    cache.put("d", transcript("same length"), {})
+
+    assert cache.get("b") is None  # The oldest entry not read since
+    assert all(cache.get(key) is not None for key in "acd")
+    assert cache.stats()['entries'] == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_eviction_drops_several_entries_to_fit(tmp_path):
+    cache = TranscriptCache(str(tmp_path), max_bytes=10 ** 9)
+    for i, key in enumerate("abcde"):
+        cache.put(key, transcript("same length"), {})
+        age(cache, key, 1000 + i)
+    cache.max_bytes = 2 * os.path.getsize(cache._entry_path("a"))
+    cache.evict()
+
+    assert [key for key in "abcde" if cache.get(key) is not None] == ["d", "e"]
+    assert cache.stats()['bytes'] <= cache.max_bytes
+
+
+def test_hit_counts_are_saved_on_close(tmp_path):
+    cache = TranscriptCache(str(tmp_path))
+    cache.put("k", transcript("hi"), {})
+    cache.get("k")
+    cache.get("k")
+    cache.get("missing")
+    assert TranscriptCache(str(tmp_path)).stats()['hits'] == 0  # Not written on every get
+
+    cache.close()
+    stats = TranscriptCache(str(tmp_path)).stats()
+    assert (stats['hits'], stats['misses']) == (2, 1)
+
+
+def test_audio_digest_is_remembered(tmp_path):
+    audio = tmp_path / "take.wav"
+    audio.write_bytes(b"\0" * 4096)
+    cache = TranscriptCache(str(tmp_path / "cache"))
+    digest = cache.audio_digest(str(audio))
+
+    assert TranscriptCache(str(tmp_path / "cache")).audio_digest(str(audio)) == digest
+    audio.write_bytes(b"\1" * 4096)
+    os.utime(audio, ns=(0, 10 ** 9))
+    assert cache.audio_digest(str(audio)) != digest
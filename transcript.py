@@ -0,0 +1,44 @@
+class Utterance:
+    """One speaker turn, shaped like assemblyai's Utterance (times in ms)"""
+
+    def __init__(self, speaker, start, end, text, confidence=None):
+        self.speaker = speaker
+        self.start = start
+        self.end = end
+        self.text = text
+        self.confidence = confidence
+
+    def __repr__(self):
+        return f"Utterance({self.speaker!r}, {self.start}, {self.end}, {self.text!r})"
+
+
+class Transcript:
+    """Minimal stand-in for assemblyai's Transcript, as used by format_transcript()"""
+
+    def __init__(self, utterances=None):
+        self.utterances = utterances if utterances is not None else []
+
+    @property
+    def text(self):
+        return " ".join(u.text for u in self.utterances)
+
+
+def transcript_to_dict(transcript):
+    """Plain-JSON form of any transcript with .utterances (ours or assemblyai's)"""
+    return {
+        'utterances': [
+            {
+                'speaker': u.speaker,
+                'start': u.start,
+                'end': u.end,
+                'text': u.text,
+                'confidence': u.confidence,
+            }
+            for u in transcript.utterances or []
+        ]
+    }
+
+
+def transcript_from_dict(data):
+    return Transcript([Utterance(u['speaker'], u['start'], u['end'], u['text'], u.get('confidence'))
+                       for u in data['utterances']])
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import threading
+
+from transcript import transcript_from_dict, transcript_to_dict
+
+
+class TranscriptCache:
+    """Persistent transcript cache keyed by audio content and transcription config.
+
+    Each entry is a JSON file holding the raw utterances and the speaker
+    names given for them, so re-running, re-formatting or recovering after
+    a crash never calls the API for a recording it has already seen.
+    Entries are evicted least-recently-used once the cache exceeds
+    max_bytes. Audio digests are remembered by path, size and mtime so an
+    unchanged multi-gigabyte recording is hashed only once.
+
+    One instance can be shared by threads. Hit and miss counts are kept in
+    memory and saved with the next put, eviction or close().
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1000 * 1000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.index = self._load_index()  # The directory itself is made on the first write
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'digests': {}, 'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _save_index(self):
+        self._write_atomic(self.index_file, self.index)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(self.directory, exist_ok=True)
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp, path)
+
+    def audio_digest(self, audio_file):
+        stat = os.stat(audio_file)
+        identity = f"{os.path.abspath(audio_file)}|{stat.st_size}|{stat.st_mtime_ns}"
+        with self.lock:
+            digest = self.index['digests'].get(identity)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(audio_file, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self.lock:
+                digests = self.index['digests']
+                digests[identity] = digest
+                while len(digests) > 10000:  # Forget the oldest recordings first
+                    del digests[next(iter(digests))]
+                self._save_index()
+        return digest
+
+    def key_for(self, audio_file, config, **options):
+        """Cache key for a recording transcribed with config (and pipeline options)"""
+        settings = json.dumps({'config': config.raw.dict(exclude_none=True), 'options': options},
+                              sort_keys=True, default=str)
+        return hashlib.sha256(f"{self.audio_digest(audio_file)}|{settings}".encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return (Transcript, speaker_names) or None"""
+        path = self._entry_path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            with self.lock:
+                self.index['misses'] += 1
+            return None
+        with self.lock:
+            self.index['hits'] += 1
+        return transcript_from_dict(entry['transcript']), entry.get('speaker_names', {})
+
+    def put(self, key, transcript, speaker_names):
+        entry = {'transcript': transcript_to_dict(transcript), 'speaker_names': dict(speaker_names)}
+        self._write_atomic(self._entry_path(key), entry)
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            # Another process may be evicting too: entries can vanish at any point
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    self.index['evictions'] += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._save_index()
+
+    def close(self):
+        """Save the hit and miss counts"""
+        with self.lock:
+            self._save_index()
+
+    def _entries(self):
+        """(mtime, size, path) of every entry on disk"""
+        entries = []
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        for name in names:
+            if name.endswith(".json") and name != "index.json":
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def stats(self):
+        with self.lock:
+            entries = self._entries()
+            return {
+                'hits': self.index['hits'],
+                'misses': self.index['misses'],
+                'evictions': self.index['evictions'],
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+            }
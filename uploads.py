@@ -0,0 +1,105 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+from lazy import LazyModule
+from transcript import Transcript, Utterance
+
+aai = LazyModule('assemblyai')
+httpx = LazyModule('httpx')
+
+# Answers worth trying again: rate limiting and server-side trouble
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def api_client():
+    """An httpx client for the REST API, set up from aai.settings.
+
+    Our own rather than the SDK's internal one; a new client is made
+    whenever the base URL, API key or timeout in aai.settings change.
+    """
+    settings = (aai.settings.base_url, aai.settings.api_key, aai.settings.http_timeout)
+    with _clients_lock:
+        client = _clients.get(settings)
+        if client is None:
+            client = httpx.Client(base_url=settings[0], headers={'authorization': settings[1]},
+                                  timeout=settings[2])
+            _clients[settings] = client
+        return client
+
+
+def file_chunks(path, chunk_size):
+    """A file's bytes chunk_size at a time, so an upload holds one chunk in memory however big the file"""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """Content hash identifying an upload, whatever the file is called"""
+    sha = hashlib.sha256()
+    for chunk in file_chunks(path, chunk_size):
+        sha.update(chunk)
+    return sha.hexdigest()
+
+
+def with_retries(request, what, retries=5, backoff=1.0, echo=True):
+    """Call request() until its response is not a transient failure.
+
+    Connection errors, timeouts, 429 and 5xx answers are retried after
+    about backoff, 2 * backoff, 4 * backoff ... seconds (with jitter, so
+    parallel uploads don't retry in lockstep), each announced unless echo
+    is off. Returns the response, or raises once retries attempts have
+    failed.
+    """
+    for attempt in range(retries):
+        try:
+            response = request()
+            if response.status_code not in RETRY_STATUS:
+                return response
+            problem = f"{response.status_code} {response.text[:200]}"
+        except httpx.TransportError as e:
+            problem = f"{type(e).__name__}: {e}"
+        if attempt == retries - 1:
+            raise RuntimeError(f"{what} failed after {retries} attempts: {problem}")
+        delay = backoff * 2 ** attempt * random.uniform(0.5, 1.0)
+        if echo:
+            print(f"{what} failed ({problem}); retrying in {delay:.1f} s")
+        time.sleep(delay)
+
+
+def upload_file(path, chunk_size=8 << 20, retries=5, backoff=1.0, echo=True):
+    """Upload a local file to AssemblyAI and return its upload URL.
+
+    The file is streamed from disk chunk_size bytes at a time, and the
+    upload starts over after a failure (the service takes an upload in
+    one request). The URL can be passed to any number of transcription
+    jobs, so a recording only ever needs to be uploaded once.
+    """
+    client = api_client()
+    response = with_retries(lambda: client.post("/v2/upload", content=file_chunks(path, chunk_size)),
+                            f"Uploading {os.path.basename(path)}", retries, backoff, echo)
+    if response.status_code != 200:
+        raise RuntimeError(f"Uploading {os.path.basename(path)} failed: {response.status_code} {response.text}")
+    return response.json()['upload_url']
+
+
+def transcript_from_response(data):
+    """Transcript from a finished job's JSON.
+
+    Multichannel jobs label utterances by channel: channel 1 becomes
+    speaker A, channel 2 speaker B and so on.
+    """
+    utterances = []
+    for u in data.get('utterances') or []:
+        speaker = chr(ord('A') + int(u['channel']) - 1) if u.get('channel') else u['speaker']
+        utterances.append(Utterance(speaker, u['start'], u['end'], u['text'], u.get('confidence')))
+    return Transcript(utterances)
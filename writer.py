@@ -0,0 +1,252 @@
+"""Background writing of the recording.
+
+Run it on a manifest left behind by a crashed segmented recording to join
+the finished segments back into one WAV:
+
+    python writer.py recording_20240315_143022_manifest.json
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from lazy import LazyModule
+from ringbuffer import RingBuffer
+
+sf = LazyModule('soundfile')
+
+
+def segment_path_for(path, index):
+    """Path of the index-th (0-based) segment of a segmented recording"""
+    base, extension = os.path.splitext(path)
+    return f"{base}_part{index + 1:03d}{extension}"
+
+
+def manifest_path_for(path):
+    return os.path.splitext(path)[0] + "_manifest.json"
+
+
+def join_segments(manifest_file, path=None, blocksize=65536):
+    """Concatenate the segments listed in a manifest into one file, streaming.
+
+    Returns the joined file's path; it defaults to the recording the
+    manifest was written for.
+    """
+    with open(manifest_file, encoding="utf-8") as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(os.path.abspath(manifest_file))
+    path = path or os.path.join(directory, manifest['recording'])
+    with sf.SoundFile(path, 'w', samplerate=manifest['samplerate'],
+                      channels=manifest['channels'], subtype=manifest['subtype']) as joined:
+        for segment in manifest['segments']:
+            segment_file = os.path.join(directory, segment['path'])
+            try:
+                with sf.SoundFile(segment_file, 'r') as source:
+                    for block in source.blocks(blocksize, dtype='float32', always_2d=True):
+                        joined.write(block)
+            except RuntimeError as e:
+                # The segment being written when the process died may be unreadable
+                print(f"Skipping unreadable segment {segment['path']}: {e}")
+    return path
+
+
+class RecordingWriter:
+    """Writes the recording to disk from its own thread.
+
+    write() only copies the block into a preallocated ring, so a disk stall
+    never holds up capture. The writer thread coalesces the ring into
+    writes of about batch_seconds and also feeds any extra sinks (such as
+    the UploadEncoder) from there. If the disk falls more than
+    buffer_seconds behind, new blocks are dropped and counted.
+
+    With segment_seconds set, every batch also goes to numbered files
+    rotated with a JSON manifest, so a crash loses at most the open
+    segment (join_segments() rebuilds the recording from them). The
+    recording itself is written alongside, so close() only finishes it
+    and removes the segments instead of copying them all at stop.
+
+    Blocks written with a capture time (time.perf_counter() of their
+    first frame) are timed from capture to disk under latency_metric.
+
+    With sink_channels, each block carries that many extra columns after
+    the file's channels (the mix); only those go to the sinks, so the
+    file can hold the source stems while the sinks still get the mix.
+    """
+
+    def __init__(self, path, samplerate, channels, subtype='PCM_24', sinks=(),
+                 segment_seconds=None, buffer_seconds=20, batch_seconds=0.5,
+                 metrics=None, sink_channels=0):
+        self.path = path
+        self.samplerate = samplerate
+        self.channels = channels
+        self.subtype = subtype
+        self.sinks = list(sinks)
+        self.segment_frames = int(segment_seconds * samplerate) if segment_seconds else None
+        self.batch_frames = max(1, int(batch_seconds * samplerate))
+        self.batch_seconds = batch_seconds
+        self.metrics = metrics
+
+        self.sink_channels = sink_channels
+        self.latency_metric = 'callback_to_disk'
+        self.ring = RingBuffer(int(buffer_seconds * samplerate), channels + sink_channels)
+        self.error = None
+        self.frames_written = 0
+        self.batches = 0
+        self.max_buffered = 0
+
+        self.segments = []
+        self.manifest_file = manifest_path_for(path) if self.segment_frames else None
+        self.file = None
+        self.segment_start = 0
+
+        self.joined = sf.SoundFile(path, mode='x', samplerate=samplerate, channels=channels, subtype=subtype)
+        if self.segment_frames:
+            self._open_segment()
+        else:
+            self.file = self.joined
+
+        self.wake = threading.Event()
+        self.closing = False
+        self.thread = threading.Thread(target=self._run, name="recording-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, block, captured=None):
+        """Queue one block; never blocks on the disk"""
+        self.ring.write(block, captured)
+        buffered = self.ring.available()
+        if buffered > self.max_buffered:
+            self.max_buffered = buffered
+        if buffered >= self.batch_frames:
+            self.wake.set()
+
+    def set_batch_seconds(self, batch_seconds):
+        """Change how much audio is gathered per disk write"""
+        self.batch_frames = max(1, int(batch_seconds * self.samplerate))
+        self.batch_seconds = batch_seconds
+
+    def close(self):
+        """Flush everything queued, close the file(s) and remove the segments"""
+        if self.thread.is_alive():
+            self.closing = True
+            self.wake.set()
+            self.thread.join()
+        for file in (self.file, self.joined):
+            if file is not None and not file.closed:
+                file.close()
+        if self.segment_frames and self.segments:
+            self._finish_segment()
+            if self.error is None:  # Else the segments are kept to rebuild the recording from
+                for segment in self.segments:
+                    os.remove(os.path.join(os.path.dirname(os.path.abspath(self.path)), segment['path']))
+                os.remove(self.manifest_file)
+            self.segments = []
+
+    def stats(self):
+        return {
+            'frames_written': self.frames_written,
+            'batches': self.batches,
+            'max_buffered_seconds': self.max_buffered / self.samplerate,
+            'overflows': self.ring.overflows,
+            'dropped_frames': self.ring.dropped_frames,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.batch_seconds)
+            self.wake.clear()
+            closing = self.closing
+            try:
+                self._drain()
+            except Exception as e:
+                self.error = e
+                print(f"\nError writing audio data: {e}")
+                self.ring.discard()
+                return
+            if closing:
+                return
+
+    def _drain(self):
+        """Write out everything currently in the ring in large contiguous batches"""
+        while self.ring.available():
+            limit = self.batch_frames
+            if self.segment_frames:
+                limit = min(limit, self.segment_start + self.segment_frames - self.frames_written)
+            block = self.ring.peek(limit)
+            start = time.perf_counter()
+            if self.sink_channels:
+                file_block = block[:, :self.channels]
+                sink_block = block[:, self.channels:]
+            else:
+                file_block = sink_block = block
+            self.file.write(file_block)
+            if self.file is not self.joined:
+                self.joined.write(file_block)
+            for sink in self.sinks:
+                sink.write(sink_block)
+            if self.metrics is not None:
+                now = time.perf_counter()
+                self.metrics.observe('disk_write', now - start)
+                if self.ring.last_timestamp is not None:
+                    # Age of the batch's oldest frame, from the newest capture time
+                    frame, captured = self.ring.last_timestamp
+                    first = self.ring.source_position()
+                    self.metrics.observe(self.latency_metric, now - captured - (first - frame) / self.samplerate)
+            self.ring.advance(len(block))
+            self.frames_written += len(block)
+            self.batches += 1
+            if self.segment_frames and self.frames_written >= self.segment_start + self.segment_frames:
+                self._rotate()
+
+    def _open_segment(self):
+        index = len(self.segments)
+        segment_file = segment_path_for(self.path, index)
+        self.file = sf.SoundFile(segment_file, mode='x', samplerate=self.samplerate,
+                                 channels=self.channels, subtype=self.subtype)
+        self.segment_start = self.frames_written
+        self.segments.append({'path': os.path.basename(segment_file),
+                              'start': self.segment_start, 'frames': 0, 'complete': False})
+        self._save_manifest()
+
+    def _finish_segment(self):
+        segment = self.segments[-1]
+        segment['frames'] = self.frames_written - self.segment_start
+        segment['complete'] = True
+        self._save_manifest()
+
+    def _rotate(self):
+        self.file.close()
+        self._finish_segment()
+        self._open_segment()
+
+    def _save_manifest(self):
+        manifest = {
+            'recording': os.path.basename(self.path),
+            'samplerate': self.samplerate,
+            'channels': self.channels,
+            'subtype': self.subtype,
+            'updated': time.time(),
+            'segments': self.segments,
+        }
+        temp = f"{self.manifest_file}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temp, self.manifest_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Join the segments of a segmented recording")
+    parser.add_argument('manifest', help="The recording's _manifest.json")
+    parser.add_argument('--output', help="Joined file (default: the original recording name)")
+    args = parser.parse_args()
+    print(f"Joined segments into {join_segments(args.manifest, args.output)}")
+
+
+if __name__ == "__main__":
+    main()